@@ -0,0 +1,4 @@
+"""Offline benchmarks for rendering, search and storage hot paths
+
+Runs without a discord connection, see `python -m benchmarks --help`
+"""
@@ -0,0 +1,47 @@
+"""Runs the offline benchmarks
+
+Usage:
+    python -m benchmarks --sizes 10 1000 --output results.json
+    python -m benchmarks --compare old.json new.json
+"""
+
+from __future__ import annotations
+
+import asyncio
+import argparse
+import tempfile
+from pathlib import Path
+
+from .dataset import DEFAULT_SIZES
+from .runner import Runner, compare
+from .suites import SUITES, run_suites
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--suites", nargs="+", choices=SUITES, default=list(SUITES))
+    parser.add_argument("--min-time", type=float, default=1.0)
+    parser.add_argument("--max-rounds", type=int, default=200)
+    parser.add_argument("--output", type=Path, default=Path("bench_results.json"))
+    parser.add_argument(
+        "--compare", type=Path, nargs=2, metavar=("BASELINE", "CURRENT")
+    )
+    args = parser.parse_args()
+
+    if args.compare:
+        return compare(*args.compare)
+
+    runner = Runner(min_time=args.min_time, max_rounds=args.max_rounds)
+
+    async def run():
+        with tempfile.TemporaryDirectory() as directory:
+            await run_suites(runner, args.sizes, args.suites, Path(directory))
+
+    asyncio.run(run())
+    runner.write(args.output)
+    print(f"Wrote results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
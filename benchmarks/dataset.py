@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import random
+import sqlite3
+from pathlib import Path
+
+from cogs.utils.facility import Facility
+from cogs.utils.flags import ItemServiceFlags, VehicleServiceFlags
+from cogs.utils.regions import REGIONS
+
+
+DEFAULT_SIZES = (10, 100, 1000, 10000, 50000)
+
+_COLUMNS = (
+    "name",
+    "description",
+    "region",
+    "coordinates",
+    "marker",
+    "maintainer",
+    "author",
+    "item_services",
+    "vehicle_services",
+    "creation_time",
+    "guild_id",
+    "image_url",
+    "thread_id",
+)
+
+
+def _random_flags(rng: random.Random, flag_cls, chance: float):
+    value = 0
+    for flag_descriptor in flag_cls.MAPPED_FLAGS.values():
+        if rng.random() < chance:
+            value |= flag_descriptor.flag_value
+    return flag_cls(value)
+
+
+def generate_facilities(
+    count: int,
+    guild_id: int = 1,
+    seed: int = 0,
+    author_count: int = 50,
+    start_id: int = 1,
+) -> list[Facility]:
+    """Generates facilities spread over every region with random services
+
+    Args:
+        count (int): Amount of facilities
+        guild_id (int): Guild the facilities belong to
+        seed (int): Seed so datasets are identical between runs
+        author_count (int): Amount of distinct authors
+        start_id (int): ID of the first facility
+
+    Returns:
+        list[Facility]: Generated facilities with sequential ID's
+    """
+    rng = random.Random(seed)
+    regions = list(REGIONS.items())
+    facilities = []
+    for index in range(start_id, start_id + count):
+        region, markers = rng.choice(regions)
+        coordinates = ""
+        if rng.random() < 0.6:
+            coordinates = f"{rng.choice('ABCDEFGHIJKLMNOPQR')}{rng.randint(1, 15)}K{rng.randint(1, 9)}"
+
+        facility = Facility(
+            id_=index,
+            name=f"Facility {index} {rng.choice(('North', 'South', 'Depot', 'Works'))}",
+            description="Synthetic facility " * rng.randint(0, 10),
+            region=region,
+            coordinates=coordinates,
+            marker=rng.choice(markers),
+            maintainer=f"Regiment {rng.randint(1, 200)}",
+            author=rng.randint(1, author_count),
+            item_services=_random_flags(rng, ItemServiceFlags, 0.2),
+            vehicle_services=_random_flags(rng, VehicleServiceFlags, 0.15),
+            creation_time=1_690_000_000 + index,
+            guild_id=guild_id,
+            image_url="",
+            thread_id=rng.randint(10**17, 10**18) if rng.random() < 0.3 else None,
+        )
+        facilities.append(facility)
+    return facilities
+
+
+def populate_database(db_file: Path, facilities: list[Facility]) -> None:
+    """Inserts facilities with a single transaction, the schema must already exist
+
+    Args:
+        db_file (Path): SQLite file to insert into
+        facilities (list[Facility]): Facilities to insert
+    """
+    placeholders = ", ".join("?" for _ in _COLUMNS)
+    query = f"""INSERT INTO facilities (id_, {", ".join(_COLUMNS)}) VALUES (?, {placeholders})"""
+    rows = [
+        (facility.id_, *(getattr(facility, column) for column in _COLUMNS))
+        for facility in facilities
+    ]
+    conn = sqlite3.connect(db_file)
+    try:
+        with conn:
+            conn.executemany(query, rows)
+    finally:
+        conn.close()
@@ -0,0 +1,59 @@
+"""Minimal stand-ins for the discord objects the hot paths read from"""
+
+from __future__ import annotations
+
+from types import SimpleNamespace
+from typing import Any
+
+
+class FakeTree:
+    async def get_or_fetch_app_command(self, value: str | int, guild=None) -> None:
+        return None
+
+
+class FakeResponse:
+    def __init__(self) -> None:
+        self.sent: list[dict[str, Any]] = []
+
+    def is_done(self) -> bool:
+        return bool(self.sent)
+
+    async def send_message(self, *args, **kwargs) -> None:
+        self.sent.append(kwargs)
+
+    async def edit_message(self, *args, **kwargs) -> None:
+        self.sent.append(kwargs)
+
+    async def defer(self, *args, **kwargs) -> None:
+        self.sent.append(kwargs)
+
+
+class FakeBot:
+    def __init__(self, db=None) -> None:
+        self.tree = FakeTree()
+        self.db = db
+        self.owner_id = 0
+
+
+def fake_guild(guild_id: int = 1, name: str = "Benchmark Guild") -> SimpleNamespace:
+    return SimpleNamespace(id=guild_id, name=name)
+
+
+def fake_interaction(
+    bot: FakeBot, guild_id: int = 1, user_id: int = 1, **namespace: Any
+) -> SimpleNamespace:
+    user = SimpleNamespace(id=user_id, mention=f"<@{user_id}>")
+    response = FakeResponse()
+
+    async def original_response():
+        return None
+
+    return SimpleNamespace(
+        client=bot,
+        guild_id=guild_id,
+        guild=fake_guild(guild_id),
+        user=user,
+        response=response,
+        namespace=SimpleNamespace(**namespace),
+        original_response=original_response,
+    )
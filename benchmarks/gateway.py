@@ -0,0 +1,386 @@
+"""In-process stand-in for the discord gateway and REST API
+
+Payloads are dispatched straight into the bot's `ConnectionState` and every
+outgoing REST call is answered locally, so the real cogs run unmodified.
+"""
+
+from __future__ import annotations
+
+import time
+import random
+import asyncio
+import itertools
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Any
+
+from discord import ClientUser
+from discord.guild import Guild
+from discord.webhook.async_ import AsyncWebhookAdapter, async_context
+
+from cogs.utils.sqlite import Database
+
+
+if TYPE_CHECKING:
+    from discord.http import Route
+
+    from bot import FacilityBot
+
+
+APPLICATION_ID = 100_000_000_000_000_001
+BOT_USER_ID = 100_000_000_000_000_002
+OWNER_ID = 100_000_000_000_000_003
+
+_snowflakes = itertools.count(200_000_000_000_000_000)
+
+
+def snowflake() -> int:
+    return next(_snowflakes)
+
+
+def user_payload(user_id: int, bot: bool = False) -> dict[str, Any]:
+    return {
+        "id": str(user_id),
+        "username": f"user{user_id % 100000}",
+        "discriminator": "0",
+        "global_name": None,
+        "avatar": None,
+        "bot": bot,
+    }
+
+
+def member_payload(user_id: int, permissions: int = 0) -> dict[str, Any]:
+    return {
+        "user": user_payload(user_id),
+        "roles": [],
+        "joined_at": "2023-01-01T00:00:00+00:00",
+        "deaf": False,
+        "mute": False,
+        "flags": 0,
+        "permissions": str(permissions),
+    }
+
+
+def message_payload(
+    message_id: int,
+    channel_id: int,
+    author_id: int = BOT_USER_ID,
+    content: str = "",
+    guild_id: int | None = None,
+    **extra: Any,
+) -> dict[str, Any]:
+    payload = {
+        "id": str(message_id),
+        "channel_id": str(channel_id),
+        "author": user_payload(author_id, bot=author_id == BOT_USER_ID),
+        "content": content,
+        "timestamp": "2023-01-01T00:00:00+00:00",
+        "edited_timestamp": None,
+        "tts": False,
+        "mention_everyone": False,
+        "mentions": [],
+        "mention_roles": [],
+        "attachments": [],
+        "embeds": [],
+        "pinned": False,
+        "type": 0,
+    }
+    if guild_id is not None:
+        payload["guild_id"] = str(guild_id)
+    payload.update(extra)
+    return payload
+
+
+class RestRecorder:
+    """Counts REST calls and resolves waiters when an interaction or message is answered"""
+
+    def __init__(self, latency: float = 0.0) -> None:
+        self.latency: float = latency
+        self.calls: Counter[str] = Counter()
+        self._waiters: dict[int, asyncio.Future] = {}
+        self._original_messages: dict[str, int] = {}
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+    def expect(self, key: int) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[key] = future
+        return future
+
+    def forget(self, key: int) -> None:
+        self._waiters.pop(key, None)
+
+    def _resolve(self, key: int, payload: dict[str, Any] | None) -> None:
+        future = self._waiters.pop(key, None)
+        if future is not None and not future.done():
+            future.set_result(payload or {})
+
+    async def _record(self, route: Route) -> None:
+        self.calls[f"{route.method} {route.path}"] += 1
+        if self.latency:
+            await asyncio.sleep(random.expovariate(1 / self.latency))
+
+    async def http_request(self, route: Route, **kwargs: Any) -> Any:
+        await self._record(route)
+        payload = kwargs.get("json") or {}
+        channel_id = route.channel_id or 0
+
+        if route.method == "POST" and route.path.endswith("/messages"):
+            message_id = snowflake()
+            reference = payload.get("message_reference") or {}
+            if "message_id" in reference:
+                self._resolve(int(reference["message_id"]), payload)
+            return message_payload(
+                message_id, channel_id, embeds=payload.get("embeds", [])
+            )
+        if route.method == "PATCH" and "/messages/" in route.path:
+            message_id = int(route.url.rsplit("/", 1)[-1])
+            return message_payload(
+                message_id, channel_id, embeds=payload.get("embeds", [])
+            )
+        if route.method == "GET" and route.path.endswith("/commands"):
+            return []
+        return None
+
+    async def webhook_request(self, route: Route, **kwargs: Any) -> Any:
+        await self._record(route)
+        payload = kwargs.get("payload") or {}
+        token = route.webhook_token
+
+        if route.path.endswith("/callback"):
+            self._resolve(int(route.webhook_id), payload)
+            return None
+
+        if route.path.endswith("/@original"):
+            message_id = self._original_messages.setdefault(token, snowflake())
+            data = payload or {}
+            return message_payload(
+                message_id,
+                0,
+                embeds=data.get("embeds", []),
+                components=data.get("components", []),
+            )
+
+        if route.method == "POST":
+            return message_payload(snowflake(), 0, embeds=payload.get("embeds", []))
+        return None
+
+
+class FakeWebhookAdapter(AsyncWebhookAdapter):
+    def __init__(self, recorder: RestRecorder) -> None:
+        super().__init__()
+        self.recorder: RestRecorder = recorder
+
+    async def request(self, route: Route, session: Any, **kwargs: Any) -> Any:
+        return await self.recorder.webhook_request(route, **kwargs)
+
+
+class InstrumentedDatabase(Database):
+    """Database that records how many connections are open at once and for how long"""
+
+    def __init__(self, bot: FacilityBot, db_file) -> None:
+        super().__init__(bot, db_file)
+        self.in_flight: int = 0
+        self.peak_in_flight: int = 0
+        self.connections: int = 0
+        self.connection_time: float = 0.0
+        self.locked_errors: int = 0
+
+    @asynccontextmanager
+    async def _connect(self):
+        self.in_flight += 1
+        self.connections += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        start = time.perf_counter()
+        try:
+            async with super()._connect() as conn:
+                yield conn
+        except Exception as exc:
+            if "locked" in str(exc):
+                self.locked_errors += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            self.connection_time += time.perf_counter() - start
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "connections": self.connections,
+            "peak_in_flight": self.peak_in_flight,
+            "connection_time": self.connection_time,
+            "locked_errors": self.locked_errors,
+        }
+
+
+class FakeGateway:
+    """Feeds synthetic gateway events into a bot whose REST layer is answered locally
+
+    Args:
+        bot (FacilityBot): Bot to drive, must be entered with `async with`
+        recorder (RestRecorder): Records REST calls made by the bot
+    """
+
+    def __init__(self, bot: FacilityBot, recorder: RestRecorder) -> None:
+        self.bot: FacilityBot = bot
+        self.recorder: RestRecorder = recorder
+        self.state = bot._connection
+
+    def install(self) -> None:
+        self.bot.http.request = self.recorder.http_request
+        async_context.set(FakeWebhookAdapter(self.recorder))
+        self.state.application_id = APPLICATION_ID
+        self.state.user = ClientUser(
+            state=self.state, data=user_payload(BOT_USER_ID, bot=True)
+        )
+        self.bot.owner_id = OWNER_ID
+
+    def add_guild(
+        self,
+        guild_id: int,
+        channel_ids: list[int],
+        permissions: int = 0xC00,
+        member_ids: list[int] | None = None,
+    ) -> Guild:
+        members = [member_payload(BOT_USER_ID)]
+        members.extend(member_payload(member_id) for member_id in member_ids or ())
+        data = {
+            "id": str(guild_id),
+            "name": f"Guild {guild_id % 100000}",
+            "owner_id": str(OWNER_ID),
+            "roles": [
+                {
+                    "id": str(guild_id),
+                    "name": "@everyone",
+                    "permissions": str(permissions),
+                    "position": 0,
+                    "color": 0,
+                    "hoist": False,
+                    "managed": False,
+                    "mentionable": False,
+                }
+            ],
+            "channels": [
+                {
+                    "id": str(channel_id),
+                    "type": 0,
+                    "name": f"channel-{index}",
+                    "position": index,
+                    "permission_overwrites": [],
+                    "guild_id": str(guild_id),
+                }
+                for index, channel_id in enumerate(channel_ids)
+            ],
+            "members": members,
+            "member_count": len(members) + 1,
+            "features": [],
+            "emojis": [],
+            "stickers": [],
+        }
+        guild = Guild(data=data, state=self.state)
+        self.state._add_guild(guild)
+        return guild
+
+    def _interaction(
+        self,
+        interaction_type: int,
+        data: dict[str, Any],
+        guild_id: int,
+        channel_id: int,
+        user_id: int,
+        permissions: int,
+        **extra: Any,
+    ) -> tuple[int, dict[str, Any]]:
+        interaction_id = snowflake()
+        payload = {
+            "id": str(interaction_id),
+            "application_id": str(APPLICATION_ID),
+            "type": interaction_type,
+            "token": f"token-{interaction_id}",
+            "version": 1,
+            "guild_id": str(guild_id),
+            "channel": {"id": str(channel_id), "type": 0},
+            "channel_id": str(channel_id),
+            "member": member_payload(user_id, permissions),
+            "app_permissions": str(permissions),
+            "locale": "en-US",
+            "data": data,
+        }
+        payload.update(extra)
+        return interaction_id, payload
+
+    def application_command(
+        self,
+        name: str,
+        options: list[dict[str, Any]],
+        *,
+        guild_id: int,
+        channel_id: int,
+        user_id: int,
+        permissions: int = 0,
+        autocomplete: bool = False,
+    ) -> tuple[int, dict[str, Any]]:
+        data = {"id": str(snowflake()), "name": name, "type": 1, "options": options}
+        return self._interaction(
+            4 if autocomplete else 2, data, guild_id, channel_id, user_id, permissions
+        )
+
+    def component(
+        self,
+        custom_id: str,
+        component_type: int,
+        message_id: int,
+        origin_id: int,
+        *,
+        guild_id: int,
+        channel_id: int,
+        user_id: int,
+        values: list[str] | None = None,
+        components: list[dict[str, Any]] | None = None,
+    ) -> tuple[int, dict[str, Any]]:
+        data: dict[str, Any] = {
+            "custom_id": custom_id,
+            "component_type": component_type,
+        }
+        if values is not None:
+            data["values"] = values
+        origin = {
+            "id": str(origin_id),
+            "type": 2,
+            "name": "",
+            "user": user_payload(user_id),
+        }
+        message = message_payload(
+            message_id,
+            channel_id,
+            flags=64,
+            interaction=origin,
+            interaction_metadata=origin,
+            components=components or [],
+        )
+        return self._interaction(
+            3, data, guild_id, channel_id, user_id, 0, message=message
+        )
+
+    def dispatch_interaction(self, payload: dict[str, Any]) -> None:
+        self.state.parse_interaction_create(payload)
+
+    def dispatch_message(
+        self,
+        content: str,
+        *,
+        message_id: int,
+        guild_id: int,
+        channel_id: int,
+        user_id: int,
+    ) -> None:
+        payload = message_payload(
+            message_id,
+            channel_id,
+            author_id=user_id,
+            content=content,
+            guild_id=guild_id,
+            member=member_payload(user_id),
+        )
+        self.state.parse_message_create(payload)
@@ -0,0 +1,524 @@
+"""Replays a mix of interactions from virtual users against the real cogs
+
+Usage:
+    python -m benchmarks.loadtest --guilds 20 --users 200 --duration 30
+    python -m benchmarks.loadtest --mix locate=5,list=1,create=1 --output load.json
+"""
+
+from __future__ import annotations
+
+import json
+import time
+import random
+import asyncio
+import argparse
+import logging
+import tempfile
+import statistics
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from cogs import EXTENSIONS
+from cogs.utils.regions import REGIONS
+from cogs.utils.sqlite import AdaptableList
+from cogs.utils.cost import building_data
+from cogs.utils.defer import AutoDeferGuard
+
+from .dataset import generate_facilities, populate_database
+from .gateway import (
+    FakeGateway,
+    InstrumentedDatabase,
+    RestRecorder,
+    snowflake,
+)
+from .runner import format_seconds, metadata
+
+
+DEFAULT_MIX = {
+    "locate": 4,
+    "list": 2,
+    "autocomplete": 4,
+    "message": 2,
+    "create": 1,
+    "modify": 1,
+    "view": 1,
+}
+ADMINISTRATOR = 8
+
+
+@dataclass
+class GuildFixture:
+    guild_id: int
+    general_id: int
+    list_id: int
+    response_id: int
+    facility_ids: list[int] = field(default_factory=list)
+
+
+@dataclass
+class Sample:
+    operation: str
+    latency: float
+    status: str
+
+
+class LoadTest:
+    """Drives a `FacilityBot` through a `FakeGateway` with concurrent virtual users
+
+    Args:
+        guilds (int): Amount of guilds to simulate
+        users (int): Amount of concurrent virtual users
+        facilities (int): Facilities seeded per guild
+        duration (float): Seconds to run for
+        think_time (float): Mean seconds a user waits between operations
+        mix (dict[str, int]): Relative weight of each operation
+        rest_latency (float): Mean simulated REST latency in seconds
+        timeout (float): Seconds to wait for a response before giving up
+    """
+
+    def __init__(
+        self,
+        *,
+        guilds: int,
+        users: int,
+        facilities: int,
+        duration: float,
+        think_time: float,
+        mix: dict[str, int],
+        rest_latency: float,
+        timeout: float,
+    ) -> None:
+        self.guild_count: int = guilds
+        self.user_count: int = users
+        self.facility_count: int = facilities
+        self.duration: float = duration
+        self.think_time: float = think_time
+        self.mix: dict[str, int] = mix
+        self.timeout: float = timeout
+        self.recorder = RestRecorder(rest_latency)
+        self.samples: list[Sample] = []
+        self.fixtures: list[GuildFixture] = []
+        self.gateway: FakeGateway | None = None
+        self.db: InstrumentedDatabase | None = None
+        self.auto_defer: AutoDeferGuard | None = None
+
+    async def _seed(self, db_file: Path) -> None:
+        facilities = []
+        next_id = 1
+        for index in range(self.guild_count):
+            fixture = GuildFixture(snowflake(), snowflake(), snowflake(), snowflake())
+            self.gateway.add_guild(
+                fixture.guild_id,
+                [fixture.general_id, fixture.list_id, fixture.response_id],
+                ADMINISTRATOR,
+            )
+            guild_facilities = generate_facilities(
+                self.facility_count, fixture.guild_id, seed=index, start_id=next_id
+            )
+            next_id += self.facility_count
+            fixture.facility_ids = [facility.id_ for facility in guild_facilities]
+            facilities.extend(guild_facilities)
+            self.fixtures.append(fixture)
+
+            await self.db.execute(
+                """INSERT INTO list (guild_id, channel_id, messages) VALUES (?, ?, ?)""",
+                fixture.guild_id,
+                fixture.list_id,
+                AdaptableList([snowflake()]),
+            )
+            await self.db.execute(
+                """INSERT INTO response VALUES (?,?)""",
+                fixture.guild_id,
+                AdaptableList([fixture.response_id]),
+            )
+        populate_database(db_file, facilities)
+
+    async def _respond(self, operation: str, key: int, dispatch) -> dict[str, Any]:
+        future = self.recorder.expect(key)
+        start = time.perf_counter()
+        dispatch()
+        try:
+            payload = await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            self.recorder.forget(key)
+            self.samples.append(Sample(operation, self.timeout, "timeout"))
+            return {}
+
+        latency = time.perf_counter() - start
+        self.samples.append(Sample(operation, latency, self._status(payload)))
+        return payload
+
+    @staticmethod
+    def _status(payload: dict[str, Any]) -> str:
+        data = payload.get("data") or payload
+        for embed in data.get("embeds") or []:
+            title = embed.get("title")
+            if title in ("Cooldown", "Error"):
+                return title.lower()
+        return "ok"
+
+    @staticmethod
+    def _find_component(
+        payload: dict[str, Any], component_type: int, label: str | None = None
+    ) -> dict[str, Any] | None:
+        data = payload.get("data") or {}
+        for row in data.get("components") or []:
+            for component in row.get("components", []):
+                if component["type"] != component_type:
+                    continue
+                if label is None or component.get("label") == label:
+                    return component
+        return None
+
+    async def _command(
+        self,
+        operation: str,
+        name: str,
+        options: list[dict[str, Any]],
+        fixture: GuildFixture,
+        user_id: int,
+        autocomplete: bool = False,
+    ) -> tuple[int, dict[str, Any]]:
+        interaction_id, payload = self.gateway.application_command(
+            name,
+            options,
+            guild_id=fixture.guild_id,
+            channel_id=fixture.general_id,
+            user_id=user_id,
+            permissions=ADMINISTRATOR,
+            autocomplete=autocomplete,
+        )
+        response = await self._respond(
+            operation,
+            interaction_id,
+            lambda: self.gateway.dispatch_interaction(payload),
+        )
+        return interaction_id, response
+
+    async def _component(
+        self,
+        operation: str,
+        component: dict[str, Any],
+        message_id: int,
+        origin_id: int,
+        fixture: GuildFixture,
+        user_id: int,
+        values: list[str] | None = None,
+        components: list[dict[str, Any]] | None = None,
+    ) -> dict[str, Any]:
+        interaction_id, payload = self.gateway.component(
+            component["custom_id"],
+            component["type"],
+            message_id,
+            origin_id,
+            guild_id=fixture.guild_id,
+            channel_id=fixture.general_id,
+            user_id=user_id,
+            values=values,
+            components=components,
+        )
+        return await self._respond(
+            operation,
+            interaction_id,
+            lambda: self.gateway.dispatch_interaction(payload),
+        )
+
+    async def op_locate(self, fixture: GuildFixture, user_id: int, rng: random.Random):
+        options = [{"name": "region", "type": 3, "value": rng.choice(tuple(REGIONS))}]
+        if rng.random() < 0.5:
+            options.append({"name": "item-service", "type": 3, "value": "scons"})
+        await self._command("locate", "locate", options, fixture, user_id)
+
+    async def op_list(self, fixture: GuildFixture, user_id: int, rng: random.Random):
+        await self._command("list", "list", [], fixture, user_id)
+
+    async def op_autocomplete(
+        self, fixture: GuildFixture, user_id: int, rng: random.Random
+    ):
+        if rng.random() < 0.5:
+            name = "locate"
+            option = {"name": "region", "value": rng.choice(tuple(REGIONS))[:3]}
+        else:
+            name = "modify"
+            option = {"name": "facility", "value": f"Facility {rng.randint(1, 99)}"}
+        option.update(type=3, focused=True)
+        await self._command(
+            f"autocomplete.{name}", name, [option], fixture, user_id, autocomplete=True
+        )
+
+    async def op_message(self, fixture: GuildFixture, user_id: int, rng: random.Random):
+        content = f"How much does {rng.choice(tuple(building_data))} cost"
+        message_id = snowflake()
+        await self._respond(
+            "message",
+            message_id,
+            lambda: self.gateway.dispatch_message(
+                content,
+                message_id=message_id,
+                guild_id=fixture.guild_id,
+                channel_id=fixture.response_id,
+                user_id=user_id,
+            ),
+        )
+
+    async def op_create(self, fixture: GuildFixture, user_id: int, rng: random.Random):
+        region, markers = rng.choice(tuple(REGIONS.items()))
+        options = [
+            {
+                "name": "facility-name",
+                "type": 3,
+                "value": f"Load {rng.randint(1, 9999)}",
+            },
+            {"name": "region", "type": 3, "value": region},
+            {"name": "marker", "type": 3, "value": rng.choice(markers)},
+            {"name": "maintainer", "type": 3, "value": "Load Test"},
+        ]
+        origin_id, response = await self._command(
+            "create", "create", options, fixture, user_id
+        )
+        await self._finish_services_view(
+            "create", "Create", origin_id, response, fixture, user_id, rng
+        )
+
+    async def op_modify(self, fixture: GuildFixture, user_id: int, rng: random.Random):
+        facility_id = rng.choice(fixture.facility_ids)
+        options = [{"name": "facility", "type": 3, "value": str(facility_id)}]
+        origin_id, response = await self._command(
+            "modify", "modify", options, fixture, user_id
+        )
+        await self._finish_services_view(
+            "modify", "Update", origin_id, response, fixture, user_id, rng
+        )
+
+    async def op_view(self, fixture: GuildFixture, user_id: int, rng: random.Random):
+        ids = rng.sample(fixture.facility_ids, min(3, len(fixture.facility_ids)))
+        options = [{"name": "ids", "type": 3, "value": ",".join(map(str, ids))}]
+        origin_id, response = await self._command(
+            "view", "view", options, fixture, user_id
+        )
+
+        # paginator buttons are dynamic items, pressing them needs the message's components
+        message_id = snowflake()
+        for _ in range(2):
+            button = self._find_component(response, 2, "Next")
+            if button is None or button.get("disabled"):
+                return
+            response = await self._component(
+                "view.page",
+                button,
+                message_id,
+                origin_id,
+                fixture,
+                user_id,
+                components=response["data"]["components"],
+            )
+
+    async def _finish_services_view(
+        self,
+        operation: str,
+        button_label: str,
+        origin_id: int,
+        response: dict[str, Any],
+        fixture: GuildFixture,
+        user_id: int,
+        rng: random.Random,
+    ) -> None:
+        select = self._find_component(response, 3)
+        if select is None:
+            return
+        message_id = snowflake()
+        values = rng.sample([option["value"] for option in select["options"]], 2)
+        response = await self._component(
+            f"{operation}.select",
+            select,
+            message_id,
+            origin_id,
+            fixture,
+            user_id,
+            values,
+        )
+
+        button = self._find_component(response, 2, button_label)
+        if button is None:
+            return
+        await self._component(
+            f"{operation}.submit", button, message_id, origin_id, fixture, user_id
+        )
+
+    async def virtual_user(self, index: int, deadline: float) -> None:
+        rng = random.Random(index)
+        user_id = snowflake()
+        fixture = self.fixtures[index % len(self.fixtures)]
+        operations, weights = zip(*self.mix.items())
+
+        await asyncio.sleep(rng.uniform(0, min(self.think_time, self.duration)))
+        while time.perf_counter() < deadline:
+            operation = rng.choices(operations, weights)[0]
+            await getattr(self, f"op_{operation}")(fixture, user_id, rng)
+            remaining = deadline - time.perf_counter()
+            await asyncio.sleep(min(rng.expovariate(1 / self.think_time), remaining))
+
+    async def run(self) -> dict[str, Any]:
+        from bot import FacilityBot
+
+        with tempfile.TemporaryDirectory() as directory:
+            db_file = Path(directory) / "load.sqlite"
+            bot = FacilityBot()
+            async with bot:
+                self.db = bot.db = InstrumentedDatabase(bot, db_file)
+                self.gateway = FakeGateway(bot, self.recorder)
+                self.gateway.install()
+                self.auto_defer = bot.tree.auto_defer
+                bot.rest.start()
+                await self.db.create()
+
+                await bot.load_extensions(EXTENSIONS)
+                # seeded first, as a real bot warms up against an existing database
+                await self._seed(db_file)
+                await bot.warmup()
+                self.recorder.calls.clear()
+
+                start = time.perf_counter()
+                deadline = start + self.duration
+                await asyncio.gather(
+                    *(self.virtual_user(i, deadline) for i in range(self.user_count))
+                )
+                elapsed = time.perf_counter() - start
+
+                # let listeners such as list updates finish before reporting
+                await asyncio.sleep(0.5)
+
+        return self.report(elapsed)
+
+    def report(self, elapsed: float) -> dict[str, Any]:
+        by_operation: dict[str, list[Sample]] = defaultdict(list)
+        for sample in self.samples:
+            by_operation[sample.operation].append(sample)
+
+        operations = {}
+        for operation, samples in sorted(by_operation.items()):
+            latencies = sorted(sample.latency for sample in samples)
+            operations[operation] = {
+                "count": len(samples),
+                "statuses": dict(Counter(sample.status for sample in samples)),
+                "p50": percentile(latencies, 50),
+                "p95": percentile(latencies, 95),
+                "p99": percentile(latencies, 99),
+                "max": latencies[-1],
+                "mean": statistics.fmean(latencies),
+            }
+
+        return {
+            "meta": metadata(),
+            "config": {
+                "guilds": self.guild_count,
+                "users": self.user_count,
+                "facilities_per_guild": self.facility_count,
+                "duration": self.duration,
+                "think_time": self.think_time,
+                "mix": self.mix,
+                "rest_latency": self.recorder.latency,
+            },
+            "elapsed": elapsed,
+            "throughput": len(self.samples) / elapsed if elapsed else 0,
+            "operations": operations,
+            "rest_calls": {
+                "total": self.recorder.total_calls,
+                "routes": dict(self.recorder.calls.most_common()),
+            },
+            "database": self.db.stats(),
+            "auto_defer": self.auto_defer.stats(),
+        }
+
+
+def percentile(sorted_values: list[float], percent: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, round(percent / 100 * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+def print_report(report: dict[str, Any]) -> None:
+    print(
+        f"{sum(op['count'] for op in report['operations'].values())} operations in "
+        f"{report['elapsed']:.1f}s ({report['throughput']:.1f}/s)"
+    )
+    for name, op in report["operations"].items():
+        statuses = ", ".join(f"{k}={v}" for k, v in op["statuses"].items())
+        print(
+            f"{name:<24} n={op['count']:<6} p50={format_seconds(op['p50']):>10} "
+            f"p95={format_seconds(op['p95']):>10} p99={format_seconds(op['p99']):>10} "
+            f"max={format_seconds(op['max']):>10} {statuses}"
+        )
+
+    rest = report["rest_calls"]
+    print(f"\nREST calls: {rest['total']}")
+    for route, count in list(rest["routes"].items())[:10]:
+        print(f"{count:>8} {route}")
+
+    db = report["database"]
+    print(
+        f"\nDatabase: {db['connections']} connections, peak {db['peak_in_flight']} "
+        f"in flight, {db['connection_time']:.2f}s connected, "
+        f"{db['locked_errors']} locked errors"
+    )
+
+    late = {
+        name: stats
+        for name, stats in report["auto_defer"].items()
+        if stats["deferred"] or stats["slow"]
+    }
+    if late:
+        print("\nOver the response budget:")
+        for name, stats in late.items():
+            print(
+                f"{name:<24} deferred={stats['deferred']} slow={stats['slow']} "
+                f"of {stats['invoked']}"
+            )
+
+
+def parse_mix(value: str) -> dict[str, int]:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"Unknown operation {name!r}")
+        mix[name] = int(weight or 1)
+    return mix
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.loadtest")
+    parser.add_argument("--guilds", type=int, default=10)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--facilities", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--think-time", type=float, default=5)
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX)
+    parser.add_argument("--rest-latency", type=float, default=0.05)
+    parser.add_argument("--timeout", type=float, default=10)
+    parser.add_argument("--output", type=Path)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    load_test = LoadTest(
+        guilds=args.guilds,
+        users=args.users,
+        facilities=args.facilities,
+        duration=args.duration,
+        think_time=args.think_time,
+        mix=args.mix,
+        rest_latency=args.rest_latency,
+        timeout=args.timeout,
+    )
+    report = asyncio.run(load_test.run())
+    print_report(report)
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""Compares resident memory of the member cache profiles across many simulated guilds
+
+Each profile runs in a fresh interpreter so allocations from one don't hide
+the other.
+
+Usage:
+    python -m benchmarks.memory --guilds 1000 --members 100
+    python -m benchmarks.memory --profiles minimal --interactions 20000
+"""
+
+from __future__ import annotations
+
+import gc
+import os
+import sys
+import json
+import asyncio
+import argparse
+import logging
+import subprocess
+from typing import Any
+
+from .gateway import FakeGateway, RestRecorder, snowflake
+
+
+PROFILES = ("full", "minimal")
+
+
+def rss_bytes() -> int:
+    """Current resident set size, falls back to the peak where /proc isn't available"""
+    try:
+        with open("/proc/self/statm") as statm:
+            pages = int(statm.read().split()[1])
+    except OSError:
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # bytes on macOS, kilobytes elsewhere
+        return peak if sys.platform == "darwin" else peak * 1024
+    else:
+        return pages * os.sysconf("SC_PAGE_SIZE")
+
+
+async def measure(
+    profile: str, guilds: int, members: int, interactions: int
+) -> dict[str, Any]:
+    from bot import FacilityBot
+
+    gc.collect()
+    result: dict[str, Any] = {"profile": profile}
+
+    bot = FacilityBot(cache_profile=profile)
+    async with bot:
+        gateway = FakeGateway(bot, RestRecorder())
+        gateway.install()
+        gc.collect()
+        result["rss_start"] = rss_bytes()
+
+        fixtures = []
+        for _ in range(guilds):
+            guild_id, channel_id = snowflake(), snowflake()
+            member_ids = [snowflake() for _ in range(members)]
+            gateway.add_guild(guild_id, [channel_id], member_ids=member_ids)
+            fixtures.append((guild_id, channel_id, member_ids))
+        gc.collect()
+        result["rss_guilds"] = rss_bytes()
+
+        for index in range(interactions):
+            guild_id, channel_id, member_ids = fixtures[index % len(fixtures)]
+            # cycles through each guild's members, whatever the guild count
+            member = index // len(fixtures)
+            user_id = (
+                member_ids[member % len(member_ids)] if member_ids else snowflake()
+            )
+            _, payload = gateway.component(
+                "memory:unknown",
+                2,
+                snowflake(),
+                snowflake(),
+                guild_id=guild_id,
+                channel_id=channel_id,
+                user_id=user_id,
+            )
+            gateway.dispatch_interaction(payload)
+            if index % 100 == 0:
+                await asyncio.sleep(0)
+        await asyncio.sleep(0.1)
+        gc.collect()
+        result["rss_interactions"] = rss_bytes()
+
+        result["cached_members"] = sum(len(guild.members) for guild in bot.guilds)
+    return result
+
+
+def run_profile(
+    profile: str, guilds: int, members: int, interactions: int
+) -> dict[str, Any]:
+    command = [
+        sys.executable,
+        "-m",
+        "benchmarks.memory",
+        "--profiles",
+        profile,
+        "--guilds",
+        str(guilds),
+        "--members",
+        str(members),
+        "--interactions",
+        str(interactions),
+        "--child",
+    ]
+    output = subprocess.run(command, check=True, capture_output=True, text=True)
+    return json.loads(output.stdout.splitlines()[-1])
+
+
+def format_bytes(size: float) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if abs(size) < 1024:
+            return f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}GiB"
+
+
+def print_results(results: list[dict[str, Any]]) -> None:
+    print(
+        f"{'profile':<10} {'start':>10} {'guilds':>10} {'after use':>10} "
+        f"{'growth':>10} {'members':>9}"
+    )
+    for result in results:
+        growth = result["rss_interactions"] - result["rss_start"]
+        print(
+            f"{result['profile']:<10} {format_bytes(result['rss_start']):>10} "
+            f"{format_bytes(result['rss_guilds']):>10} "
+            f"{format_bytes(result['rss_interactions']):>10} "
+            f"{format_bytes(growth):>10} {result['cached_members']:>9}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.memory")
+    parser.add_argument("--profiles", nargs="+", choices=PROFILES, default=PROFILES)
+    parser.add_argument("--guilds", type=int, default=1000)
+    parser.add_argument("--members", type=int, default=100)
+    parser.add_argument("--interactions", type=int, default=10000)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+
+    if args.child:
+        result = asyncio.run(
+            measure(args.profiles[0], args.guilds, args.members, args.interactions)
+        )
+        print(json.dumps(result))
+        return
+
+    results = [
+        run_profile(profile, args.guilds, args.members, args.interactions)
+        for profile in args.profiles
+    ]
+    print_results(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import gc
+import json
+import inspect
+import time
+import platform
+import statistics
+import subprocess
+from dataclasses import dataclass, asdict, field
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    size: int
+    rounds: int
+    timings: list[float] = field(repr=False)
+
+    @property
+    def minimum(self) -> float:
+        return min(self.timings)
+
+    @property
+    def median(self) -> float:
+        return statistics.median(self.timings)
+
+    @property
+    def mean(self) -> float:
+        return statistics.fmean(self.timings)
+
+    @property
+    def stdev(self) -> float:
+        return statistics.stdev(self.timings) if len(self.timings) > 1 else 0.0
+
+    def to_dict(self) -> dict[str, Any]:
+        data = asdict(self)
+        del data["timings"]
+        data.update(
+            min=self.minimum, median=self.median, mean=self.mean, stdev=self.stdev
+        )
+        return data
+
+
+class Runner:
+    """Times callables until a minimum amount of time or rounds is reached
+
+    Args:
+        min_time (float): Seconds each benchmark should run for at least
+        max_rounds (int): Upper limit of rounds per benchmark
+        min_rounds (int): Lower limit of rounds per benchmark
+    """
+
+    def __init__(
+        self, min_time: float = 1.0, max_rounds: int = 200, min_rounds: int = 3
+    ) -> None:
+        self.min_time: float = min_time
+        self.max_rounds: int = max_rounds
+        self.min_rounds: int = min_rounds
+        self.results: list[BenchmarkResult] = []
+
+    async def run(
+        self, name: str, size: int, func: Callable[[], Awaitable[Any] | Any]
+    ) -> BenchmarkResult:
+        timings: list[float] = []
+        started = time.perf_counter()
+        gc.collect()
+        while len(timings) < self.max_rounds:
+            start = time.perf_counter()
+            result = func()
+            if inspect.isawaitable(result):
+                await result
+            timings.append(time.perf_counter() - start)
+
+            if (
+                len(timings) >= self.min_rounds
+                and time.perf_counter() - started >= self.min_time
+            ):
+                break
+
+        bench_result = BenchmarkResult(name, size, len(timings), timings)
+        self.results.append(bench_result)
+        print(
+            f"{name:<40} n={size:<7} rounds={len(timings):<4} "
+            f"median={format_seconds(bench_result.median):>10} "
+            f"min={format_seconds(bench_result.minimum):>10}"
+        )
+        return bench_result
+
+    def write(self, output: Path) -> None:
+        data = {"meta": metadata(), "results": [r.to_dict() for r in self.results]}
+        output.write_text(json.dumps(data, indent=2), encoding="utf-8")
+
+
+def format_seconds(seconds: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f}{unit}"
+    return f"{seconds / 1e-9:.0f}ns"
+
+
+def metadata() -> dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ("git", "rev-parse", "HEAD"),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        "commit": commit,
+        "timestamp": int(time.time()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+    }
+
+
+def compare(baseline: Path, current: Path) -> None:
+    """Prints the change in median time between two result files
+
+    Args:
+        baseline (Path): Older results
+        current (Path): Newer results
+    """
+    old = json.loads(baseline.read_text(encoding="utf-8"))
+    new = json.loads(current.read_text(encoding="utf-8"))
+    old_results = {(r["name"], r["size"]): r for r in old["results"]}
+
+    print(f"{old['meta']['commit']} -> {new['meta']['commit']}")
+    for result in new["results"]:
+        key = (result["name"], result["size"])
+        previous = old_results.get(key)
+        if previous is None:
+            print(f"{result['name']:<40} n={result['size']:<7} (new)")
+            continue
+        ratio = result["median"] / previous["median"] if previous["median"] else 0
+        print(
+            f"{result['name']:<40} n={result['size']:<7} "
+            f"{format_seconds(previous['median']):>10} -> "
+            f"{format_seconds(result['median']):>10} ({ratio:.2f}x)"
+        )
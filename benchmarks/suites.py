@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import random
+from pathlib import Path
+
+from discord import Object
+
+from cogs.events import process_response
+from cogs.facility import (
+    MarkerTransformer,
+    LocationTransformer,
+    VehicleTransformer,
+    ItemTransformer,
+)
+from cogs.utils.embeds import create_list
+from cogs.utils.facility import Facility
+from cogs.utils.flags import ItemServiceFlags, VehicleServiceFlags
+from cogs.utils.paginator import Paginator
+from cogs.utils.sqlite import Database
+from cogs.utils.transformers import FacilityTransformer
+
+from .dataset import generate_facilities, populate_database
+from .fakes import FakeBot, fake_guild, fake_interaction
+from .runner import Runner
+
+
+RESPONSE_QUERIES = (
+    "a materials factory",
+    "forge",
+    "the cracking unit?",
+    "heavy tank assembly",
+    "something that doesn't exist",
+)
+AUTOCOMPLETE_QUERIES = ("", "fa", "facility 1", "dep", "works 9")
+
+
+async def bench_rendering(runner: Runner, facilities: list[Facility]) -> None:
+    size = len(facilities)
+    bot = FakeBot()
+    guild = fake_guild()
+    item_highlight = ItemServiceFlags(ItemServiceFlags.scons.flag_value)
+    vehicle_highlight = VehicleServiceFlags(VehicleServiceFlags.motor_pool.flag_value)
+
+    def render_embeds():
+        for facility in facilities:
+            facility.embeds()
+
+    def render_highlighted_embeds():
+        for facility in facilities:
+            facility.embeds(item_highlight, vehicle_highlight, "Percutio")
+
+    await runner.run("facility.embeds", size, render_embeds)
+    await runner.run("facility.embeds_highlighted", size, render_highlighted_embeds)
+    await runner.run(
+        "embeds.create_list", size, lambda: create_list(facilities[:], guild, bot)
+    )
+
+    pages = [facility.embeds() for facility in facilities]
+    interaction = fake_interaction(bot)
+    author = Object(1)
+
+    async def paginate():
+        paginator = Paginator(original_author=author)
+        await paginator.start(interaction, pages)
+        for page_number in range(min(len(pages), 50)):
+            await paginator.show_page(interaction, page_number)
+        paginator.stop()
+
+    await runner.run("paginator.start_and_page", size, paginate)
+
+
+async def bench_storage(
+    runner: Runner, facilities: list[Facility], directory: Path
+) -> None:
+    size = len(facilities)
+    db_file = directory / f"bench_{size}.sqlite"
+    db_file.unlink(missing_ok=True)
+
+    db = Database(None, db_file)
+    await db.create()
+    populate_database(db_file, facilities)
+    bot = FakeBot(db)
+
+    rng = random.Random(size)
+    lookup_ids = [rng.randint(1, size) for _ in range(25)]
+    author_id = facilities[0].author
+    region = facilities[0].region
+
+    await runner.run(
+        "database.get_facilities_guild",
+        size,
+        lambda: db.get_facilities({" guild_id == ? ": 1}),
+    )
+    await runner.run(
+        "database.get_facilities_filtered",
+        size,
+        lambda: db.get_facilities(
+            {
+                " region == ? ": region,
+                " item_services & ? ": ItemServiceFlags.scons.flag_value,
+                " guild_id == ? ": 1,
+            }
+        ),
+    )
+    await runner.run(
+        "database.get_facilities_author",
+        size,
+        lambda: db.get_facilities({" guild_id == ? ": 1, " author == ? ": author_id}),
+    )
+    await runner.run(
+        "database.get_facility_ids_25", size, lambda: db.get_facility_ids(lookup_ids, 1)
+    )
+
+    transformer = FacilityTransformer()
+    interaction = fake_interaction(bot)
+
+    async def facility_autocomplete():
+        for query in AUTOCOMPLETE_QUERIES:
+            await transformer.autocomplete(interaction, query)
+
+    await runner.run("transformers.facility_autocomplete", size, facility_autocomplete)
+
+    db_file.unlink(missing_ok=True)
+
+
+async def bench_static(runner: Runner) -> None:
+    bot = FakeBot()
+    marker_transformer = MarkerTransformer()
+    location_transformer = LocationTransformer()
+    vehicle_transformer = VehicleTransformer()
+    item_transformer = ItemTransformer()
+    marker_interaction = fake_interaction(bot, region="")
+    region_interaction = fake_interaction(bot, region="Origin")
+
+    async def marker_autocomplete():
+        for query in AUTOCOMPLETE_QUERIES:
+            await marker_transformer.autocomplete(marker_interaction, query)
+            await marker_transformer.autocomplete(region_interaction, query)
+
+    async def location_autocomplete():
+        for query in AUTOCOMPLETE_QUERIES:
+            await location_transformer.autocomplete(marker_interaction, query)
+
+    async def vehicle_autocomplete():
+        for query in AUTOCOMPLETE_QUERIES:
+            await vehicle_transformer.autocomplete(marker_interaction, query)
+
+    async def item_autocomplete():
+        for query in AUTOCOMPLETE_QUERIES:
+            await item_transformer.autocomplete(marker_interaction, query)
+
+    def responses():
+        for query in RESPONSE_QUERIES:
+            process_response(query)
+
+    await runner.run("transformers.marker_autocomplete", 0, marker_autocomplete)
+    await runner.run("transformers.location_autocomplete", 0, location_autocomplete)
+    await runner.run("transformers.vehicle_autocomplete", 0, vehicle_autocomplete)
+    await runner.run("transformers.item_autocomplete", 0, item_autocomplete)
+    await runner.run("events.process_response", 0, responses)
+
+
+SUITES = ("rendering", "storage", "static")
+
+
+async def run_suites(
+    runner: Runner, sizes: list[int], suites: list[str], directory: Path
+) -> None:
+    if "static" in suites:
+        await bench_static(runner)
+
+    for size in sizes:
+        facilities = generate_facilities(size)
+        if "rendering" in suites:
+            await bench_rendering(runner, facilities)
+        if "storage" in suites:
+            await bench_storage(runner, facilities, directory)
@@ -1,9 +1,11 @@
 from __future__ import annotations
 
 import logging
+import asyncio
+import time
 import sys
 import os
-from typing import TYPE_CHECKING, Optional
+from typing import TYPE_CHECKING, Any, Iterable, Optional
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -11,7 +13,14 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 
-from cogs import EXTENSIONS
+from cogs import EXTENSIONS, LAZY_EXTENSIONS
+from cogs.utils.sharding import ShardMonitor
+from cogs.utils.cluster import ClusterClient
+from cogs.utils.scheduler import RestScheduler
+from cogs.utils.defer import AutoDeferGuard
+from cogs.utils.embeds import HelpEmbed, ephemeral_info
+from cogs.utils.regions import Gazetteer
+from cogs.utils.backup import SnapshotService
 
 
 if TYPE_CHECKING:
@@ -31,6 +40,13 @@ DB_FILE = Path() / "data.sqlite"
 BOT_PREFIX = os.environ.get("BOT_PREFIX")
 # token to use
 TOKEN = os.environ.get("BOT_TOKEN")
+# shard count to use, 'auto' lets discord decide, unset disables sharding
+SHARD_COUNT = os.environ.get("SHARD_COUNT")
+# comma separated shard ID's for this process to run, defaults to all shards
+SHARD_IDS = os.environ.get("SHARD_IDS")
+# 'full' caches every member, 'minimal' only keeps members recently seen in interactions
+CACHE_PROFILE = os.environ.get("CACHE_PROFILE", "full")
+# recently seen members kept, mainly useful with the minimal cache profile
 
 
 class EmbedHelp(commands.MinimalHelpCommand):
@@ -46,29 +62,47 @@ class CommandTree(app_commands.CommandTree):
         super().__init__(*args, **kwargs)
         self._global_app_commands: AppCommandStore = {}
         self._guild_app_commands: dict[int, AppCommandStore] = {}
+        self._global_app_command_ids: dict[int, app_commands.AppCommand] = {}
+        self._guild_app_command_ids: dict[int, dict[int, app_commands.AppCommand]] = {}
+        # None is the global scope
+        self._fetched_scopes: set[int | None] = set()
+        # embeds built from command mentions, cleared when the commands change
+        self.rendered: dict[str, discord.Embed] = {}
+        self.auto_defer = AutoDeferGuard()
+
+    async def _call(self, interaction: discord.Interaction) -> None:
+        if interaction.type is not discord.InteractionType.application_command:
+            return await super()._call(interaction)
+
+        timer = self.auto_defer.install(interaction)
+        try:
+            await super()._call(interaction)
+        finally:
+            timer.cancel()
+            self.auto_defer.finished(interaction)
 
     def get_app_command(
         self,
         value: str | int,
         guild: Snowflake | int | None = None,
     ) -> app_commands.AppCommand | None:
-        def search_dict(d: AppCommandStore) -> app_commands.AppCommand | None:
-            for cmd_name, cmd in d.items():
-                if value == cmd_name or (str(value).isdigit() and int(value) == cmd.id):
-                    return cmd
-            return None
+        def search_store(
+            names: AppCommandStore, ids: dict[int, app_commands.AppCommand]
+        ) -> app_commands.AppCommand | None:
+            command = names.get(str(value))
+            if command is None and str(value).isdigit():
+                command = ids.get(int(value))
+            return command
 
         if guild:
             guild_id = guild.id if not isinstance(guild, int) else guild
-            guild_commands = self._guild_app_commands.get(guild_id, {})
-            if not self.fallback_to_global:
-                return search_dict(guild_commands)
-            else:
-                return search_dict(guild_commands) or search_dict(
-                    self._global_app_commands
-                )
-        else:
-            return search_dict(self._global_app_commands)
+            guild_command = search_store(
+                self._guild_app_commands.get(guild_id, {}),
+                self._guild_app_command_ids.get(guild_id, {}),
+            )
+            if guild_command is not None or not self.fallback_to_global:
+                return guild_command
+        return search_store(self._global_app_commands, self._global_app_command_ids)
 
     async def get_or_fetch_app_command(
         self,
@@ -79,9 +113,26 @@ class CommandTree(app_commands.CommandTree):
         if command is not None:
             return command
 
-        await self.fetch_commands(guild=guild)
-        command = self.get_app_command(value, guild)
-        return command
+        # each scope is only fetched once, later misses are commands that don't exist
+        guild_id = guild if guild is None or isinstance(guild, int) else guild.id
+        if guild_id in self._fetched_scopes:
+            return None
+
+        await self.fetch_commands(
+            guild=discord.Object(guild_id) if guild_id is not None else None
+        )
+        return self.get_app_command(value, guild)
+
+    async def warmup(self) -> None:
+        """Fetches global commands and the commands of guilds with guild commands
+        so lookups during interactions never need a request"""
+        scopes: list[Snowflake | None] = [None]
+        scopes.extend(discord.Object(guild_id) for guild_id in self._guild_commands)
+        for guild in scopes:
+            try:
+                await self.fetch_commands(guild=guild)
+            except discord.HTTPException:
+                logger.exception("Failed fetching commands for %r", guild and guild.id)
 
     async def fetch_command(
         self, command_id: int, /, *, guild: Snowflake | None = None
@@ -133,12 +184,18 @@ class CommandTree(app_commands.CommandTree):
             else:
                 _guild = guild
 
+        names = self._unpack_app_commands(command_list)
+        ids = {command.id: command for command in command_list}
         if _guild:
-            self._guild_app_commands[_guild.id] = self._unpack_app_commands(
-                command_list
-            )
+            self._guild_app_commands[_guild.id] = names
+            self._guild_app_command_ids[_guild.id] = ids
+            self._fetched_scopes.add(_guild.id)
         else:
-            self._global_app_commands = self._unpack_app_commands(command_list)
+            self._global_app_commands = names
+            self._global_app_command_ids = ids
+            self._fetched_scopes.add(None)
+        # mentions in rendered embeds may have changed
+        self.rendered.clear()
 
     async def sync(
         self, *, guild: Snowflake | None = None
@@ -148,24 +205,66 @@ class CommandTree(app_commands.CommandTree):
         return res
 
 
-class FacilityBot(commands.Bot):
-    tree: CommandTree
+def cache_options(profile: str = CACHE_PROFILE) -> dict[str, Any]:
+    """Intents and member cache options for a cache profile
 
-    def __init__(self) -> None:
+    Args:
+        profile (str): 'full' or 'minimal'
+
+    Raises:
+        ValueError: Unknown profile
+
+    Returns:
+        dict[str, Any]: Keyword arguments for the client
+    """
+    if profile == "full":
         intents = discord.Intents(
             guilds=True, members=True, messages=True, message_content=True
         )
+        return {"intents": intents}
+    if profile == "minimal":
+        # members arrive with interactions and messages, nothing needs the member list
+        intents = discord.Intents(guilds=True, messages=True, message_content=True)
+        return {
+            "intents": intents,
+            "member_cache_flags": discord.MemberCacheFlags.none(),
+            "chunk_guilds_at_startup": False,
+        }
+    raise ValueError(f"Unknown cache profile {profile!r}")
+
+
+class FacilityBot(commands.Bot):
+    tree: CommandTree
+
+    def __init__(
+        self,
+        *,
+        cluster: ClusterClient | None = None,
+        cache_profile: str = CACHE_PROFILE,
+        **options,
+    ) -> None:
+        options = cache_options(cache_profile) | options
         super().__init__(
             command_prefix=commands.when_mentioned_or(BOT_PREFIX or "."),
-            intents=intents,
             help_command=EmbedHelp(),
             tree_cls=CommandTree,
+            **options,
         )
-        self.guild_logs: dict[str, deque] = {}
+        self.cache_profile: str = cache_profile
+        self.shard_monitor = ShardMonitor(lambda: self.shard_count or 1)
+        self.guild_logs: dict[int, deque] = {}
+        self.cluster: ClusterClient = cluster or ClusterClient()
+        self.rest = RestScheduler(self.http, workers=8)
+        self.lazy_extensions: list[str] = list(LAZY_EXTENSIONS)
+        self.extension_timings: dict[str, float] = {}
+        self.gazetteer = Gazetteer()
+        # channels answering "how much does" questions by guild
+        self.response_channels: dict[int, set[int]] = {}
 
         from cogs.utils.sqlite import Database
 
         self.db = Database(self, DB_FILE)
+        self.snapshots = SnapshotService(DB_FILE)
 
     async def start(self) -> None:
         await super().start(TOKEN)
@@ -177,22 +276,111 @@ class FacilityBot(commands.Bot):
         else:
             self.owner_id = app.owner.id
 
-        for extension in EXTENSIONS:
+        self.shard_monitor.install(self._connection)
+        await self.cluster.connect()
+        self.rest.start()
+
+        # cogs may read from the database when loading
+        if not DB_FILE.exists():
+            await self.db.create()
+        else:
+            await self.db.migrate()
+
+        start = time.perf_counter()
+        await self.load_extensions(EXTENSIONS)
+        logger.info(
+            "Loaded %r extensions in %.0fms, %r deferred",
+            len(self.extension_timings),
+            (time.perf_counter() - start) * 1000,
+            len(self.lazy_extensions),
+        )
+
+        await self.warmup()
+
+    async def load_extensions(self, extensions: Iterable[str]) -> None:
+        """Loads extensions concurrently, recording how long each took
+
+        Extensions load independently, a failure is logged and doesn't stop the others
+
+        Args:
+            extensions (Iterable[str]): Extensions to load
+        """
+
+        async def load(extension: str) -> None:
+            start = time.perf_counter()
             try:
                 await self.load_extension(extension)
             except commands.ExtensionError:
                 logger.exception("Failed loading exension %r", extension)
-            else:
-                logger.info("Loaded extension %r", extension)
-
-        if not DB_FILE.exists():
-            await self.db.create()
+                return
+            elapsed = time.perf_counter() - start
+            self.extension_timings[extension] = elapsed
+            logger.info("Loaded extension %r in %.0fms", extension, elapsed * 1000)
+
+        await asyncio.gather(*(load(extension) for extension in extensions))
+
+    async def load_lazy_extensions(self) -> None:
+        extensions, self.lazy_extensions = self.lazy_extensions, []
+        await self.load_extensions(extensions)
+
+    async def process_commands(self, message: discord.Message) -> None:
+        if message.author.bot:
+            return
+
+        ctx = await self.get_context(message)
+        if (
+            ctx.command is None
+            and ctx.invoked_with
+            and self.lazy_extensions
+            and await self.is_owner(message.author)
+        ):
+            await self.load_lazy_extensions()
+            ctx = await self.get_context(message)
+        await self.invoke(ctx)
+
+    async def warmup(self) -> None:
+        """Fills caches that interactions would otherwise fill on first use"""
+        await self.reload_data()
+        await self.tree.warmup()
+        try:
+            await HelpEmbed.create(self)
+            await ephemeral_info(self)
+        except discord.HTTPException:
+            # a failed command fetch shouldn't stop startup, they render on first use
+            logger.exception("Failed rendering embeds with command mentions")
+
+    async def reload_data(self) -> None:
+        """Reloads state derived from the database, after it's replaced"""
+        self.gazetteer.load(await self.db.marker_coordinates())
+        self.response_channels = await self.db.response_channels()
+
+    async def close(self) -> None:
+        await self.cluster.close()
+        await self.rest.close()
+        await super().close()
 
     async def on_ready(self) -> None:
         logger.info("Logged in as %r (ID: %r)", self.user.name, self.user.id)
         logger.info("Discordpy version: %r", discord.__version__)
         logger.info("Python version: %r", sys.version)
 
+    async def on_connect(self) -> None:
+        self.shard_monitor.connected(self.shard_id)
+
+    async def on_disconnect(self) -> None:
+        self.shard_monitor.disconnected(self.shard_id)
+
+    async def on_resumed(self) -> None:
+        self.shard_monitor.resumed(self.shard_id)
+
+    def shard_latencies(self) -> list[tuple[int, float]]:
+        """Latency of each shard run by this process
+
+        Returns:
+            list[tuple[int, float]]: Shard ID and latency in seconds
+        """
+        return [(self.shard_id or 0, self.latency)]
+
     async def lazy_fetch_channel(
         self, channel_id: int, raise_for_fail: bool = True
     ) -> Optional[
@@ -332,3 +520,76 @@ class FacilityBot(commands.Bot):
             return None
         else:
             return guild
+
+
+class ShardedFacilityBot(FacilityBot, commands.AutoShardedBot):
+    """FacilityBot that runs one or more shards over separate gateway connections"""
+
+    async def on_connect(self) -> None:
+        pass
+
+    async def on_disconnect(self) -> None:
+        pass
+
+    async def on_resumed(self) -> None:
+        pass
+
+    async def on_shard_connect(self, shard_id: int) -> None:
+        self.shard_monitor.connected(shard_id)
+
+    async def on_shard_disconnect(self, shard_id: int) -> None:
+        self.shard_monitor.disconnected(shard_id)
+
+    async def on_shard_resumed(self, shard_id: int) -> None:
+        self.shard_monitor.resumed(shard_id)
+
+    async def on_shard_ready(self, shard_id: int) -> None:
+        logger.info("Shard %r ready", shard_id)
+
+    def shard_latencies(self) -> list[tuple[int, float]]:
+        return self.latencies
+
+
+def parse_shard_config(
+    shard_count: str | None = SHARD_COUNT, shard_ids: str | None = SHARD_IDS
+) -> dict[str, int | list[int] | None] | None:
+    """Parses sharding options from the environment
+
+    Args:
+        shard_count (str, optional): Shard count or 'auto'
+        shard_ids (str, optional): Comma separated shard ID's
+
+    Raises:
+        ValueError: Invalid shard configuration
+
+    Returns:
+        dict | None: Keyword arguments for ShardedFacilityBot, None if sharding is disabled
+    """
+    if not shard_count and not shard_ids:
+        return None
+
+    count = None
+    if shard_count and shard_count.lower() != "auto":
+        count = int(shard_count)
+
+    ids = None
+    if shard_ids:
+        ids = [int(shard_id) for shard_id in shard_ids.split(",") if shard_id.strip()]
+        if count is None:
+            raise ValueError("SHARD_COUNT must be set when using SHARD_IDS")
+        if any(not 0 <= shard_id < count for shard_id in ids):
+            raise ValueError("SHARD_IDS must be between 0 and SHARD_COUNT")
+
+    return {"shard_count": count, "shard_ids": ids}
+
+
+def create_bot() -> FacilityBot:
+    """Creates a sharded bot if configured, otherwise a single connection bot
+
+    Returns:
+        FacilityBot: Bot to run
+    """
+    shard_config = parse_shard_config()
+    if shard_config is None:
+        return FacilityBot()
+    return ShardedFacilityBot(**shard_config)
@@ -5,4 +5,5 @@ COG_DIR = Path("cogs")
 EXTENSIONS = [
     ".".join(result.with_suffix("").parts) for result in COG_DIR.glob("[!_]*.py")
 ]
-EXTENSIONS.append("jishaku")
+# owner and dev tools, loaded the first time an owner runs an unknown command
+LAZY_EXTENSIONS = ["jishaku"]
@@ -1,15 +1,42 @@
 from __future__ import annotations
 
+import logging
+import tempfile
+import time
 from typing import TYPE_CHECKING, Optional
 
-from discord import app_commands, Member, Permissions
-from discord.ext import commands
+from discord import app_commands, Attachment, File, Member, Permissions
+from discord.ext import commands, tasks
 
 from .utils.facility import Facility
+from .utils.flags import VehicleServiceFlags
+from .utils.paginator import FacilityPages
+from .utils.query import ServiceQuery
 from .utils.views import ModifyFacilityView, RemoveFacilitiesView
 from .utils.embeds import FeedbackEmbed, FeedbackType
-from .utils.transformers import FacilityTransformer, IdTransformer
+from .utils.transformers import FacilityTransformer, IdTransformer, QueryTransformer
 from .utils.errors import MessageError
+from .utils.defer import auto_defer
+from .utils.importer import (
+    IMPORT_CHUNK_SIZE,
+    MAX_IMPORT_BYTES,
+    MAX_IMPORT_ROWS,
+    ImportRowError,
+    build_facility,
+    iter_records,
+)
+from .utils.exporter import (
+    EXPORT_CHUNK_SIZE,
+    SPOOL_MAX_BYTES,
+    WRITERS,
+    ExportFormat,
+)
+from .facility import (
+    FacilityLocation,
+    ItemTransformer,
+    LocationTransformer,
+    VehicleTransformer,
+)
 
 
 if TYPE_CHECKING:
@@ -18,10 +45,24 @@ if TYPE_CHECKING:
     from .events import Events
 
 
+logger = logging.getLogger(__name__)
+
+# minutes between checks for guilds due a scheduled update
+RECONCILE_CHECK_MINUTES = 5
+# invalid rows listed in the reply to an import
+IMPORT_ERRORS_SHOWN = 10
+
+
 class Admin(commands.Cog):
     def __init__(self, bot: FacilityBot):
         self.bot: FacilityBot = bot
 
+    async def cog_load(self) -> None:
+        self.scheduled_updates.start()
+
+    async def cog_unload(self) -> None:
+        self.scheduled_updates.cancel()
+
     admin_modify = app_commands.Group(
         name="admin_modify",
         description="Modify facilities",
@@ -178,33 +219,226 @@ class Admin(commands.Cog):
                 interaction,
             )
 
-    # TODO: Finish this command
-    # @app_commands.guild_only()
-    # @app_commands.default_permissions(administrator=True)
-    # @app_commands.checks.cooldown(1, 10, key=lambda i: (i.guild_id, i.user.id))
-    # async def force_update(self, interaction: GuildInteraction):
-    #     """Forces a list and forum update"""
-    #     search_dict = {"guild_id == ?": interaction.guild_id}
-    #     facilities = await self.bot.db.get_facilities(search_dict)
+    @app_commands.command()
+    @app_commands.guild_only()
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.checks.cooldown(1, 60, key=lambda i: i.guild_id)
+    async def force_update(
+        self, interaction: GuildInteraction, check_messages: bool = False
+    ):
+        """Brings the forum and list in line with the stored facilities
 
-    #     events: Optional[Events] = self.bot.get_cog("Events")
-    #     if not events:
-    #         return
+        Args:
+            check_messages (bool): Also compare the first message of every thread, slower on large forums
+        """
+        events: Optional[Events] = self.bot.get_cog("Events")
+        if not events:
+            raise MessageError("Unable to update right now")
+        if interaction.guild_id in events.reconciling:
+            raise MessageError("An update is already running")
+
+        await interaction.response.defer(ephemeral=True)
+        result = await events.reconcile_guild(interaction.guild, deep=check_messages)
+        if result is None:
+            embed = FeedbackEmbed("Updated list, no forum set", FeedbackType.SUCCESS)
+        else:
+            embed = FeedbackEmbed(
+                f"Updated forum and list\n{result}",
+                FeedbackType.WARNING if result.failed else FeedbackType.SUCCESS,
+            )
+        await interaction.followup.send(embed=embed, ephemeral=True)
 
-    #     if not facilities:
-    #         await events.update_list(interaction.guild)
-    #         raise MessageError("No facilities found", ephemeral=True)
+    @app_commands.command()
+    @app_commands.guild_only()
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.checks.cooldown(1, 4, key=lambda i: (i.guild_id, i.user.id))
+    async def schedule_update(
+        self, interaction: GuildInteraction, hours: app_commands.Range[int, 0, 168]
+    ):
+        """Regularly brings the forum and list in line with the stored facilities
 
-    #     valid_threads = []
+        Args:
+            hours (app_commands.Range[int, 0, 168]): Hours between updates, 0 to stop
+        """
+        await self.bot.db.set_reconcile_interval(interaction.guild_id, hours)
+        if hours:
+            message = f"Forum and list will be updated every {hours} hour(s)"
+        else:
+            message = "Stopped scheduled updates"
+        embed = FeedbackEmbed(message, FeedbackType.SUCCESS)
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @app_commands.command(name="import")
+    @app_commands.guild_only()
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.checks.cooldown(1, 60, key=lambda i: i.guild_id)
+    @auto_defer(ephemeral=True)
+    async def import_facilities(self, interaction: GuildInteraction, file: Attachment):
+        """Creates facilities from a CSV, JSON or JSON Lines file
 
-    #     for facility in facilities:
-    #         thread = interaction.guild.get_channel_or_thread(facility.thread_id)
+        Args:
+            file (Attachment): A row per facility with name, region, marker and maintainer columns, optionally coordinates, description, image_url and services
+        """
+        if file.size > MAX_IMPORT_BYTES:
+            raise MessageError(
+                f"File must be smaller than {MAX_IMPORT_BYTES // 1_000_000}MB"
+            )
+        events: Optional[Events] = self.bot.get_cog("Events")
+        if events and interaction.guild_id in events.reconciling:
+            raise MessageError("An update is already running")
+
+        data = await file.read()
+
+        creation_time = int(time.time())
+        imported: list[Facility] = []
+        chunk: list[Facility] = []
+        errors: list[str] = []
+        rows = 0
+        try:
+            try:
+                for line, record in iter_records(data, file.filename):
+                    rows += 1
+                    if rows > MAX_IMPORT_ROWS:
+                        errors.append(f"Stopped after {MAX_IMPORT_ROWS} rows")
+                        break
+                    try:
+                        facility = build_facility(
+                            record,
+                            author=interaction.user.id,
+                            guild_id=interaction.guild_id,
+                            creation_time=creation_time,
+                        )
+                    except ImportRowError as exc:
+                        errors.append(f"Line {line}: {exc}")
+                        continue
+
+                    chunk.append(facility)
+                    if len(chunk) >= IMPORT_CHUNK_SIZE:
+                        await self.bot.db.add_facilities(chunk)
+                        imported.extend(chunk)
+                        chunk = []
+            except ImportRowError as exc:
+                errors.append(str(exc))
+            if chunk:
+                await self.bot.db.add_facilities(chunk)
+                imported.extend(chunk)
+
+            count = len(imported)
+            message = f"Imported {count} facilit{'y' if count == 1 else 'ies'}"
+            if errors:
+                skipped = "\n".join(errors[:IMPORT_ERRORS_SHOWN])
+                if len(errors) > IMPORT_ERRORS_SHOWN:
+                    skipped += f"\n...and {len(errors) - IMPORT_ERRORS_SHOWN} more"
+                message += f", skipped:\n```\n{skipped}\n```"
+            if errors or not imported:
+                embed = FeedbackEmbed(message, FeedbackType.WARNING)
+            else:
+                embed = FeedbackEmbed(message, FeedbackType.SUCCESS)
+            await interaction.response.send_message(embed=embed, ephemeral=True)
+        finally:
+            # committed chunks still need threads, list entries and indexing
+            if imported:
+                self.bot.dispatch("bulk_facility_create", imported, interaction)
+
+    @app_commands.command()
+    @app_commands.guild_only()
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.checks.cooldown(1, 30, key=lambda i: i.guild_id)
+    @app_commands.rename(
+        file_format="format",
+        location="region",
+        item_service="item-service",
+        vehicle_service="vehicle-service",
+    )
+    @app_commands.choices(
+        vehicle_service=[
+            app_commands.Choice(name=flag.display_name, value=flag.flag_value)
+            for flag in VehicleServiceFlags.MAPPED_FLAGS.values()
+        ],
+    )
+    @auto_defer(ephemeral=True)
+    async def export(
+        self,
+        interaction: GuildInteraction,
+        file_format: ExportFormat = ExportFormat.CSV,
+        location: app_commands.Transform[
+            FacilityLocation | None, LocationTransformer
+        ] = None,
+        item_service: app_commands.Transform[int, ItemTransformer] = 0,
+        vehicle_service: int = 0,
+        creator: Member | None = None,
+        vehicle: app_commands.Transform[tuple[str, int], VehicleTransformer] = ("", 0),
+        query: app_commands.Transform[ServiceQuery | None, QueryTransformer] = None,
+    ):
+        """Exports the guild's facilities to a file, CSV and JSONL files can be imported again
 
-    #         if not thread:
-    #             await events.handle_forum(facility, interaction.guild.id)
-    #             thread = interaction.guild.get_channel_or_thread(facility.thread_id)
+        Args:
+            file_format (ExportFormat): File format, columnar is smallest. Defaults to CSV.
+            location (app_commands.Transform[FacilityLocation, LocationTransformer], optional): Region to export
+            item_service (int, optional): Item service to filter by
+            vehicle_service (int, optional): Vehicle service to filter by
+            creator (Member, optional): Filter by facility creator
+            vehicle (tuple[str, int], optional): Vehicle upgrade/build facility to filter by
+            query (ServiceQuery, optional): Services to match, Ex. scons & (mm120 | mm150) region:Origin
+        """
+        pages = FacilityPages(
+            region=location.region if location else "",
+            item_service=item_service,
+            vehicle_service=vehicle[1] or vehicle_service,
+            creator_id=creator.id if creator else 0,
+        )
+        conditions = pages.conditions(interaction.guild_id)
+
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as spool:
+            writer = WRITERS[file_format](spool)
+            async for facilities in self.bot.db.iter_facilities(
+                conditions, EXPORT_CHUNK_SIZE
+            ):
+                if query is not None:
+                    facilities = [
+                        facility for facility in facilities if query.matches(facility)
+                    ]
+                writer.write(facilities)
+            writer.close()
+
+            if not writer.rows:
+                raise MessageError("No facilities found")
+            size = spool.tell()
+            if size > interaction.guild.filesize_limit:
+                raise MessageError(
+                    f"Export is {size / 1_000_000:.1f}MB, over the upload limit. Try the columnar format or fewer facilities"
+                )
+
+            spool.seek(0)
+            filename = f"facilities-{interaction.guild_id}.{file_format.extension}"
+            embed = FeedbackEmbed(
+                f"Exported {writer.rows} facilit{'y' if writer.rows == 1 else 'ies'}",
+                FeedbackType.SUCCESS,
+            )
+            await interaction.response.send_message(
+                embed=embed, file=File(spool, filename=filename), ephemeral=True
+            )
 
-    #         valid_threads.append(thread.id)
+    @tasks.loop(minutes=RECONCILE_CHECK_MINUTES)
+    async def scheduled_updates(self) -> None:
+        events: Optional[Events] = self.bot.get_cog("Events")
+        if not events:
+            return
+
+        for guild_id in await self.bot.db.due_reconciles():
+            guild = self.bot.get_guild(guild_id)
+            # guilds on other clusters are handled there
+            if guild is None:
+                continue
+            await self.bot.db.reschedule_reconcile(guild_id)
+            try:
+                await events.reconcile_guild(guild)
+            except Exception:
+                logger.exception("Scheduled update failed in %r", guild_id)
+
+    @scheduled_updates.before_loop
+    async def before_scheduled_updates(self) -> None:
+        await self.bot.wait_until_ready()
 
 
 async def setup(bot: FacilityBot) -> None:
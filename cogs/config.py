@@ -1,6 +1,7 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, Optional
+import time
+from typing import TYPE_CHECKING, Any, Optional
 
 from discord import (
     app_commands,
@@ -10,6 +11,7 @@ from discord import (
     Colour,
     PermissionOverwrite,
     Forbidden,
+    HTTPException,
 )
 from discord.ext import commands
 
@@ -17,6 +19,8 @@ from .utils.embeds import FeedbackEmbed, FeedbackType
 from .utils.views import SetDynamicList, create_list
 from .utils.errors import MessageError
 from .utils.sqlite import AdaptableList
+from .utils.scheduler import Lane
+from .utils.defer import auto_defer
 
 
 if TYPE_CHECKING:
@@ -25,14 +29,20 @@ if TYPE_CHECKING:
     from .events import Events
 
 
+# seconds between progress edits while syncing a forum
+FORUM_PROGRESS_INTERVAL = 2
+
+
 class Config(commands.Cog):
     def __init__(self, bot: FacilityBot):
         self.bot: FacilityBot = bot
+        self.blacklisted: set[int] = set()
 
     @app_commands.command()
     @app_commands.guild_only()
     @app_commands.checks.cooldown(1, 4, key=lambda i: (i.guild_id, i.user.id))
     @app_commands.default_permissions(administrator=True)
+    @auto_defer(ephemeral=True)
     async def create_fourm(self, interaction: GuildInteraction):
         """Creates fourm channel to list facilities"""
         guild = interaction.guild
@@ -71,31 +81,62 @@ class Config(commands.Cog):
 
         facilities = await self.bot.db.get_facilities({"guild_id = ?": guild.id})
 
+        progress = await interaction.followup.send(
+            embed=FeedbackEmbed(
+                f"Syncing forum threads 0/{len(facilities)}", FeedbackType.INFO
+            ),
+            ephemeral=True,
+            wait=True,
+        )
+        last_report = time.monotonic()
+
+        async def report(done: int, total: int) -> None:
+            nonlocal last_report
+            now = time.monotonic()
+            if done == total or now - last_report < FORUM_PROGRESS_INTERVAL:
+                return
+            last_report = now
+            try:
+                await progress.edit(
+                    embed=FeedbackEmbed(
+                        f"Syncing forum threads {done}/{total}", FeedbackType.INFO
+                    )
+                )
+            except HTTPException:
+                pass
+
+        failed = 0
         events: Optional[Events] = self.bot.get_cog("Events")
         if events:
-            for facility in facilities:
-                await events.handle_forum(facility, guild.id)
+            failed = await events.sync_forum(forum, facilities, progress=report)
 
         facility_list = await create_list(
             facilities, interaction.guild, interaction.client
         )
         initial_embed = facility_list.pop(0)
+        rest = self.bot.rest
         try:
-            thread, message = await forum.create_thread(
-                name="Index", embed=initial_embed
+            thread, message = await rest.run(
+                Lane.INTERACTION,
+                forum.id,
+                lambda: forum.create_thread(name="Index", embed=initial_embed),
             )
         except Forbidden:
             embed = FeedbackEmbed(
                 "No permission to manage forum, must have `Manage Posts`",
                 FeedbackType.ERROR,
             )
-            return await interaction.followup.send(embed=embed)
+            return await progress.edit(embed=embed)
 
         messages = [message.id]
 
-        await thread.edit(locked=True, pinned=True)
+        await rest.run(
+            Lane.INTERACTION, thread.id, lambda: thread.edit(locked=True, pinned=True)
+        )
         for embed in facility_list:
-            message = await thread.send(embed=embed)
+            message = await rest.run(
+                Lane.INTERACTION, thread.id, lambda: thread.send(embed=embed)
+            )
             messages.append(message.id)
 
         try:
@@ -104,13 +145,13 @@ class Config(commands.Cog):
             embed = FeedbackEmbed(
                 f"Failed to set list channel\n```py\n{exc}\n```", FeedbackType.ERROR
             )
-            await interaction.followup.send(embed=embed)
+            await progress.edit(embed=embed)
             raise exc
 
-        await interaction.followup.send(
-            embed=FeedbackEmbed(f"Created forum {forum.mention}", FeedbackType.SUCCESS),
-            ephemeral=True,
-        )
+        content = f"Created forum {forum.mention}"
+        if failed:
+            content += f", {failed} facility thread(s) failed to sync"
+        await progress.edit(embed=FeedbackEmbed(content, FeedbackType.SUCCESS))
 
     @app_commands.command()
     @app_commands.checks.cooldown(1, 4, key=lambda i: (i.guild_id, i.user.id))
@@ -144,6 +185,7 @@ class Config(commands.Cog):
     @app_commands.guild_only()
     @app_commands.checks.cooldown(1, 4, key=lambda i: (i.guild_id, i.user.id))
     @app_commands.default_permissions(administrator=True)
+    @auto_defer(ephemeral=True)
     async def set_list_channel(self, interaction: GuildInteraction):
         """Sets list channel to post updates of facilities
 
@@ -195,6 +237,7 @@ class Config(commands.Cog):
         await self.bot.db.execute(
             query, interaction.guild_id, AdaptableList(channel_list)
         )
+        self.bot.response_channels[interaction.guild_id] = set(channel_list)
         await interaction.response.send_message(":white_check_mark:")
 
     @response.command()
@@ -223,6 +266,7 @@ class Config(commands.Cog):
             else:
                 query = """DELETE FROM response WHERE guild_id = ?"""
                 await self.bot.db.execute(query, interaction.guild_id)
+            self.bot.response_channels[interaction.guild_id] = set(channel_list)
         await interaction.response.send_message(":white_check_mark:")
 
     @response.command()
@@ -255,6 +299,10 @@ class Config(commands.Cog):
     async def blacklist_add(self, ctx: Context, object_id: int, reason: str = ""):
         query = """INSERT OR IGNORE INTO blacklist (object_id, reason) VALUES (?, ?)"""
         await self.bot.db.execute(query, object_id, reason)
+        self.blacklisted.add(object_id)
+        await self.bot.cluster.broadcast(
+            "blacklist", {"object_id": object_id, "blacklisted": True}
+        )
         await ctx.send(content=":white_check_mark:")
 
     @blacklist.command(name="remove")
@@ -262,15 +310,20 @@ class Config(commands.Cog):
     async def blacklist_remove(self, ctx: Context, object_id: int):
         query = """DELETE FROM blacklist WHERE object_id = ?"""
         await self.bot.db.execute(query, object_id)
+        self.blacklisted.discard(object_id)
+        await self.bot.cluster.broadcast(
+            "blacklist", {"object_id": object_id, "blacklisted": False}
+        )
         await ctx.send(content=":white_check_mark:")
 
-    async def is_blacklisted(self, entity_id: int) -> bool:
-        query = """SELECT 1 FROM blacklist WHERE object_id = ?"""
-        result = await self.bot.db.fetch(
-            query,
-            entity_id,
-        )
-        return bool(result)
+    def is_blacklisted(self, entity_id: int) -> bool:
+        return entity_id in self.blacklisted
+
+    async def _cluster_blacklist(self, data: dict[str, Any]) -> None:
+        if data["blacklisted"]:
+            self.blacklisted.add(data["object_id"])
+        else:
+            self.blacklisted.discard(data["object_id"])
 
     async def blacklist_interaction_check(self, interaction: ClientInteraction) -> bool:
         is_owner = await interaction.client.is_owner(interaction.user)
@@ -282,17 +335,23 @@ class Config(commands.Cog):
             interaction.guild and interaction.guild.id,
         ):
             if check_entity:
-                result = await self.is_blacklisted(check_entity)
+                result = self.is_blacklisted(check_entity)
                 if result:
                     return False
 
         return True
 
     async def cog_load(self) -> None:
+        query = """SELECT object_id FROM blacklist"""
+        rows = await self.bot.db.fetch(query)
+        self.blacklisted = {row[0] for row in rows}
+        self.bot.cluster.add_handler("blacklist", self._cluster_blacklist)
+
         tree = self.bot.tree
         tree.interaction_check = self.blacklist_interaction_check
 
     async def cog_unload(self) -> None:
+        self.bot.cluster.remove_handler("blacklist")
         tree = self.bot.tree
         tree.interaction_check = tree.__class__.interaction_check
 
@@ -303,7 +362,7 @@ class Config(commands.Cog):
 
         for check_entity in (ctx.author.id, ctx.guild and ctx.guild.id):
             if check_entity:
-                result = await self.is_blacklisted(check_entity)
+                result = self.is_blacklisted(check_entity)
                 if result:
                     return False
 
@@ -93,6 +93,9 @@ class CommandErrorHandler(commands.Cog):
             interaction (discord.Interaction): The interaction used for command invocation
             error (discord.app_commands.AppCommandError): The Exception raised
         """
+        # the tree has one error handler, this lets other cogs listen for failures
+        self.bot.dispatch("app_command_error", interaction, error)
+
         command = interaction.command
         if command is not None:
             if command._has_any_error_handlers():
@@ -1,16 +1,14 @@
 from __future__ import annotations
 
+import asyncio
 import logging
 import itertools
-from typing import TYPE_CHECKING
-from rapidfuzz import process
+from typing import TYPE_CHECKING, Any, Awaitable, Callable
 
 from discord import (
     Guild,
     Message,
     NotFound,
-    Embed,
-    Colour,
     ForumChannel,
     Thread,
     HTTPException,
@@ -20,7 +18,17 @@ from discord import (
 from discord.ext import commands
 
 from .utils.embeds import create_list
-from .utils.cost import Building, Cost, building_data
+from .utils.views import facility_thread_view
+from .utils.scheduler import Lane
+from .utils.deletion import delete_messages
+from .utils.reconcile import (
+    ReconcileResult,
+    embeds_match,
+    fetch_forum_threads,
+    plan_forum,
+    thread_name,
+)
+from .utils.cost import building_matcher
 
 
 if TYPE_CHECKING:
@@ -34,36 +42,32 @@ if TYPE_CHECKING:
 guild_logger = logging.getLogger("guild_event")
 facility_logger = logging.getLogger("facility_event")
 
-
-def generate_message(building: Building):
-    def format_cost(cost: Cost):
-        item_texts = []
-        for key, value in cost.items():
-            item_texts.append(f"**{value}x {key}**")
-        return ", ".join(item_texts)
-
-    embed = Embed(title=building.name, colour=Colour.blue())
-
-    final_description = format_cost(building.cost)
-    if building.parent:
-        final_description += f"\n\nParent (**{building.parent.name}**) cost: {format_cost(building.parent.cost)}"
-        final_description += f"\n\nTotal cost: {format_cost(building.total_cost())}"
-
-    embed.description = final_description
-    return embed
+# threads created at once when syncing a whole forum
+FORUM_SYNC_CONCURRENCY = 4
+# messages starting with this are answered in response channels
+RESPONSE_PREFIX = "how much does"
 
 
 def process_response(user_input: str):
-    choice = process.extractOne(user_input, building_data.keys(), score_cutoff=80)
-    if choice:
-        building = building_data[choice[0]]
-        return generate_message(building)
+    building = building_matcher.match(user_input)
+    if building:
+        return building.embed()
     return None
 
 
 class Events(commands.Cog):
     def __init__(self, bot: FacilityBot) -> None:
         self.bot: FacilityBot = bot
+        self.reconciling: set[int] = set()
+
+    async def cog_load(self) -> None:
+        self.bot.cluster.add_handler("update_lists", self._cluster_update_lists)
+
+    async def cog_unload(self) -> None:
+        self.bot.cluster.remove_handler("update_lists")
+
+    async def _cluster_update_lists(self, _: Any) -> int:
+        return await self.update_lists()
 
     @commands.Cog.listener()
     async def on_app_command_completion(
@@ -97,6 +101,7 @@ class Events(commands.Cog):
             guild (Guild): Guild the bot was removed from
         """
         guild_logger.info("Bot removed from %r (%s)", guild.id, guild.name)
+        self.bot.guild_logs.pop(guild.id, None)
 
     @commands.Cog.listener()
     async def on_message(
@@ -117,20 +122,17 @@ class Events(commands.Cog):
                 await info_command(ctx)
             except Exception:
                 pass
-        elif message.content.lower().startswith("how much does"):
-            if not message.guild:
-                return
-
-            query = """SELECT channel_ids from response WHERE guild_id = ?"""
-            channel_row = await self.bot.db.fetch_one(query, message.guild.id)
-            if not channel_row:
+        elif message.guild is not None:
+            # checked before the content so most messages are rejected with a set lookup
+            channels = self.bot.response_channels.get(message.guild.id)
+            if not channels or message.channel.id not in channels:
                 return
 
-            channel_ids: list[int] = channel_row[0]
-            if message.channel.id not in channel_ids:
+            prefix_length = len(RESPONSE_PREFIX)
+            if message.content[:prefix_length].lower() != RESPONSE_PREFIX:
                 return
 
-            user_input = message.content[13:].strip()
+            user_input = message.content[prefix_length:].strip()
             output = process_response(user_input)
             if output:
                 await message.channel.send(embed=output, reference=message)
@@ -154,6 +156,30 @@ class Events(commands.Cog):
         await self.handle_forum(facility, ctx.guild_id)
         await self.update_list(ctx.guild)
 
+    @commands.Cog.listener()
+    async def on_bulk_facility_create(
+        self, facilities: list[Facility], ctx: GuildInteraction
+    ) -> None:
+        """Triggered when multiple facilities are created at once
+
+        Args:
+            facilities (list[Facility]): Facilities that were created
+            ctx (GuildInteraction): Context of facility creation
+        """
+        facility_logger.info(
+            "%r facilities imported by %s with IDs %r to %r",
+            len(facilities),
+            ctx.user.mention,
+            facilities[0].id_,
+            facilities[-1].id_,
+            extra={"ctx": ctx},
+        )
+        # one pass over the forum rather than a thread and list edit per facility
+        if ctx.guild_id in self.reconciling:
+            await self.update_list(ctx.guild)
+        else:
+            await self.reconcile_guild(ctx.guild)
+
     @commands.Cog.listener()
     async def on_facility_modify(
         self, before: Facility, after: Facility, ctx: GuildInteraction
@@ -194,6 +220,21 @@ class Events(commands.Cog):
             await self.handle_forum(facility, ctx.guild_id, True)
         await self.update_list(ctx.guild)
 
+    async def update_lists(self) -> int:
+        """Updates the list of every guild this process can see
+
+        Returns:
+            int: Number of lists updated
+        """
+        query = """SELECT guild_id FROM list"""
+        rows = await self.bot.db.fetch(query)
+        guilds = [self.bot.get_guild(row[0]) for row in rows if row]
+        filtered_guilds = list(filter(None, guilds))
+
+        for guild in filtered_guilds:
+            await self.update_list(guild)
+        return len(filtered_guilds)
+
     async def update_list(self, guild: Guild) -> None:
         list_location = await self.bot.db.get_list(guild)
         if not list_location:
@@ -206,16 +247,14 @@ class Events(commands.Cog):
         embeds = await create_list(facilities, guild, self.bot)
 
         async def remove_messages():
-            for message in messages:
-                message = channel.get_partial_message(message)
-                try:
-                    await message.delete()
-                except NotFound:
-                    pass
+            await delete_messages(
+                rest, [channel.get_partial_message(message) for message in messages]
+            )
 
         channel = self.bot.get_channel(channel_id)
         if channel is None:
             return
+        rest = self.bot.rest
 
         # TODO: Rework this
         if not isinstance(channel, Thread):
@@ -226,7 +265,11 @@ class Events(commands.Cog):
                 for message_id, embed in zip(messages, embeds):
                     message = channel.get_partial_message(message_id)
                     try:
-                        await message.edit(embed=embed)
+                        await rest.run(
+                            Lane.LIST,
+                            channel.id,
+                            lambda: message.edit(embed=embed),
+                        )
                     except NotFound:
                         await remove_messages()
                         break
@@ -237,71 +280,298 @@ class Events(commands.Cog):
 
             new_messages = []
             for embed in embeds:
-                message = await channel.send(embed=embed)
+                message = await rest.run(
+                    Lane.LIST, channel.id, lambda: channel.send(embed=embed)
+                )
                 new_messages.append(message.id)
 
             return await self.bot.db.set_list(guild, channel, new_messages)
         else:
             new_messages = []
+            surplus = []
             for embed, message_id in itertools.zip_longest(
                 embeds, messages, fillvalue=None
             ):
                 if message_id is None:
-                    new_message = await channel.send(embed=embed)
-                    new_messages.append(new_message)
+                    new_message = await rest.run(
+                        Lane.LIST, channel.id, lambda: channel.send(embed=embed)
+                    )
+                    new_messages.append(new_message.id)
                     continue
 
                 message = channel.get_partial_message(message_id)
                 if embed is None:
-                    await message.delete()
+                    surplus.append(message)
                     continue
                 try:
-                    await message.edit(embed=embed)
+                    await rest.run(
+                        Lane.LIST, channel.id, lambda: message.edit(embed=embed)
+                    )
                     new_messages.append(message.id)
                 except (NotFound, Forbidden):
                     return
 
+            if surplus:
+                await delete_messages(rest, surplus)
             return await self.bot.db.set_list(guild, channel, new_messages)
 
-    async def handle_forum(
-        self, facility: Facility, guild_id: int, delete: bool = False
-    ) -> None:
+    async def get_forum(self, guild_id: int) -> ForumChannel | None:
         query = """SELECT forum_id FROM guild_options WHERE guild_id == ?"""
         forum_tuple = await self.bot.db.fetch_one(query, guild_id)
-        if not len(forum_tuple) > 0:
-            return
-        forum_id = forum_tuple[0]
-        forum = self.bot.get_channel(forum_id)
+        if not forum_tuple:
+            return None
+        forum = self.bot.get_channel(forum_tuple[0])
         if not isinstance(forum, ForumChannel):
+            return None
+        return forum
+
+    async def handle_forum(
+        self, facility: Facility, guild_id: int, delete: bool = False
+    ) -> None:
+        forum = await self.get_forum(guild_id)
+        if forum is None:
             return
 
+        thread_id = facility.thread_id
+        await self.sync_thread(forum, facility, delete)
+        if not delete and facility.thread_id != thread_id:
+            await self.bot.db.update_facility(facility)
+
+    async def sync_forum(
+        self,
+        forum: ForumChannel,
+        facilities: list[Facility],
+        *,
+        concurrency: int = FORUM_SYNC_CONCURRENCY,
+        progress: Callable[[int, int], Awaitable[Any]] | None = None,
+    ) -> int:
+        """Creates or updates the threads of many facilities at once, new thread ID's are written in one transaction
+
+        Args:
+            forum (ForumChannel): Forum to sync
+            facilities (list[Facility]): Facilities to create or update threads for
+            concurrency (int): Threads synced at once
+            progress (Callable[[int, int], Awaitable[Any]], optional): Called with the synced and total count after each facility
+
+        Returns:
+            int: Facilities that failed to sync
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        thread_ids = {facility.id_: facility.thread_id for facility in facilities}
+        done = 0
+        failed = 0
+
+        async def sync(facility: Facility) -> None:
+            nonlocal done, failed
+            async with semaphore:
+                try:
+                    await self.sync_thread(forum, facility, limit=concurrency)
+                except HTTPException:
+                    facility_logger.exception(
+                        "Failed syncing facility %r to forum %r", facility.id_, forum.id
+                    )
+                    failed += 1
+            done += 1
+            if progress is not None:
+                await progress(done, len(facilities))
+
+        await asyncio.gather(*(sync(facility) for facility in facilities))
+
+        changed = [
+            facility
+            for facility in facilities
+            if facility.thread_id != thread_ids[facility.id_]
+        ]
+        if changed:
+            await self.bot.db.set_thread_ids(changed)
+        return failed
+
+    async def reconcile_guild(
+        self,
+        guild: Guild,
+        *,
+        deep: bool = False,
+        concurrency: int = FORUM_SYNC_CONCURRENCY,
+    ) -> ReconcileResult | None:
+        """Brings the forum threads and list of a guild in line with its facilities
+
+        Fetches every thread in the forum and only creates, updates or deletes
+        the ones that differ from the facility rows
+
+        Args:
+            guild (Guild): Guild to reconcile
+            deep (bool): Fetch starter messages that aren't cached to compare their embeds
+            concurrency (int): Threads changed at once
+
+        Returns:
+            ReconcileResult | None: Changes made to the forum, None if the guild has no forum or is already reconciling
+        """
+        if guild.id in self.reconciling:
+            return None
+        self.reconciling.add(guild.id)
+        try:
+            result = await self._reconcile_forum(guild, deep, concurrency)
+            await self.update_list(guild)
+        finally:
+            self.reconciling.discard(guild.id)
+        return result
+
+    async def _reconcile_forum(
+        self, guild: Guild, deep: bool, concurrency: int
+    ) -> ReconcileResult | None:
+        forum = await self.get_forum(guild.id)
+        if forum is None:
+            return None
+
+        rest = self.bot.rest
+        facilities = await self.bot.db.get_facilities({" guild_id == ? ": guild.id})
+        threads = await rest.run(
+            Lane.FORUM, forum.id, lambda: fetch_forum_threads(forum)
+        )
+        list_location = await self.bot.db.get_list(guild)
+        keep = [list_location[0]] if list_location else []
+        plan = plan_forum(facilities, threads, keep)
+
+        result = ReconcileResult()
+        thread_ids = {facility.id_: facility.thread_id for facility in facilities}
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def create(facility: Facility) -> None:
+            facility.thread_id = None
+            await self.sync_thread(forum, facility, limit=concurrency)
+            result.created += 1
+
+        async def check(facility: Facility, thread: Thread) -> None:
+            name = thread_name(facility)
+            message = thread.starter_message
+            if message is None and deep:
+                message = await rest.run(
+                    Lane.FORUM, thread.id, lambda: thread.fetch_message(thread.id)
+                )
+            stale_message = message is not None and not embeds_match(message, facility)
+            if thread.name == name and not stale_message:
+                result.unchanged += 1
+                return
+
+            # archived threads have to be opened again before anything can change
+            if thread.name != name or thread.archived:
+                await rest.run(
+                    Lane.FORUM,
+                    thread.id,
+                    lambda: thread.edit(name=name, archived=False),
+                )
+            if stale_message:
+                await rest.run(
+                    Lane.FORUM,
+                    thread.id,
+                    lambda: message.edit(
+                        embeds=facility.embeds(),
+                        view=facility_thread_view(facility),
+                    ),
+                )
+            result.updated += 1
+
+        async def delete(thread: Thread) -> None:
+            await rest.run(Lane.FORUM, thread.id, thread.delete)
+            result.deleted += 1
+
+        async def run(work: Awaitable[None]) -> None:
+            async with semaphore:
+                try:
+                    await work
+                except HTTPException:
+                    facility_logger.exception(
+                        "Failed reconciling forum %r in %r", forum.id, guild.id
+                    )
+                    result.failed += 1
+
+        await asyncio.gather(
+            *(run(create(facility)) for facility in plan.create),
+            *(run(check(facility, thread)) for facility, thread in plan.check),
+            *(run(delete(thread)) for thread in plan.delete),
+        )
+
+        changed = [
+            facility
+            for facility in facilities
+            if facility.thread_id != thread_ids[facility.id_]
+        ]
+        if changed:
+            await self.bot.db.set_thread_ids(changed)
+
+        facility_logger.info(
+            "Reconciled forum %r in %r, created %r, updated %r, deleted %r, failed %r",
+            forum.id,
+            guild.id,
+            result.created,
+            result.updated,
+            result.deleted,
+            result.failed,
+        )
+        return result
+
+    async def sync_thread(
+        self,
+        forum: ForumChannel,
+        facility: Facility,
+        delete: bool = False,
+        *,
+        limit: int | None = None,
+    ) -> None:
+        """Creates, updates or deletes the thread of a facility, new thread ID's are only set on the facility
+
+        Args:
+            forum (ForumChannel): Forum the thread is in
+            facility (Facility): Facility to sync
+            delete (bool): Deletes the thread
+            limit (int, optional): Thread creations run at once in the forum
+        """
+        rest = self.bot.rest
         thread = forum.get_thread(facility.thread_id or 0)
         if delete:
             facility.thread_id = None
             if thread is None:
                 return
-            return await thread.delete()
+            return await rest.run(Lane.FORUM, thread.id, thread.delete)
         if thread is None:
-            thread, _ = await forum.create_thread(
-                name=f"{facility.name} - {facility.marker}, {facility.region}",
-                embeds=facility.embeds(),
+            thread, _ = await rest.run(
+                Lane.FORUM,
+                forum.id,
+                lambda: forum.create_thread(
+                    name=thread_name(facility),
+                    embeds=facility.embeds(),
+                    view=facility_thread_view(facility),
+                ),
+                limit=limit,
             )
+            facility.thread_id = thread.id
             try:
-                await thread.add_user(Object(facility.author))
+                await rest.run(
+                    Lane.FORUM,
+                    thread.id,
+                    lambda: thread.add_user(Object(facility.author)),
+                )
             except Forbidden:
                 pass
-            facility.thread_id = thread.id
-            await self.bot.db.update_facility(facility)
         else:
-            updated_name = f"{facility.name} - {facility.marker}, {facility.region}"
+            updated_name = thread_name(facility)
             if thread.name != updated_name:
-                await thread.edit(name=updated_name)
+                await rest.run(
+                    Lane.FORUM, thread.id, lambda: thread.edit(name=updated_name)
+                )
 
             message = thread.starter_message
             if not message:
-                message = await thread.fetch_message(thread.id)
-            await message.edit(
-                embeds=facility.embeds(),
+                message = await rest.run(
+                    Lane.FORUM, thread.id, lambda: thread.fetch_message(thread.id)
+                )
+            await rest.run(
+                Lane.FORUM,
+                thread.id,
+                lambda: message.edit(
+                    embeds=facility.embeds(),
+                    view=facility_thread_view(facility),
+                ),
             )
 
 
@@ -2,11 +2,11 @@ from __future__ import annotations
 
 import re
 from contextlib import contextmanager
-from typing import NamedTuple, TYPE_CHECKING
+from typing import Any, NamedTuple, TYPE_CHECKING
 from rapidfuzz.process import extract
 
 from discord.ext import commands
-from discord import app_commands, Member, Attachment, Embed
+from discord import app_commands, Member, Attachment, Embed, Colour
 
 from .utils.embeds import (
     FeedbackEmbed,
@@ -15,12 +15,31 @@ from .utils.embeds import (
     ephemeral_info,
 )
 from .utils.facility import Facility
-from .utils.views import ModifyFacilityView, RemoveFacilitiesView, CreateFacilityView
+from .utils.views import (
+    ModifyFacilityView,
+    RemoveFacilitiesView,
+    CreateFacilityView,
+    FacilityThreadButton,
+)
 from .utils.regions import REGIONS, all_markers
 from .utils.flags import ItemServiceFlags, VehicleServiceFlags
-from .utils.paginator import Paginator
-from .utils.transformers import FacilityTransformer, IdTransformer
+from .utils.paginator import (
+    FacilityPages,
+    PageButton,
+    Paginator,
+    send_facility_pages,
+)
+from .utils.history import history_pages, undo
+from .utils.transformers import FacilityTransformer, IdTransformer, QueryTransformer
+from .utils.query import ServiceQuery
 from .utils.errors import MessageError
+from .utils.defer import auto_defer, preferred_ephemeral
+from .utils.cache import LRUCache
+from .utils.spatial import (
+    SpatialIndex,
+    format_distance,
+    parse_coordinates,
+)
 
 
 if TYPE_CHECKING:
@@ -28,6 +47,10 @@ if TYPE_CHECKING:
     from .utils.context import GuildInteraction
 
 
+# guilds whose spatial index is kept in memory
+SPATIAL_CACHE_SIZE = 256
+
+
 class MarkerTransformer(app_commands.Transformer):
     async def transform(self, interaction: GuildInteraction, value: str, /) -> str:
         for marker in all_markers():
@@ -137,6 +160,85 @@ class FacilityCog(commands.Cog):
     def __init__(self, bot: FacilityBot) -> None:
         self.bot: FacilityBot = bot
         self._users_creating_facility: set[int] = set()
+        self.spatial: LRUCache[int, SpatialIndex] = LRUCache(SPATIAL_CACHE_SIZE)
+
+    async def cog_load(self) -> None:
+        self.bot.add_dynamic_items(PageButton, FacilityThreadButton)
+        self.bot.cluster.add_handler("clear_spatial", self._cluster_clear_spatial)
+
+    async def cog_unload(self) -> None:
+        self.bot.remove_dynamic_items(PageButton, FacilityThreadButton)
+        self.bot.cluster.remove_handler("clear_spatial")
+
+    async def _cluster_clear_spatial(self, _: Any) -> None:
+        self.spatial.clear()
+        self.bot.gazetteer.clear()
+
+    async def spatial_index(self, guild_id: int) -> SpatialIndex:
+        """Gets the guild's spatial index, building it from the database on first use
+
+        Args:
+            guild_id (int): Guild to get the index of
+
+        Returns:
+            SpatialIndex: Index of the guild's facilities with coordinates
+        """
+        index = self.spatial.get(guild_id)
+        if index is None:
+            facilities = await self.bot.db.get_facilities({" guild_id == ? ": guild_id})
+            index = SpatialIndex.from_facilities(facilities)
+            self.spatial.put(guild_id, index)
+        return index
+
+    @commands.Cog.listener()
+    async def on_facility_create(
+        self, facility: Facility, ctx: GuildInteraction
+    ) -> None:
+        self.bot.gazetteer.learn(
+            facility.guild_id, facility.region, facility.marker, facility.coordinates
+        )
+        index = self.spatial.get(facility.guild_id)
+        if index is not None:
+            index.add(facility)
+
+    @commands.Cog.listener()
+    async def on_bulk_facility_create(
+        self, facilities: list[Facility], ctx: GuildInteraction
+    ) -> None:
+        for facility in facilities:
+            self.bot.gazetteer.learn(
+                facility.guild_id,
+                facility.region,
+                facility.marker,
+                facility.coordinates,
+            )
+            index = self.spatial.get(facility.guild_id)
+            if index is not None:
+                index.add(facility)
+
+    @commands.Cog.listener()
+    async def on_facility_modify(
+        self, before: Facility, after: Facility, ctx: GuildInteraction
+    ) -> None:
+        index = self.spatial.get(after.guild_id)
+        if index is not None:
+            index.add(after)
+
+    @commands.Cog.listener()
+    async def on_bulk_facility_delete(
+        self, facilities: list[Facility], ctx: GuildInteraction
+    ) -> None:
+        for facility in facilities:
+            self.bot.gazetteer.learn(
+                facility.guild_id,
+                facility.region,
+                facility.marker,
+                facility.coordinates,
+                -1,
+            )
+            index = self.spatial.get(facility.guild_id)
+            if index is not None:
+                index.remove(facility.id_)
 
     @contextmanager
     def _facility_create_lock(self, user_id: int):
@@ -440,16 +542,11 @@ class FacilityCog(commands.Cog):
             ids (app_commands.Transform[tuple[int], IdTransformer]): List of facility ID's to view with a delimiter of ',' or a space ' ' Ex. 1,3 4 8
             ephemeral (bool): Show results to only you. Defaults to False
         """
-        facilities = await self.bot.db.get_facility_ids(ids)
+        pages = FacilityPages(ids=tuple(ids))
+        facilities = await pages.fetch(interaction)
         if not facilities:
             raise MessageError("No facilities found", ephemeral=True)
 
-        embeds = [
-            facility.embeds()
-            for facility in facilities
-            if facility.guild_id == interaction.guild_id
-        ]
-
         ephemeral_info_embed = None
         if interaction.namespace.ephemeral is not None:
             pass
@@ -460,9 +557,10 @@ class FacilityCog(commands.Cog):
 
             ephemeral = preference or False
 
-        await Paginator(original_author=interaction.user).start(
+        await send_facility_pages(
             interaction,
-            pages=embeds,
+            pages,
+            facilities,
             ephemeral=ephemeral,
             one_time_message=ephemeral_info_embed,
         )
@@ -481,6 +579,7 @@ class FacilityCog(commands.Cog):
             for flag in VehicleServiceFlags.MAPPED_FLAGS.values()
         ],
     )
+    @auto_defer(ephemeral=preferred_ephemeral)
     async def locate(
         self,
         interaction: GuildInteraction,
@@ -491,6 +590,8 @@ class FacilityCog(commands.Cog):
         vehicle_service: int = 0,
         creator: Member | None = None,
         vehicle: app_commands.Transform[tuple[str, int], VehicleTransformer] = ("", 0),
+        near: app_commands.Transform[str | None, MarkerTransformer] = None,
+        query: app_commands.Transform[ServiceQuery | None, QueryTransformer] = None,
         ephemeral: bool = False,
     ) -> None:
         """Find a facility with optional search parameters
@@ -501,34 +602,157 @@ class FacilityCog(commands.Cog):
             vehicle_service (int, optional): Vehicle service to look for
             creator (Member, optional): Filter by facility creator
             vehicle (tuple[str, int], optional): Vehicle upgrade/build facility to look for
+            near (str, optional): Order results by distance from this marker, searching neighbouring regions if no region is given
+            query (ServiceQuery, optional): Services to match, Ex. scons & (mm120 | mm150) region:Origin
             ephemeral (bool): Show results to only you. Defaults to False.
         """
+        pages = FacilityPages(
+            region=location.region if location else "",
+            item_service=item_service,
+            vehicle_service=vehicle[1] or vehicle_service,
+            creator_id=creator.id if creator else 0,
+            vehicle=vehicle[0],
+            near=near or "",
+        )
+        facility_list = await pages.fetch(interaction)
+        if query is not None:
+            # most matched services first, buttons page through this snapshot
+            facility_list = query.search(facility_list)
+            pages = FacilityPages(ids=tuple(facility.id_ for facility in facility_list))
+
+        if not facility_list:
+            raise MessageError("No facilities found", ephemeral=True)
+
+        ephemeral_info_embed = None
+        if interaction.namespace.ephemeral is not None:
+            pass
+        else:
+            preference = await self.bot.db.ephemeral_preference(interaction.user.id)
+            if preference is None:
+                ephemeral_info_embed = await ephemeral_info(self.bot)
+
+            ephemeral = preference or False
+
+        await send_facility_pages(
+            interaction,
+            pages,
+            facility_list,
+            ephemeral=ephemeral,
+            one_time_message=ephemeral_info_embed,
+        )
+
+    @app_commands.command()
+    @app_commands.guild_only()
+    @app_commands.checks.cooldown(1, 4, key=lambda i: (i.guild_id, i.user.id))
+    @app_commands.rename(
+        location="region",
+        item_service="item-service",
+        vehicle_service="vehicle-service",
+    )
+    @app_commands.choices(
+        vehicle_service=[
+            app_commands.Choice(name=flag.display_name, value=flag.flag_value)
+            for flag in VehicleServiceFlags.MAPPED_FLAGS.values()
+        ],
+    )
+    async def nearest(
+        self,
+        interaction: GuildInteraction,
+        location: app_commands.Transform[FacilityLocation, LocationTransformer],
+        coordinates: str = "",
+        marker: app_commands.Transform[str | None, MarkerTransformer] = None,
+        item_service: app_commands.Transform[int, ItemTransformer] = 0,
+        vehicle_service: int = 0,
+        vehicle: app_commands.Transform[tuple[str, int], VehicleTransformer] = ("", 0),
+        count: app_commands.Range[int, 1, 25] = 5,
+        ephemeral: bool = False,
+    ) -> None:
+        """Finds the closest facilities to a position with optional services
+
+        Args:
+            location (app_commands.Transform[FacilityLocation, LocationTransformer]): Region to search in with optional coordinates in the form of region-coordinates from ctrl-click of map
+            coordinates (str): Coordinates to search from (incase it doesn't work in the region field)
+            marker (str, optional): Search from this marker instead of coordinates
+            item_service (int, optional): Item service to look for
+            vehicle_service (int, optional): Vehicle service to look for
+            vehicle (tuple[str, int], optional): Vehicle upgrade/build facility to look for
+            count (int): Facilities to show. Defaults to 5
+            ephemeral (bool): Show results to only you. Defaults to False.
+        """
+        index = await self.spatial_index(interaction.guild_id)
+        final_coordinates = coordinates.upper() or location.coordinates
+        origin = parse_coordinates(location.region, final_coordinates)
+        origin_name = f"{location.region} {final_coordinates}"
+        if origin is None and marker is not None:
+            origin = self.bot.gazetteer.position(
+                interaction.guild_id, marker, location.region
+            )
+            origin_name = f"{marker}, {location.region}"
+        if origin is None:
+            raise MessageError(
+                "Coordinates or a marker in the region are needed to search from",
+                ephemeral=True,
+            )
+
         vehicle_service = vehicle[1] or vehicle_service
 
-        search_dict = {
-            name: value
-            for name, value in (
-                (" region == ? ", location and location.region),
-                (" item_services & ? ", item_service),
-                (" vehicle_services & ? ", vehicle_service),
-                (" author == ? ", creator and creator.id),
-                (" guild_id == ? ", interaction.guild_id),
+        def predicate(facility: Facility) -> bool:
+            if item_service and not facility.item_services.value & item_service:
+                return False
+            if (
+                vehicle_service
+                and not facility.vehicle_services.value & vehicle_service
+            ):
+                return False
+            return True
+
+        results = index.nearest(origin, count, predicate)
+        if not results:
+            raise MessageError(
+                "No facilities with coordinates found nearby", ephemeral=True
             )
-            if value
-        }
 
-        facility_list = await self.bot.db.get_facilities(search_dict)
+        summary = Embed(title=f"Nearest to {origin_name}", colour=Colour.blue())
+        summary.description = "\n".join(
+            f"> {format_distance(distance)} : {facility.name} (ID {facility.id_}) at {facility.marker}"
+            for distance, facility in results
+        )
 
-        if not facility_list:
-            raise MessageError("No facilities found", ephemeral=True)
+        if interaction.namespace.ephemeral is None:
+            preference = await self.bot.db.ephemeral_preference(interaction.user.id)
+            ephemeral = preference or False
 
-        item_highlight = ItemServiceFlags(item_service)
-        vehicle_highlight = VehicleServiceFlags(vehicle_service)
+        pages = FacilityPages(ids=tuple(facility.id_ for _, facility in results))
+        await send_facility_pages(
+            interaction,
+            pages,
+            [facility for _, facility in results],
+            ephemeral=ephemeral,
+            one_time_message=summary,
+        )
 
-        embeds = [
-            facility.embeds(item_highlight, vehicle_highlight, vehicle[0])
-            for facility in facility_list
-        ]
+    @app_commands.command()
+    @app_commands.guild_only()
+    @app_commands.checks.cooldown(1, 4, key=lambda i: (i.guild_id, i.user.id))
+    async def history(
+        self,
+        interaction: GuildInteraction,
+        facility: app_commands.Transform[Facility, FacilityTransformer],
+        version: app_commands.Range[int, 0] | None = None,
+        ephemeral: bool = False,
+    ):
+        """Shows how a facility has been modified, or how it looked at a version
+
+        Args:
+            facility (app_commands.Transform[Facility, FacilityTransformer]): Facility to show the history of, also accepts ID
+            version (app_commands.Range[int, 0], optional): Show the facility as it was at this version, 0 is as created
+            ephemeral (bool): Show results to only you. Defaults to False.
+        """
+        revisions = await self.bot.db.get_revisions(facility.id_)
+        if not revisions:
+            raise MessageError("No changes recorded for this facility", ephemeral=True)
+        if version is not None and version > len(revisions):
+            raise MessageError(f"Latest version is {len(revisions)}", ephemeral=True)
 
         ephemeral_info_embed = None
         if interaction.namespace.ephemeral is not None:
@@ -540,9 +764,27 @@ class FacilityCog(commands.Cog):
 
             ephemeral = preference or False
 
+        if version is not None:
+            # undo the revisions made after the version, newest first
+            past = facility
+            for revision in revisions[: len(revisions) - version]:
+                past = undo(past, revision)
+            embeds = past.embeds()
+            embeds.append(
+                FeedbackEmbed(
+                    f"Version {version} of {len(revisions)}", FeedbackType.INFO
+                )
+            )
+            if ephemeral_info_embed:
+                embeds.append(ephemeral_info_embed)
+            return await interaction.response.send_message(
+                embeds=embeds, ephemeral=ephemeral
+            )
+
+        pages = history_pages(facility, revisions, len(revisions))
         await Paginator(original_author=interaction.user).start(
             interaction,
-            pages=embeds,
+            pages=pages,
             ephemeral=ephemeral,
             one_time_message=ephemeral_info_embed,
         )
@@ -550,6 +792,7 @@ class FacilityCog(commands.Cog):
     @app_commands.command()
     @app_commands.guild_only()
     @app_commands.checks.cooldown(1, 4, key=lambda i: (i.guild_id, i.user.id))
+    @auto_defer(ephemeral=preferred_ephemeral)
     async def list(self, interaction: GuildInteraction, ephemeral: bool = False):
         """Shows a list of all facilities for the current guild
 
@@ -10,6 +10,8 @@ from discord import app_commands, Embed, Colour
 from .utils.context import GuildInteraction
 from .utils.errors import MessageError
 from .utils.embeds import ephemeral_info, HelpEmbed
+from .utils.cost import format_cost
+from .utils.plan import PlanSyntaxError, compile_plan
 
 
 if TYPE_CHECKING:
@@ -140,6 +142,49 @@ class Misc(commands.Cog):
 
         await interaction.response.send_message(embeds=embeds, ephemeral=ephemeral)
 
+    @app_commands.command()
+    @app_commands.guild_only()
+    @app_commands.checks.cooldown(1, 4, key=lambda i: (i.guild_id, i.user.id))
+    async def cost(
+        self,
+        interaction: GuildInteraction,
+        plan: app_commands.Range[str, 1, 500],
+        ephemeral: bool = False,
+    ) -> None:
+        """Totals the materials needed for a build plan
+
+        Args:
+            plan (str): Buildings to build, Ex. 2 Materials Factory with Forge and Smelter, 1 Oil Refinery
+            ephemeral (bool): Show results to only you. Defaults to False.
+        """
+        try:
+            build_plan = compile_plan(plan)
+        except PlanSyntaxError as exc:
+            raise MessageError(f"Invalid plan: {exc}") from exc
+
+        embed = Embed(title="Build Plan", colour=Colour.blue())
+        embed.description = "\n".join(f"> {item}" for item in build_plan.items)
+        embed.add_field(
+            name="Buildings",
+            value="\n".join(
+                f"{count}x {building.name}" for building, count in build_plan.bill
+            ),
+            inline=False,
+        )
+        embed.add_field(name="Total Cost", value=format_cost(build_plan.total))
+        if build_plan.raw != build_plan.total:
+            embed.add_field(name="Raw Materials", value=format_cost(build_plan.raw))
+
+        embeds = [embed]
+        if interaction.namespace.ephemeral is None:
+            preference = await self.bot.db.ephemeral_preference(interaction.user.id)
+            if preference is None:
+                embeds.append(await ephemeral_info(self.bot))
+
+            ephemeral = preference or False
+
+        await interaction.response.send_message(embeds=embeds, ephemeral=ephemeral)
+
 
 async def setup(bot: FacilityBot) -> None:
     await bot.add_cog(Misc(bot))
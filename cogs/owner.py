@@ -1,22 +1,58 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+import io
+import asyncio
+import logging
+from typing import TYPE_CHECKING, Any, Literal
 
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 
 from .utils.embeds import FeedbackEmbed, FeedbackType
-from .utils.views import ResetView
+from .utils.views import ResetView, RestoreView
+from .utils.mixins import InteractionCheckedView
+from .utils.scheduler import Lane
+from .utils.deletion import delete_messages
+from .utils.profiling import ProfileMode, ProfileSession, MemorySnapshots
 
 
 if TYPE_CHECKING:
+    from discord.abc import Messageable
+    from discord.app_commands import AppCommandError, Command, ContextMenu
+
     from bot import FacilityBot
     from .events import Events
+    from .facility import FacilityCog
+    from .utils.context import ClientInteraction
+
+
+logger = logging.getLogger(__name__)
+
+# hours between scheduled snapshots of the database
+SNAPSHOT_INTERVAL_HOURS = 6
 
 
 class Owner(commands.Cog, command_attrs={"hidden": True}):
     def __init__(self, bot: FacilityBot):
         self.bot: FacilityBot = bot
+        self.profile_session: ProfileSession | None = None
+        self.profile_destination: Messageable | None = None
+        self.memory_snapshots = MemorySnapshots()
+
+    async def cog_load(self) -> None:
+        self.bot.cluster.add_handler("shard_stats", self._cluster_shard_stats)
+        self.bot.cluster.add_handler("reload_data", self._cluster_reload_data)
+        # clusters share the database file, one of them snapshots it
+        if self.bot.cluster.cluster_id == 0:
+            self.scheduled_snapshots.start()
+
+    async def cog_unload(self) -> None:
+        self.bot.cluster.remove_handler("shard_stats")
+        self.bot.cluster.remove_handler("reload_data")
+        self.scheduled_snapshots.cancel()
+        if self.profile_session is not None:
+            self.profile_session.disable()
+        self.memory_snapshots.stop()
 
     async def cog_check(self, ctx: commands.Context) -> bool:
         return await self.bot.is_owner(ctx.author)
@@ -33,16 +69,15 @@ class Owner(commands.Cog, command_attrs={"hidden": True}):
 
     @commands.command(aliases=["clean"])
     async def clear(self, ctx: commands.Context, limit: int = 1) -> None:
-        deleted_count = 0
+        messages = []
         async for message in ctx.channel.history(limit=100):
             if message.author == self.bot.user:
-                try:
-                    await message.delete()
-                    deleted_count += 1
-                except discord.NotFound:
-                    pass
-                if deleted_count == limit:
+                messages.append(message)
+                if len(messages) == limit:
                     break
+        deleted_count = await delete_messages(
+            self.bot.rest, messages, lane=Lane.INTERACTION
+        )
 
         if deleted_count:
             embed = FeedbackEmbed(
@@ -60,6 +95,387 @@ class Owner(commands.Cog, command_attrs={"hidden": True}):
         message = await ctx.send(embed=embed, view=view)
         view.message = message
 
+    async def _cluster_reload_data(self, _: Any) -> None:
+        facility_cog: FacilityCog | None = self.bot.get_cog("FacilityCog")
+        if facility_cog is not None:
+            facility_cog.spatial.clear()
+        await self.bot.reload_data()
+
+    @tasks.loop(hours=SNAPSHOT_INTERVAL_HOURS)
+    async def scheduled_snapshots(self) -> None:
+        try:
+            await self.bot.snapshots.snapshot()
+        except Exception:
+            logger.exception("Scheduled snapshot failed")
+
+    @scheduled_snapshots.before_loop
+    async def before_scheduled_snapshots(self) -> None:
+        await self.bot.wait_until_ready()
+
+    @commands.group(invoke_without_command=True)
+    async def snapshot(self, ctx: commands.Context) -> None:
+        """Lists snapshots of the database, newest first"""
+        snapshots = self.bot.snapshots.snapshots()
+        embed = discord.Embed(
+            title=f"Snapshots ({len(snapshots)})", colour=discord.Colour.blue()
+        )
+        lines = [
+            f"> `{snapshot.name}` : {snapshot.reason}, {snapshot.size / 1000:.0f}KB, <t:{snapshot.created.timestamp():.0f}:R>"
+            for snapshot in snapshots[:20]
+        ]
+        embed.description = "\n".join(lines) or "No snapshots"
+        await ctx.send(embed=embed)
+
+    @snapshot.command(name="take")
+    async def snapshot_take(self, ctx: commands.Context) -> None:
+        """Takes a snapshot now"""
+        async with ctx.typing():
+            snapshot = await self.bot.snapshots.snapshot("manual")
+        embed = FeedbackEmbed(
+            f"Took `{snapshot.name}`, {snapshot.size / 1000:.0f}KB",
+            FeedbackType.SUCCESS,
+        )
+        await ctx.send(embed=embed)
+
+    @snapshot.command(name="verify")
+    async def snapshot_verify(
+        self, ctx: commands.Context, name: str = "latest"
+    ) -> None:
+        """Checks a snapshot decompresses and passes SQLite's integrity check"""
+        snapshot = self.bot.snapshots.get(name)
+        if snapshot is None:
+            embed = FeedbackEmbed("No snapshot found", FeedbackType.ERROR)
+            return await ctx.send(embed=embed)
+
+        async with ctx.typing():
+            check = await self.bot.snapshots.verify(snapshot)
+        if check.ok:
+            embed = FeedbackEmbed(
+                f"`{snapshot.name}` is intact with {check.facilities} facilities",
+                FeedbackType.SUCCESS,
+            )
+        else:
+            embed = FeedbackEmbed(
+                f"`{snapshot.name}` is damaged\n```\n{check.message}\n```",
+                FeedbackType.ERROR,
+            )
+        await ctx.send(embed=embed)
+
+    @snapshot.command(name="restore")
+    async def snapshot_restore(self, ctx: commands.Context, name: str) -> None:
+        """Replaces the database with a snapshot, the current state is snapshotted first"""
+        snapshot = self.bot.snapshots.get(name)
+        if snapshot is None:
+            embed = FeedbackEmbed("No snapshot found", FeedbackType.ERROR)
+            return await ctx.send(embed=embed)
+
+        embed = FeedbackEmbed(
+            f"Confirm replacing the database with `{snapshot.name}`",
+            FeedbackType.WARNING,
+        )
+        view = RestoreView(original_author=ctx.author, timeout=30, snapshot=snapshot)
+        message = await ctx.send(embed=embed, view=view)
+        view.message = message
+
+    def shard_stats(self) -> list[dict[str, Any]]:
+        """Health of each shard run by this process
+
+        Returns:
+            list[dict[str, Any]]: JSON serializable stats for each shard
+        """
+        monitor = self.bot.shard_monitor
+        guild_counts: dict[int, int] = {}
+        for guild in self.bot.guilds:
+            guild_counts[guild.shard_id] = guild_counts.get(guild.shard_id, 0) + 1
+
+        stats = []
+        for shard_id, latency in self.bot.shard_latencies():
+            health = monitor.get(shard_id)
+            stats.append(
+                {
+                    "cluster_id": self.bot.cluster.cluster_id,
+                    "shard_id": shard_id,
+                    "latency": latency,
+                    "guilds": guild_counts.get(shard_id, 0),
+                    "connected": health.connected,
+                    "connected_at": health.connected_at,
+                    "events": health.events.total,
+                    "events_per_second": health.events.per_second(),
+                    "disconnects": health.disconnects,
+                    "resumes": health.resumes,
+                }
+            )
+        return stats
+
+    async def _cluster_shard_stats(self, _: Any) -> list[dict[str, Any]]:
+        return self.shard_stats()
+
+    @commands.command()
+    async def shards(self, ctx: commands.Context) -> None:
+        """Shows latency, guild count and event throughput for each shard in every cluster"""
+        stats = self.shard_stats()
+        for cluster_stats in await self.bot.cluster.request("shard_stats"):
+            stats.extend(cluster_stats or [])
+
+        embed = discord.Embed(
+            title=f"Shards ({self.bot.shard_count or 1} total)",
+            colour=discord.Colour.blue(),
+        )
+        if self.bot.cluster.cluster_count > 1:
+            clusters = {shard["cluster_id"] for shard in stats}
+            embed.title += (
+                f" across {len(clusters)}/{self.bot.cluster.cluster_count} clusters"
+            )
+
+        for shard in sorted(stats, key=lambda shard: shard["shard_id"]):
+            status = "🟢" if shard["connected"] else "🔴"
+            value = (
+                f"> Latency : {shard['latency'] * 1000:.0f}ms\n"
+                f"> Guilds : {shard['guilds']}\n"
+                f"> Events : {shard['events']} ({shard['events_per_second']:.1f}/s)\n"
+                f"> Reconnects : {shard['disconnects']}, Resumes : {shard['resumes']}\n"
+            )
+            if shard["connected_at"]:
+                value += f"> Connected : <t:{shard['connected_at']:.0f}:R>\n"
+            if self.bot.cluster.cluster_count > 1:
+                value += f"> Cluster : {shard['cluster_id']}\n"
+            embed.add_field(name=f"{status} Shard {shard['shard_id']}", value=value)
+
+        await ctx.send(embed=embed)
+
+    @commands.command()
+    async def views(self, ctx: commands.Context) -> None:
+        """Shows live view counts and evictions"""
+        stats = InteractionCheckedView.registry.stats()
+        embed = discord.Embed(title="Live views", colour=discord.Colour.blue())
+        embed.description = (
+            f"> Live : {stats['live']}/{stats['max_views']} across {stats['users']} users\n"
+            f"> Peak : {stats['peak']}\n"
+            f"> Registered : {stats['registered']}\n"
+            f"> Evicted : {stats['evicted']} ({stats['evicted_per_user']} over the per user cap of {stats['max_per_user']})\n"
+        )
+        await ctx.send(embed=embed)
+
+    @commands.command()
+    async def rest(self, ctx: commands.Context) -> None:
+        """Shows outbound REST scheduler queues and rate limit counts"""
+        stats = self.bot.rest.stats()
+        embed = discord.Embed(title="REST scheduler", colour=discord.Colour.blue())
+        embed.description = (
+            f"> Queued : {stats['queued']}\n"
+            f"> Waiting on channel : {stats['waiting_on_channel']}\n"
+            f"> Delayed : {stats['delayed']}\n"
+            f"> Active channels : {stats['active_channels']}\n"
+        )
+        for lane, counts in stats["lanes"].items():
+            embed.add_field(
+                name=lane.title(),
+                value="\n".join(f"{key} : {value}" for key, value in counts.items()),
+            )
+        await ctx.send(embed=embed)
+
+    @commands.command()
+    async def deferrals(self, ctx: commands.Context) -> None:
+        """Shows how often commands went over the response budget"""
+        guard = self.bot.tree.auto_defer
+        stats = guard.stats()
+        embed = discord.Embed(
+            title=f"Commands over {guard.budget}s", colour=discord.Colour.blue()
+        )
+        lines = [
+            f"> {name} : {counts['deferred']} deferred, {counts['slow']} slow of {counts['invoked']}"
+            for name, counts in stats.items()
+            if counts["deferred"] or counts["slow"]
+        ]
+        embed.description = "\n".join(lines) or "No commands over the budget"
+        await ctx.send(embed=embed)
+
+    @commands.command()
+    async def extensions(self, ctx: commands.Context) -> None:
+        """Shows how long each extension took to load and which are still deferred"""
+        timings = self.bot.extension_timings
+        embed = discord.Embed(title="Extensions", colour=discord.Colour.blue())
+        lines = [
+            f"> {name} : {elapsed * 1000:.0f}ms"
+            for name, elapsed in sorted(
+                timings.items(), key=lambda item: item[1], reverse=True
+            )
+        ]
+        lines.extend(f"> {name} : deferred" for name in self.bot.lazy_extensions)
+        embed.description = "\n".join(lines) or "No extensions loaded"
+        await ctx.send(embed=embed)
+
+    @commands.group(invoke_without_command=True)
+    async def profile(self, ctx: commands.Context) -> None:
+        session = self.profile_session
+        if session is None:
+            embed = FeedbackEmbed("No profiler running", FeedbackType.INFO)
+        elif session.command_name:
+            embed = FeedbackEmbed(
+                f"Profiling {session.remaining} more invocation(s) of `{session.command_name}` using {session.mode.value}",
+                FeedbackType.INFO,
+            )
+        else:
+            embed = FeedbackEmbed(
+                f"Profiling using {session.mode.value}", FeedbackType.INFO
+            )
+        await ctx.send(embed=embed)
+
+    @profile.command(name="start")
+    async def profile_start(
+        self,
+        ctx: commands.Context,
+        mode: Literal["cprofile", "sampling"] = "cprofile",
+        seconds: float | None = None,
+        limit: int = 40,
+    ) -> None:
+        """Profiles everything for a time window, or until stopped if no window is given"""
+        if self.profile_session is not None:
+            embed = FeedbackEmbed("Profiler already running", FeedbackType.ERROR)
+            return await ctx.send(embed=embed)
+
+        session = ProfileSession(ProfileMode(mode))
+        self.profile_session = session
+        self.profile_destination = ctx.channel
+        session.enable()
+
+        if seconds is None:
+            return await ctx.message.add_reaction("✅")
+
+        await ctx.message.add_reaction("⏱️")
+        await asyncio.sleep(seconds)
+        if self.profile_session is session:
+            await self._finish_profile(limit)
+
+    @profile.command(name="command")
+    async def profile_command(
+        self,
+        ctx: commands.Context,
+        command_name: str,
+        invocations: int = 1,
+        mode: Literal["cprofile", "sampling"] = "cprofile",
+    ) -> None:
+        """Profiles the next invocations of an app or text command by qualified name"""
+        if self.profile_session is not None:
+            embed = FeedbackEmbed("Profiler already running", FeedbackType.ERROR)
+            return await ctx.send(embed=embed)
+
+        self.profile_session = ProfileSession(
+            ProfileMode(mode),
+            command_name=command_name,
+            invocations=max(invocations, 1),
+        )
+        self.profile_destination = ctx.channel
+        await ctx.message.add_reaction("✅")
+
+    @profile.command(name="stop")
+    async def profile_stop(self, ctx: commands.Context, limit: int = 40) -> None:
+        """Stops the running profiler and uploads the report"""
+        if self.profile_session is None:
+            embed = FeedbackEmbed("No profiler running", FeedbackType.ERROR)
+            return await ctx.send(embed=embed)
+
+        self.profile_destination = ctx.channel
+        await self._finish_profile(limit)
+
+    async def _finish_profile(self, limit: int) -> None:
+        session = self.profile_session
+        destination = self.profile_destination
+        self.profile_session = None
+        self.profile_destination = None
+        if session is None:
+            return
+
+        session.disable()
+        report = await asyncio.to_thread(session.report, limit)
+        if destination is not None:
+            await self._send_report(destination, report, "profile.txt")
+
+    @staticmethod
+    async def _send_report(destination: Messageable, report: str, filename: str):
+        report_file = discord.File(io.BytesIO(report.encode()), filename=filename)
+        await destination.send(file=report_file)
+
+    def _profile_target(self, qualified_name: str) -> ProfileSession | None:
+        session = self.profile_session
+        if session is None or session.command_name != qualified_name:
+            return None
+        return session
+
+    async def _profile_invocation_finished(self, qualified_name: str) -> None:
+        session = self._profile_target(qualified_name)
+        if session is None or not session.running:
+            return
+        if session.invocation_finished():
+            await self._finish_profile(40)
+
+    @commands.Cog.listener()
+    async def on_interaction(self, interaction: ClientInteraction) -> None:
+        if interaction.type is not discord.InteractionType.application_command:
+            return
+        command = interaction.command
+        if command is None:
+            return
+        session = self._profile_target(command.qualified_name)
+        if session is not None:
+            session.invocation_started()
+
+    @commands.Cog.listener()
+    async def on_app_command_completion(
+        self, _: ClientInteraction, command: Command | ContextMenu
+    ) -> None:
+        await self._profile_invocation_finished(command.qualified_name)
+
+    @commands.Cog.listener()
+    async def on_app_command_error(
+        self, interaction: ClientInteraction, _: AppCommandError
+    ) -> None:
+        if interaction.command is not None:
+            await self._profile_invocation_finished(interaction.command.qualified_name)
+
+    @commands.Cog.listener()
+    async def on_command(self, ctx: commands.Context) -> None:
+        session = self._profile_target(ctx.command.qualified_name)
+        if session is not None:
+            session.invocation_started()
+
+    @commands.Cog.listener()
+    async def on_command_completion(self, ctx: commands.Context) -> None:
+        await self._profile_invocation_finished(ctx.command.qualified_name)
+
+    @commands.Cog.listener()
+    async def on_command_error(
+        self, ctx: commands.Context, _: commands.CommandError
+    ) -> None:
+        if ctx.command is not None:
+            await self._profile_invocation_finished(ctx.command.qualified_name)
+
+    @profile.group(name="memory", invoke_without_command=True)
+    async def profile_memory(self, ctx: commands.Context, limit: int = 25) -> None:
+        """Takes a tracemalloc snapshot and uploads the top allocations"""
+        await asyncio.to_thread(self.memory_snapshots.take)
+        report = self.memory_snapshots.report(limit)
+        await self._send_report(ctx.channel, report, "memory.txt")
+
+    @profile_memory.command(name="diff")
+    async def profile_memory_diff(
+        self, ctx: commands.Context, limit: int = 25, first: int = -2, second: int = -1
+    ) -> None:
+        """Takes a snapshot and compares two snapshots, defaults to the last two"""
+        await asyncio.to_thread(self.memory_snapshots.take)
+        try:
+            report = self.memory_snapshots.diff(first, second, limit)
+        except IndexError:
+            embed = FeedbackEmbed("Snapshot not found", FeedbackType.ERROR)
+            return await ctx.send(embed=embed)
+        await self._send_report(ctx.channel, report, "memory_diff.txt")
+
+    @profile_memory.command(name="stop")
+    async def profile_memory_stop(self, ctx: commands.Context) -> None:
+        """Stops tracemalloc and clears all snapshots"""
+        self.memory_snapshots.stop()
+        await ctx.message.add_reaction("✅")
+
 
 async def setup(bot: FacilityBot) -> None:
     await bot.add_cog(Owner(bot))
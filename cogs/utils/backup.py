@@ -0,0 +1,278 @@
+from __future__ import annotations
+
+import asyncio
+import gzip
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import NamedTuple
+
+
+logger = logging.getLogger(__name__)
+
+# directory snapshots are kept in
+BACKUP_DIR = Path() / "backups"
+# pages copied per backup step, other connections can take the lock between steps
+BACKUP_STEP_PAGES = 64
+# seconds slept between backup steps
+BACKUP_STEP_SLEEP = 0.005
+# times writes can restart a backup before it copies in one step
+MAX_BACKUP_RESTARTS = 3
+# newest snapshots always kept
+KEEP_RECENT = 24
+# days and weeks keeping their newest snapshot
+KEEP_DAILY = 7
+KEEP_WEEKLY = 4
+
+SNAPSHOT_PATTERN = re.compile(r"^snapshot-(\d{8}-\d{6})-([a-z]+)\.sqlite\.gz$")
+
+
+class Snapshot(NamedTuple):
+    """Compressed copy of the database
+
+    Args:
+        path (Path): Location of the snapshot
+        created (datetime): When it was taken, in UTC
+        reason (str): What it was taken for, like scheduled or reset
+        size (int): Compressed size in bytes
+    """
+
+    path: Path
+    created: datetime
+    reason: str
+    size: int
+
+    @property
+    def name(self) -> str:
+        return self.path.name
+
+
+class SnapshotCheck(NamedTuple):
+    ok: bool
+    message: str
+    facilities: int
+
+
+class _BackupStarved(Exception):
+    pass
+
+
+def _copy(source: sqlite3.Connection, target: sqlite3.Connection) -> None:
+    """Copies a database a few pages per step
+
+    A write from another connection restarts the copy, under steady writes it
+    falls back to copying everything in one step
+    """
+    restarts = 0
+    last_remaining = None
+
+    def progress(_: int, remaining: int, total: int) -> None:
+        nonlocal restarts, last_remaining
+        if last_remaining is not None and remaining > last_remaining:
+            restarts += 1
+            if restarts > MAX_BACKUP_RESTARTS:
+                raise _BackupStarved
+        last_remaining = remaining
+        logger.debug("Backup copied %r of %r pages", total - remaining, total)
+
+    try:
+        source.backup(
+            target, pages=BACKUP_STEP_PAGES, progress=progress, sleep=BACKUP_STEP_SLEEP
+        )
+    except _BackupStarved:
+        logger.warning("Backup restarted %r times, copying in one step", restarts)
+        source.backup(target)
+
+
+def _snapshot(db_file: Path, destination: Path) -> None:
+    """Copies the live database a few pages at a time then compresses the copy"""
+    with tempfile.TemporaryDirectory(dir=destination.parent) as directory:
+        copy_path = Path(directory) / "copy.sqlite"
+        source = sqlite3.connect(db_file)
+        target = sqlite3.connect(copy_path)
+        try:
+            _copy(source, target)
+        finally:
+            target.close()
+            source.close()
+
+        partial = destination.with_name(destination.name + ".part")
+        with copy_path.open("rb") as copy, gzip.open(partial, "wb") as compressed:
+            shutil.copyfileobj(copy, compressed)
+        os.replace(partial, destination)
+
+
+def _check(path: Path) -> SnapshotCheck:
+    with tempfile.TemporaryDirectory(dir=path.parent) as directory:
+        copy_path = Path(directory) / "check.sqlite"
+        try:
+            with gzip.open(path, "rb") as compressed, copy_path.open("wb") as copy:
+                shutil.copyfileobj(compressed, copy)
+        except (OSError, EOFError) as exc:
+            return SnapshotCheck(False, f"Can't decompress: {exc}", 0)
+
+        conn = sqlite3.connect(copy_path)
+        try:
+            result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+            if result != "ok":
+                return SnapshotCheck(False, result, 0)
+            (facilities,) = conn.execute("SELECT count(*) FROM facilities").fetchone()
+        except sqlite3.DatabaseError as exc:
+            return SnapshotCheck(False, str(exc), 0)
+        finally:
+            conn.close()
+    return SnapshotCheck(True, "ok", facilities)
+
+
+def _restore(path: Path, db_file: Path) -> None:
+    """Writes a snapshot over the live database through SQLite so open connections stay valid"""
+    with tempfile.TemporaryDirectory(dir=path.parent) as directory:
+        copy_path = Path(directory) / "restore.sqlite"
+        with gzip.open(path, "rb") as compressed, copy_path.open("wb") as copy:
+            shutil.copyfileobj(compressed, copy)
+
+        source = sqlite3.connect(copy_path)
+        target = sqlite3.connect(db_file)
+        try:
+            _copy(source, target)
+        finally:
+            target.close()
+            source.close()
+
+
+def expired(snapshots: list[Snapshot]) -> list[Snapshot]:
+    """Snapshots outside the retention rules
+
+    The newest KEEP_RECENT are kept, along with the newest of each of the last
+    KEEP_DAILY days and KEEP_WEEKLY weeks that have one
+
+    Args:
+        snapshots (list[Snapshot]): Snapshots, newest first
+
+    Returns:
+        list[Snapshot]: Snapshots that can be removed
+    """
+    keep = set(snapshots[:KEEP_RECENT])
+    days: dict[date, Snapshot] = {}
+    weeks: dict[tuple[int, int], Snapshot] = {}
+    for snapshot in snapshots:
+        days.setdefault(snapshot.created.date(), snapshot)
+        weeks.setdefault(snapshot.created.isocalendar()[:2], snapshot)
+    keep.update(list(days.values())[:KEEP_DAILY])
+    keep.update(list(weeks.values())[:KEEP_WEEKLY])
+    return [snapshot for snapshot in snapshots if snapshot not in keep]
+
+
+class SnapshotService:
+    """Takes, checks and restores compressed snapshots of the database
+
+    Copies run in a thread a few pages per step, so neither the event loop nor
+    other connections wait on a whole backup
+
+    Args:
+        db_file (Path): Live database
+        directory (Path): Where snapshots are kept
+    """
+
+    def __init__(self, db_file: Path, directory: Path = BACKUP_DIR) -> None:
+        self.db_file: Path = db_file
+        self.directory: Path = directory
+        # one backup or restore at a time
+        self.lock = asyncio.Lock()
+
+    def snapshots(self) -> list[Snapshot]:
+        """Snapshots on disk, newest first"""
+        if not self.directory.exists():
+            return []
+        snapshots = []
+        for path in self.directory.iterdir():
+            match = SNAPSHOT_PATTERN.match(path.name)
+            if match is None:
+                continue
+            try:
+                created = datetime.strptime(match[1], "%Y%m%d-%H%M%S")
+            except ValueError:
+                continue
+            created = created.replace(tzinfo=timezone.utc)
+            snapshots.append(Snapshot(path, created, match[2], path.stat().st_size))
+        snapshots.sort(key=lambda snapshot: snapshot.created, reverse=True)
+        return snapshots
+
+    def get(self, name: str) -> Snapshot | None:
+        """Finds a snapshot by name, or the newest if name is latest"""
+        snapshots = self.snapshots()
+        if name == "latest":
+            return snapshots[0] if snapshots else None
+        for snapshot in snapshots:
+            if snapshot.name == name or snapshot.name.startswith(f"snapshot-{name}"):
+                return snapshot
+        return None
+
+    async def snapshot(self, reason: str = "scheduled") -> Snapshot:
+        """Takes a snapshot then removes any outside the retention rules
+
+        Args:
+            reason (str): Lowercase word saying what it's for
+
+        Returns:
+            Snapshot: Snapshot taken
+        """
+        async with self.lock:
+            snapshot = await self._snapshot(reason)
+            self._prune()
+            return snapshot
+
+    def _prune(self) -> None:
+        for old in expired(self.snapshots()):
+            old.path.unlink(missing_ok=True)
+            logger.info("Removed expired snapshot %r", old.name)
+
+    async def _snapshot(self, reason: str) -> Snapshot:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        created = datetime.now(timezone.utc).replace(microsecond=0)
+        # two snapshots in the same second for the same reason replace each other
+        path = self.directory / f"snapshot-{created:%Y%m%d-%H%M%S}-{reason}.sqlite.gz"
+        start = time.perf_counter()
+        await asyncio.to_thread(_snapshot, self.db_file, path)
+        snapshot = Snapshot(path, created, reason, path.stat().st_size)
+        logger.info(
+            "Took snapshot %r in %.2fs, %r bytes",
+            snapshot.name,
+            time.perf_counter() - start,
+            snapshot.size,
+        )
+        return snapshot
+
+    async def verify(self, snapshot: Snapshot) -> SnapshotCheck:
+        return await asyncio.to_thread(_check, snapshot.path)
+
+    async def restore(self, snapshot: Snapshot) -> Snapshot:
+        """Replaces the database with a snapshot after checking it
+
+        Args:
+            snapshot (Snapshot): Snapshot to restore
+
+        Raises:
+            ValueError: The snapshot failed its check
+
+        Returns:
+            Snapshot: Snapshot of the database taken before restoring
+        """
+        async with self.lock:
+            check = await self.verify(snapshot)
+            if not check.ok:
+                raise ValueError(f"Snapshot failed its check, {check.message}")
+            previous = await self._snapshot("restore")
+            # pruned afterwards, the safety snapshot can push the target out of retention
+            try:
+                await asyncio.to_thread(_restore, snapshot.path, self.db_file)
+            finally:
+                self._prune()
+            logger.info("Restored snapshot %r", snapshot.name)
+            return previous
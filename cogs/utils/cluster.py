@@ -0,0 +1,270 @@
+from __future__ import annotations
+
+import json
+import asyncio
+import logging
+import itertools
+from typing import TYPE_CHECKING, Any, Callable, Awaitable
+
+
+if TYPE_CHECKING:
+    from socket import socket
+
+    ClusterHandler = Callable[[Any], Awaitable[Any]]
+
+logger = logging.getLogger(__name__)
+
+# max size of a single message
+STREAM_LIMIT = 2**20
+
+
+def shard_ranges(shard_count: int, cluster_count: int) -> list[list[int]]:
+    """Splits shards into contiguous ranges, one per cluster
+
+    Args:
+        shard_count (int): Total shards
+        cluster_count (int): Number of clusters
+
+    Raises:
+        ValueError: Cluster count is not between 1 and the shard count
+
+    Returns:
+        list[list[int]]: Shard ID's for each cluster
+    """
+    if not 0 < cluster_count <= shard_count:
+        raise ValueError("Cluster count must be between 1 and the shard count")
+
+    size, extra = divmod(shard_count, cluster_count)
+    ranges = []
+    start = 0
+    for cluster_id in range(cluster_count):
+        end = start + size + (cluster_id < extra)
+        ranges.append(list(range(start, end)))
+        start = end
+    return ranges
+
+
+async def _write_message(writer: asyncio.StreamWriter, message: dict[str, Any]) -> None:
+    writer.write(json.dumps(message).encode() + b"\n")
+    await writer.drain()
+
+
+class ClusterHub:
+    """Relays messages between cluster processes, runs in the launcher
+
+    Messages with a target only go to that cluster, everything else is
+    broadcast to every cluster except the sender
+    """
+
+    def __init__(self) -> None:
+        self.writers: dict[int, asyncio.StreamWriter] = {}
+
+    async def serve(self, sock: socket) -> asyncio.AbstractServer:
+        """Starts accepting clusters
+
+        Args:
+            sock (socket): Bound and listening unix socket
+
+        Returns:
+            asyncio.AbstractServer: Running server
+        """
+        return await asyncio.start_unix_server(
+            self._handle_cluster, sock=sock, limit=STREAM_LIMIT
+        )
+
+    async def _handle_cluster(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        cluster_id = None
+        try:
+            hello = json.loads(await reader.readline())
+            cluster_id = hello["origin"]
+            self.writers[cluster_id] = writer
+            logger.info("Cluster %r connected", cluster_id)
+
+            async for line in reader:
+                await self._route(json.loads(line))
+        except (ConnectionError, ValueError, KeyError):
+            logger.exception("Cluster %r connection failed", cluster_id)
+        finally:
+            if cluster_id is not None and self.writers.get(cluster_id) is writer:
+                del self.writers[cluster_id]
+                logger.info("Cluster %r disconnected", cluster_id)
+            writer.close()
+
+    async def _route(self, message: dict[str, Any]) -> None:
+        target = message.get("target")
+        if target is not None:
+            writers = [self.writers[target]] if target in self.writers else []
+        else:
+            writers = [
+                writer
+                for cluster_id, writer in self.writers.items()
+                if cluster_id != message["origin"]
+            ]
+
+        for writer in writers:
+            try:
+                await _write_message(writer, message)
+            except ConnectionError:
+                pass
+
+
+class _PendingRequest:
+    def __init__(self, expected: int) -> None:
+        self.expected: int = expected
+        self.replies: list[Any] = []
+        self.done = asyncio.Event()
+
+    def add(self, data: Any) -> None:
+        self.replies.append(data)
+        if len(self.replies) >= self.expected:
+            self.done.set()
+
+
+class ClusterClient:
+    """Connection from a bot process to the cluster hub
+
+    Without a path the client never connects, broadcasts are dropped and requests
+    return no replies, so a single process bot can use it unchanged
+
+    Args:
+        cluster_id (int): ID of this cluster
+        cluster_count (int): Total clusters
+        path (str, optional): Unix socket the hub listens on
+    """
+
+    def __init__(
+        self, cluster_id: int = 0, cluster_count: int = 1, path: str | None = None
+    ) -> None:
+        self.cluster_id: int = cluster_id
+        self.cluster_count: int = cluster_count
+        self.path: str | None = path
+        self.handlers: dict[str, ClusterHandler] = {}
+        self._writer: asyncio.StreamWriter | None = None
+        self._read_task: asyncio.Task | None = None
+        self._tasks: set[asyncio.Task] = set()
+        self._pending: dict[int, _PendingRequest] = {}
+        self._nonces = itertools.count()
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    def add_handler(self, op: str, handler: ClusterHandler) -> None:
+        """Registers a coroutine to handle an op sent by other clusters, its return value is sent back to requests
+
+        Args:
+            op (str): Name of the operation
+            handler (ClusterHandler): Coroutine taking the message data
+        """
+        self.handlers[op] = handler
+
+    def remove_handler(self, op: str) -> None:
+        self.handlers.pop(op, None)
+
+    async def connect(self) -> None:
+        if self.path is None or self.connected:
+            return
+        reader, self._writer = await asyncio.open_unix_connection(
+            self.path, limit=STREAM_LIMIT
+        )
+        await _write_message(self._writer, {"origin": self.cluster_id})
+        self._read_task = asyncio.create_task(self._read_messages(reader))
+        logger.info("Connected to cluster hub as cluster %r", self.cluster_id)
+
+    async def close(self) -> None:
+        if self._read_task is not None:
+            self._read_task.cancel()
+            self._read_task = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        for pending in self._pending.values():
+            pending.done.set()
+
+    async def broadcast(self, op: str, data: Any = None) -> None:
+        """Sends a message to every other cluster
+
+        Args:
+            op (str): Name of the operation
+            data (Any): JSON serializable data
+        """
+        await self._send({"op": op, "data": data})
+
+    async def request(self, op: str, data: Any = None, timeout: float = 5) -> list[Any]:
+        """Sends a message to every other cluster and collects their replies
+
+        Args:
+            op (str): Name of the operation
+            data (Any): JSON serializable data
+            timeout (float): Seconds to wait for replies
+
+        Returns:
+            list[Any]: Replies received before the timeout, in no particular order
+        """
+        expected = self.cluster_count - 1
+        if not self.connected or expected < 1:
+            return []
+
+        nonce = next(self._nonces)
+        pending = self._pending[nonce] = _PendingRequest(expected)
+        try:
+            await self._send({"op": op, "data": data, "nonce": nonce})
+            await asyncio.wait_for(pending.done.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                "Cluster request %r timed out with %r/%r replies",
+                op,
+                len(pending.replies),
+                expected,
+            )
+        finally:
+            del self._pending[nonce]
+        return pending.replies
+
+    async def _send(self, message: dict[str, Any]) -> None:
+        if not self.connected:
+            return
+        message["origin"] = self.cluster_id
+        try:
+            await _write_message(self._writer, message)
+        except ConnectionError:
+            logger.warning("Lost connection to cluster hub")
+
+    async def _read_messages(self, reader: asyncio.StreamReader) -> None:
+        async for line in reader:
+            message = json.loads(line)
+            if "reply_to" in message:
+                pending = self._pending.get(message["reply_to"])
+                if pending is not None:
+                    pending.add(message.get("data"))
+                continue
+
+            task = asyncio.create_task(self._handle_message(message))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        logger.warning("Cluster hub closed the connection")
+
+    async def _handle_message(self, message: dict[str, Any]) -> None:
+        op = message["op"]
+        result = None
+        handler = self.handlers.get(op)
+        if handler is None:
+            logger.warning("No handler for cluster op %r", op)
+        else:
+            try:
+                result = await handler(message.get("data"))
+            except Exception:
+                logger.exception("Cluster handler for %r failed", op)
+
+        if "nonce" in message:
+            await self._send(
+                {
+                    "op": op,
+                    "data": result,
+                    "target": message["origin"],
+                    "reply_to": message["nonce"],
+                }
+            )
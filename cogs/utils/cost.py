@@ -1,171 +1,315 @@
-from typing import Self, TypeVar
+from __future__ import annotations
 
+from types import MappingProxyType
+from typing import Iterable, Iterator, Mapping, Self
 
-BD = TypeVar("BD", bound="BuildingData")
+from discord import Colour, Embed
+from rapidfuzz import process, utils
 
+from .cache import LRUCache
 
-class Cost(dict):
-    def __iadd__(self, other: Self):
+
+# materials a cost can be made of, in display order
+MATERIALS: tuple[str, ...] = ("salvage", "Bmats", "Cmats", "Pcons", "Scons")
+_MATERIAL_INDEX = {material: index for index, material in enumerate(MATERIALS)}
+
+
+class Cost(tuple):
+    """Immutable amount of each material, adding costs adds each material
+
+    Args:
+        amounts (Iterable[int], optional): Amount of every material in MATERIALS order
+        **materials (int): Amounts by material name
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, amounts: Iterable[int] = (), /, **materials: int) -> Self:
+        values = list(amounts) or [0] * len(MATERIALS)
+        if len(values) != len(MATERIALS):
+            raise ValueError(f"Expected {len(MATERIALS)} amounts, got {len(values)}")
+        for material, amount in materials.items():
+            try:
+                values[_MATERIAL_INDEX[material]] += amount
+            except KeyError:
+                raise TypeError(f"{material!r} is not a valid material") from None
+        return super().__new__(cls, values)
+
+    def __add__(self, other: Cost) -> Cost:
         if not isinstance(other, Cost):
-            raise NotImplementedError()
+            return NotImplemented
+        return Cost(map(int.__add__, self, other))
+
+    # immutable, so += rebinds to a new cost rather than changing a shared one
+    __iadd__ = __add__
+
+    def __mul__(self, count: int) -> Cost:
+        if not isinstance(count, int):
+            return NotImplemented
+        return Cost(amount * count for amount in self)
+
+    __rmul__ = __mul__
+
+    def __bool__(self) -> bool:
+        return any(self)
+
+    def __repr__(self) -> str:
+        amounts = ", ".join(f"{material}={amount}" for material, amount in self.items())
+        return f"{self.__class__.__name__}({amounts})"
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return super().__getitem__(_MATERIAL_INDEX[key])
+        return super().__getitem__(key)
+
+    def items(self) -> Iterator[tuple[str, int]]:
+        """Materials with a non zero amount and their amounts"""
+        for material, amount in zip(MATERIALS, self):
+            if amount:
+                yield material, amount
 
-        combined_dict = self.copy()
+    @classmethod
+    def sum(cls, costs: Iterable[Cost]) -> Cost:
+        """Adds costs in one pass"""
+        return cls(map(sum, zip(*costs)))
 
-        for key, value in other.items():
-            if key in combined_dict:
-                combined_dict[key] += value
-            else:
-                combined_dict[key] = value
-        return combined_dict
+
+def format_cost(cost: Cost) -> str:
+    return ", ".join(f"**{value}x {key}**" for key, value in cost.items())
 
 
 class Building:
-    def __init__(
-        self,
-        name: str,
-        cost: Cost,
-        upgrades: list[Self] | None = None,
-        parent: Self | None = None,
-    ):
+    """Building in the catalogue, compiled once and not changed after
+
+    Args:
+        name (str): Name
+        cost (Cost): Cost of building it, or of upgrading to it from the parent
+        parent (Building, optional): Building it's an upgrade of
+    """
+
+    __slots__ = ("name", "cost", "parent", "upgrades", "ancestors", "total", "_embed")
+
+    def __init__(self, name: str, cost: Cost, parent: Building | None = None) -> None:
         self.name: str = name
         self.cost: Cost = cost
-        self.upgrades: list[Self] = upgrades or []
-        self.parent: Self | None = parent
+        self.parent: Building | None = parent
+        self.upgrades: tuple[Building, ...] = ()
+        # parent first, then its parent and so on
+        self.ancestors: tuple[Building, ...] = (
+            (parent, *parent.ancestors) if parent else ()
+        )
+        self.total: Cost = Cost.sum(
+            [cost, *(building.cost for building in self.ancestors)]
+        )
+        self._embed: Embed = self._render()
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} name={self.name!r} cost={self.cost!r}>"
 
-    def get_all_parents(self) -> list[Self]:
-        parents = []
-        current = self.parent
-        while current is not None:
-            parents.append(current)
-            current = current.parent
-        return parents
+    def get_all_parents(self) -> list[Building]:
+        return list(self.ancestors)
 
-    def total_cost(self):
-        cost = self.cost
-        for building in self.get_all_parents():
-            cost += building.cost
-        return cost
+    def total_cost(self) -> Cost:
+        return self.total
+
+    def _render(self) -> Embed:
+        embed = Embed(title=self.name, colour=Colour.blue())
+
+        description = format_cost(self.cost)
+        if self.parent:
+            description += f"\n\nParent (**{self.parent.name}**) cost: {format_cost(self.parent.cost)}"
+            description += f"\n\nTotal cost: {format_cost(self.total)}"
+
+        embed.description = description
+        return embed
+
+    def embed(self) -> Embed:
+        """Copy of the pre-rendered cost embed"""
+        return self._embed.copy()
 
 
 item_data = {"Cmats": Cost(salvage=10), "Bmats": Cost(salvage=2)}
 
 
-# needs rework
-class BuildingData(dict):
-    data = {
-        "Materials Factory": Building(
-            "Materials Factory",
-            Cost(Bmats=200),
-            upgrades=["Forge", "Metal Press", "Assembly Bay", "Smelter"],
-        ),
-        "Forge": Building("Forge", Cost(Cmats=200), parent="Materials Factory"),
-        "Metal Press": Building(
-            "Metal Press", Cost(Cmats=25), parent="Materials Factory"
-        ),
-        "Assembly Bay": Building(
-            "Assembly Bay", Cost(Bmats=50), parent="Materials Factory"
-        ),
-        "Smelter": Building("Smelter", Cost(Cmats=25), parent="Materials Factory"),
-        "Metalworks Factory": Building("Metalworks Factory", Cost(Cmats=125)),
-        "Blast Furnace": Building(
-            "Blast Furnace", Cost(Pcons=200), parent="Metalworks Factory"
-        ),
-        "Engineering Station": Building(
-            "Engineering Station", Cost(Pcons=150), parent="Metalworks Factory"
-        ),
-        "Recycler": Building("Recycler", Cost(Cmats=25), parent="Metalworks Factory"),
-        "Ammunition Factory": Building("Ammunition Factory", Cost(Pcons=25)),
-        "Rocket Ammunition Factory": Building(
-            "Rocket Ammunition Factory", Cost(Pcons=65), parent="Ammunition Factory"
-        ),
-        "Diesel Power Plant": Building(
-            "Diesel Power Plant",
-            Cost(Bmats=150),
-        ),
-        "Petrol Power Plant": Building(
-            "Petrol Power Plant", Cost(Cmats=100), parent="Diesel Power Plant"
-        ),
-        "Power Station": Building("Power Station", Cost(Pcons=25)),
-        "Sulfuric Reactor": Building(
-            "Sulfuric Reactor", Cost(Scons=25), parent="Power Station"
-        ),
-        "Large Assembly Factory": Building("Large Assembly Factory", Cost(Pcons=250)),
-        "Train Assembly": Building(
-            "Train Assembly", Cost(Scons=150), parent="Large Assembly Factory"
-        ),
-        "Heavy Tank Assembly": Building(
-            "Heavy Tank Assembly", Cost(Scons=150), parent="Large Assembly Factory"
-        ),
-        "Field Modification Center": Building(
-            "Field Modification Center",
-            Cost(Pcons=250),
-        ),
-        "Resource Transfer Station": Building(
-            "Resource Transfer Station",
-            Cost(Cmats=35),
-        ),
-        "Material Transfer Station": Building(
-            "Material Transfer Station",
-            Cost(Cmats=35),
-        ),
-        "Liquid Transfer Station": Building(
-            "Liquid Transfer Station",
-            Cost(Cmats=35),
-        ),
-        "Coal Refinery": Building(
-            "Coal Refinery",
-            Cost(Cmats=50),
-        ),
-        "Coke Furnace": Building(
-            "Coke Furnace", Cost(Cmats=200), parent="Coal Refinery"
-        ),
-        "Coal Liquefier": Building(
-            "Coal Liquefier", Cost(Pcons=25), parent="Coal Refinery"
-        ),
-        "Advanced Coal Liquefier": Building(
-            "Advanced Coal Liquefier", Cost(Scons=65), parent="Coal Refinery"
-        ),
-        "Oil Refinery": Building("Oil Refinery", Cost(Cmats=50)),
-        "Reformer": Building("Reformer", Cost(Cmats=200), parent="Oil Refinery"),
-        "Cracking Unit": Building(
-            "Cracking Unit", Cost(Pcons=20), parent="Oil Refinery"
-        ),
-        "Petrochemical Plant": Building(
-            "Petrochemical Plant", Cost(Scons=25), parent="Oil Refinery"
-        ),
-        "Light Vehicle Assembly Station": Building(
-            "Light Vehicle Assembly Station", Cost(Cmats=75)
-        ),
-        "Motor Pool": Building(
-            "Motor Pool", Cost(Cmats=200), parent="Light Vehicle Assembly Station"
-        ),
-        "Rocket Factory": Building(
-            "Rocket Factory", Cost(Pcons=65), parent="Light Vehicle Assembly Station"
-        ),
-        "Field Station": Building(
-            "Field Station", Cost(Scons=25), parent="Light Vehicle Assembly Station"
-        ),
-        "Tank Factory": Building(
-            "Tank Factory", Cost(Pcons=200), parent="Light Vehicle Assembly Station"
-        ),
-        "Weapons Platform": Building(
-            "Weapons Platform", Cost(Scons=20), parent="Light Vehicle Assembly Station"
-        ),
-    }
-
-    def __init__(self):
-        super().__init__(self.data)
-        self._resolve_buildings()
-
-    def _resolve_buildings(self):
-        for value in self.values():
-            if value.parent:
-                value.parent = self[value.parent]
-            if value.upgrades:
-                value.upgrades = [self[upgrade] for upgrade in value.upgrades[:]]
-
-
-building_data: dict[str, Building] = BuildingData()
+def _raw_vector(material: str, seen: frozenset[str] = frozenset()) -> Cost:
+    recipe = item_data.get(material)
+    if recipe is None:
+        return Cost(**{material: 1})
+    if material in seen:
+        raise ValueError(f"{material!r} is made from itself")
+    return Cost.sum(
+        _raw_vector(ingredient, seen | {material}) * amount
+        for ingredient, amount in recipe.items()
+    )
+
+
+# raw materials making up one of each material, in MATERIALS order
+RAW_VECTORS: tuple[Cost, ...] = tuple(_raw_vector(material) for material in MATERIALS)
+
+
+def raw_materials(cost: Cost) -> Cost:
+    """Expands refined materials into what they're made from using item_data
+
+    Args:
+        cost (Cost): Cost to expand
+
+    Returns:
+        Cost: Cost in raw materials, materials without a recipe are kept
+    """
+    return Cost.sum(
+        vector * amount for vector, amount in zip(RAW_VECTORS, cost) if amount
+    )
+
+
+# name, cost and the building it's upgraded from, parents before their upgrades
+BUILDINGS: tuple[tuple[str, Cost, str | None], ...] = (
+    ("Materials Factory", Cost(Bmats=200), None),
+    ("Forge", Cost(Cmats=200), "Materials Factory"),
+    ("Metal Press", Cost(Cmats=25), "Materials Factory"),
+    ("Assembly Bay", Cost(Bmats=50), "Materials Factory"),
+    ("Smelter", Cost(Cmats=25), "Materials Factory"),
+    ("Metalworks Factory", Cost(Cmats=125), None),
+    ("Blast Furnace", Cost(Pcons=200), "Metalworks Factory"),
+    ("Engineering Station", Cost(Pcons=150), "Metalworks Factory"),
+    ("Recycler", Cost(Cmats=25), "Metalworks Factory"),
+    ("Ammunition Factory", Cost(Pcons=25), None),
+    ("Rocket Ammunition Factory", Cost(Pcons=65), "Ammunition Factory"),
+    ("Diesel Power Plant", Cost(Bmats=150), None),
+    ("Petrol Power Plant", Cost(Cmats=100), "Diesel Power Plant"),
+    ("Power Station", Cost(Pcons=25), None),
+    ("Sulfuric Reactor", Cost(Scons=25), "Power Station"),
+    ("Large Assembly Factory", Cost(Pcons=250), None),
+    ("Train Assembly", Cost(Scons=150), "Large Assembly Factory"),
+    ("Heavy Tank Assembly", Cost(Scons=150), "Large Assembly Factory"),
+    ("Field Modification Center", Cost(Pcons=250), None),
+    ("Resource Transfer Station", Cost(Cmats=35), None),
+    ("Material Transfer Station", Cost(Cmats=35), None),
+    ("Liquid Transfer Station", Cost(Cmats=35), None),
+    ("Coal Refinery", Cost(Cmats=50), None),
+    ("Coke Furnace", Cost(Cmats=200), "Coal Refinery"),
+    ("Coal Liquefier", Cost(Pcons=25), "Coal Refinery"),
+    ("Advanced Coal Liquefier", Cost(Scons=65), "Coal Refinery"),
+    ("Oil Refinery", Cost(Cmats=50), None),
+    ("Reformer", Cost(Cmats=200), "Oil Refinery"),
+    ("Cracking Unit", Cost(Pcons=20), "Oil Refinery"),
+    ("Petrochemical Plant", Cost(Scons=25), "Oil Refinery"),
+    ("Light Vehicle Assembly Station", Cost(Cmats=75), None),
+    ("Motor Pool", Cost(Cmats=200), "Light Vehicle Assembly Station"),
+    ("Rocket Factory", Cost(Pcons=65), "Light Vehicle Assembly Station"),
+    ("Field Station", Cost(Scons=25), "Light Vehicle Assembly Station"),
+    ("Tank Factory", Cost(Pcons=200), "Light Vehicle Assembly Station"),
+    ("Weapons Platform", Cost(Scons=20), "Light Vehicle Assembly Station"),
+)
+
+
+class BuildingData(Mapping[str, Building]):
+    """Read only catalogue of buildings compiled from their definitions
+
+    Args:
+        definitions (Iterable[tuple[str, Cost, str | None]]): Name, cost and parent name of each building
+    """
+
+    def __init__(self, definitions: Iterable[tuple[str, Cost, str | None]]) -> None:
+        buildings: dict[str, Building] = {}
+        upgrades: dict[str, list[Building]] = {}
+        for name, cost, parent_name in definitions:
+            parent = buildings[parent_name] if parent_name else None
+            building = Building(name, cost, parent)
+            buildings[name] = building
+            if parent_name:
+                upgrades.setdefault(parent_name, []).append(building)
+
+        for name, children in upgrades.items():
+            buildings[name].upgrades = tuple(children)
+        self._buildings: Mapping[str, Building] = MappingProxyType(buildings)
+
+    def __getitem__(self, name: str) -> Building:
+        return self._buildings[name]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._buildings)
+
+    def __len__(self) -> int:
+        return len(self._buildings)
+
+
+building_data: Mapping[str, Building] = BuildingData(BUILDINGS)
+
+# other names people use for buildings
+BUILDING_ALIASES: dict[str, str] = {
+    "mf": "Materials Factory",
+    "mat fac": "Materials Factory",
+    "ammo factory": "Ammunition Factory",
+    "rocket ammo factory": "Rocket Ammunition Factory",
+    "diesel plant": "Diesel Power Plant",
+    "petrol plant": "Petrol Power Plant",
+    "laf": "Large Assembly Factory",
+    "large assembly": "Large Assembly Factory",
+    "fmc": "Field Modification Center",
+    "mod center": "Field Modification Center",
+    "rts": "Resource Transfer Station",
+    "mts": "Material Transfer Station",
+    "lts": "Liquid Transfer Station",
+    "coal ref": "Coal Refinery",
+    "oil ref": "Oil Refinery",
+    "lvas": "Light Vehicle Assembly Station",
+    "small assembly": "Light Vehicle Assembly Station",
+}
+# recent questions and the building they matched
+MATCH_CACHE_SIZE = 256
+
+
+class BuildingMatcher:
+    """Fuzzy building lookup over names and aliases processed once up front
+
+    Args:
+        buildings (Mapping[str, Building]): Buildings by name
+        aliases (Mapping[str, str]): Alias to building name
+        score_cutoff (float): Lowest score counted as a match
+    """
+
+    def __init__(
+        self,
+        buildings: Mapping[str, Building],
+        aliases: Mapping[str, str],
+        *,
+        score_cutoff: float = 80,
+    ) -> None:
+        self.score_cutoff: float = score_cutoff
+        names = {name: buildings[name] for name in buildings}
+        names.update((alias, buildings[name]) for alias, name in aliases.items())
+        self._choices: list[str] = [utils.default_process(name) for name in names]
+        self._buildings: list[Building] = list(names.values())
+        self._exact: dict[str, Building] = dict(zip(self._choices, self._buildings))
+        self._recent: LRUCache[str, Building | None] = LRUCache(MATCH_CACHE_SIZE)
+
+    def match(self, query: str) -> Building | None:
+        """Finds the building a question is most likely about
+
+        Args:
+            query (str): Text naming a building
+
+        Returns:
+            Building | None: Building, or None if nothing scores high enough
+        """
+        processed = utils.default_process(query)
+        if processed in self._recent:
+            return self._recent.get(processed)
+
+        building = self._exact.get(processed)
+        if building is None:
+            choice = process.extractOne(
+                processed,
+                self._choices,
+                processor=None,
+                score_cutoff=self.score_cutoff,
+            )
+            building = choice and self._buildings[choice[2]]
+        self._recent.put(processed, building)
+        return building
+
+
+building_matcher = BuildingMatcher(building_data, BUILDING_ALIASES)
 
 
 class BuildingsMeta(type):
@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import Counter
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, TypeVar, Union
+
+from discord import Interaction, InteractionResponse, app_commands
+
+
+if TYPE_CHECKING:
+    EphemeralOption = Union[bool, Callable[[Interaction], Awaitable[bool]]]
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+# seconds a command has to respond before it's deferred, discord allows 3
+AUTO_DEFER_BUDGET = 2.0
+
+
+def auto_defer(*, ephemeral: EphemeralOption = False) -> Callable[[T], T]:
+    """Defers the command with a thinking response if it hasn't responded within the budget
+
+    Responses sent after the defer go to followups, so the command doesn't need to check
+
+    Args:
+        ephemeral (EphemeralOption): Whether the thinking response is ephemeral, or a coroutine deciding it
+    """
+
+    def decorator(func: T) -> T:
+        target = func.callback if isinstance(func, app_commands.Command) else func
+        target.__auto_defer__ = ephemeral
+        return func
+
+    return decorator
+
+
+async def preferred_ephemeral(interaction: Interaction) -> bool:
+    """Uses the command's ephemeral option, falling back to the user's saved preference
+
+    Only reads the preference, the command itself saves the default and shows
+    first time users how to change it
+    """
+    ephemeral = interaction.namespace.ephemeral
+    if ephemeral is not None:
+        return ephemeral
+    db = interaction.client.db
+    preference = await db.saved_ephemeral_preference(interaction.user.id)
+    return preference or False
+
+
+class GuardedResponse(InteractionResponse):
+    """Interaction response that can be deferred from outside the command
+
+    Once deferred by the guard, messages and edits go to followups and the
+    original response instead
+    """
+
+    __slots__ = ("_lock", "auto_deferred")
+
+    def __init__(self, parent: Interaction) -> None:
+        super().__init__(parent)
+        self._lock = asyncio.Lock()
+        self.auto_deferred: bool = False
+
+    async def auto_defer(self, ephemeral: bool) -> bool:
+        """Defers with a thinking response unless the command already responded
+
+        Returns:
+            bool: Whether it deferred
+        """
+        async with self._lock:
+            if self.is_done():
+                return False
+            await super().defer(ephemeral=ephemeral, thinking=True)
+            self.auto_deferred = True
+            return True
+
+    async def defer(self, *, ephemeral: bool = False, thinking: bool = False) -> None:
+        async with self._lock:
+            if self.auto_deferred:
+                return
+            await super().defer(ephemeral=ephemeral, thinking=thinking)
+
+    async def send_message(self, content: Any | None = None, **kwargs: Any) -> None:
+        async with self._lock:
+            if not self.auto_deferred:
+                return await super().send_message(content, **kwargs)
+
+        delete_after = kwargs.pop("delete_after", None)
+        if content is not None:
+            kwargs["content"] = content
+        message = await self._parent.followup.send(wait=True, **kwargs)
+        if delete_after is not None:
+            await message.delete(delay=delete_after)
+
+    async def edit_message(self, **kwargs: Any) -> None:
+        async with self._lock:
+            if not self.auto_deferred:
+                return await super().edit_message(**kwargs)
+
+        delete_after = kwargs.pop("delete_after", None)
+        message = await self._parent.edit_original_response(**kwargs)
+        if delete_after is not None:
+            await message.delete(delay=delete_after)
+
+    async def send_modal(self, modal: Any) -> None:
+        async with self._lock:
+            return await super().send_modal(modal)
+
+
+class AutoDeferGuard:
+    """Defers slow commands marked with auto_defer and counts how often it happens
+
+    Args:
+        budget (float): Seconds a command has to respond
+    """
+
+    def __init__(self, budget: float = AUTO_DEFER_BUDGET) -> None:
+        self.budget: float = budget
+        self.invoked: Counter[str] = Counter()
+        self.deferred: Counter[str] = Counter()
+        # commands that went over the budget without auto_defer
+        self.slow: Counter[str] = Counter()
+
+    def install(self, interaction: Interaction) -> asyncio.Task:
+        """Swaps in a guarded response and starts the timer
+
+        Args:
+            interaction (Interaction): Command interaction
+
+        Returns:
+            asyncio.Task: Timer to cancel once the command finishes
+        """
+        response = GuardedResponse(interaction)
+        interaction._cs_response = response
+        return asyncio.create_task(self._watch(interaction, response))
+
+    def finished(self, interaction: Interaction) -> None:
+        if interaction.command is not None:
+            self.invoked[interaction.command.qualified_name] += 1
+
+    async def _resolve_ephemeral(
+        self, interaction: Interaction, ephemeral: EphemeralOption
+    ) -> bool:
+        """Decides the thinking response's visibility while the command runs
+
+        Falls back to not ephemeral if deciding takes the whole budget
+        """
+        if not callable(ephemeral):
+            return ephemeral
+        try:
+            return await asyncio.wait_for(ephemeral(interaction), self.budget)
+        except asyncio.TimeoutError:
+            logger.warning("Deciding if a thinking response is ephemeral timed out")
+        except Exception:
+            logger.exception("Deciding if a thinking response is ephemeral failed")
+        return False
+
+    async def _watch(self, interaction: Interaction, response: GuardedResponse) -> None:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.budget
+        command = interaction.command
+        ephemeral = None
+        if command is not None:
+            ephemeral = getattr(command.callback, "__auto_defer__", None)
+        if ephemeral is not None:
+            # resolved up front so the defer itself doesn't wait on the database
+            ephemeral = await self._resolve_ephemeral(interaction, ephemeral)
+
+        await asyncio.sleep(max(deadline - loop.time(), 0))
+        if command is None or response.is_done():
+            return
+
+        name = command.qualified_name
+        if ephemeral is None:
+            self.slow[name] += 1
+            logger.warning("Command %r hasn't responded within %ss", name, self.budget)
+            return
+
+        if await response.auto_defer(ephemeral):
+            self.deferred[name] += 1
+            logger.info("Deferred command %r after %ss", name, self.budget)
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        names = set(self.invoked) | set(self.deferred) | set(self.slow)
+        return {
+            name: {
+                "invoked": self.invoked[name],
+                "deferred": self.deferred[name],
+                "slow": self.slow[name],
+            }
+            for name in sorted(names)
+        }
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import logging
+from datetime import timedelta
+from typing import TYPE_CHECKING, Iterable, Union
+
+from discord import utils, HTTPException, NotFound
+
+from .scheduler import Lane
+
+
+if TYPE_CHECKING:
+    from discord import Message, PartialMessage
+    from discord.abc import Messageable
+
+    from .scheduler import RestScheduler
+
+    AnyMessage = Union[Message, PartialMessage]
+
+logger = logging.getLogger(__name__)
+
+# max messages discord accepts in one bulk delete
+BULK_DELETE_LIMIT = 100
+# bulk delete rejects messages older than 14 days, leave a margin for clock drift
+BULK_DELETE_MAX_AGE = timedelta(days=14) - timedelta(minutes=5)
+
+
+def _can_bulk_delete(channel: Messageable) -> bool:
+    if not hasattr(channel, "delete_messages"):
+        return False
+    guild = getattr(channel, "guild", None)
+    if guild is None:
+        return False
+    return channel.permissions_for(guild.me).manage_messages
+
+
+async def _delete_single(
+    rest: RestScheduler, lane: Lane, messages: list[AnyMessage]
+) -> int:
+    deleted = 0
+    for message in messages:
+        try:
+            await rest.run(lane, message.channel.id, message.delete)
+        except NotFound:
+            continue
+        deleted += 1
+    return deleted
+
+
+async def delete_messages(
+    rest: RestScheduler, messages: Iterable[AnyMessage], *, lane: Lane = Lane.LIST
+) -> int:
+    """Deletes messages with as few requests as possible
+
+    Messages are grouped by channel and bulk deleted 100 at a time, messages too
+    old for bulk deletion or in channels where the bot can't bulk delete are
+    deleted one by one
+
+    Args:
+        rest (RestScheduler): Scheduler the requests run through
+        messages (Iterable[AnyMessage]): Messages to delete, can be from different channels
+        lane (Lane): Priority of the requests
+
+    Returns:
+        int: Messages deleted, already deleted messages aren't counted by single deletes
+    """
+    channels: dict[int, tuple[Messageable, dict[int, AnyMessage]]] = {}
+    for message in messages:
+        _, by_id = channels.setdefault(message.channel.id, (message.channel, {}))
+        # bulk delete fails on duplicate ID's
+        by_id[message.id] = message
+
+    cutoff = utils.time_snowflake(utils.utcnow() - BULK_DELETE_MAX_AGE)
+    deleted = 0
+    for channel, by_id in channels.values():
+        single = [message for message in by_id.values() if message.id < cutoff]
+        recent = [message for message in by_id.values() if message.id >= cutoff]
+        if len(recent) < 2 or not _can_bulk_delete(channel):
+            deleted += await _delete_single(rest, lane, single + recent)
+            continue
+
+        for index in range(0, len(recent), BULK_DELETE_LIMIT):
+            chunk = recent[index : index + BULK_DELETE_LIMIT]
+            try:
+                await rest.run(lane, channel.id, lambda: channel.delete_messages(chunk))
+            except HTTPException:
+                logger.warning(
+                    "Bulk delete failed in %r, deleting %r messages individually",
+                    channel.id,
+                    len(chunk),
+                    exc_info=True,
+                )
+                single.extend(chunk)
+            else:
+                deleted += len(chunk)
+        deleted += await _delete_single(rest, lane, single)
+    return deleted
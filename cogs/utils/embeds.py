@@ -235,16 +235,26 @@ async def create_list(
 
 
 async def ephemeral_info(bot: FacilityBot) -> Embed:
-    command = await bot.tree.get_or_fetch_app_command("toggle_ephemeral")
-    return Embed(
-        description=f"Not expecting this message to be viewable by everyone? You can change your preference with the command {command and command.mention}. This message will not be shown again.",
-        colour=Colour.blue(),
-    )
+    embed = bot.tree.rendered.get("ephemeral_info")
+    if embed is None:
+        command = await bot.tree.get_or_fetch_app_command("toggle_ephemeral")
+        embed = bot.tree.rendered["ephemeral_info"] = Embed(
+            description=f"Not expecting this message to be viewable by everyone? You can change your preference with the command {command and command.mention}. This message will not be shown again.",
+            colour=Colour.blue(),
+        )
+    return embed.copy()
 
 
 class HelpEmbed(Embed):
     @classmethod
     async def create(cls, bot: FacilityBot):
+        embed = bot.tree.rendered.get("help")
+        if embed is None:
+            embed = bot.tree.rendered["help"] = await cls._render(bot)
+        return embed.copy()
+
+    @classmethod
+    async def _render(cls, bot: FacilityBot):
         tree = bot.tree
 
         toggle_ephemeral_cmd = await tree.get_or_fetch_app_command("toggle_ephemeral")
@@ -255,7 +265,6 @@ class HelpEmbed(Embed):
         locate_cmd = await tree.get_or_fetch_app_command("locate")
         list_cmd = await tree.get_or_fetch_app_command("list")
         remove_ids_cmd = await tree.get_or_fetch_app_command("remove ids")
-        remove_ids_cmd = await tree.get_or_fetch_app_command("remove ids")
         remove_facility_cmd = await tree.get_or_fetch_app_command("remove facility")
 
         embed = cls(
@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+import struct
+import zlib
+from enum import Enum
+from typing import IO, TYPE_CHECKING, Any, Iterator
+
+from .flags import FacilityFlags
+
+
+if TYPE_CHECKING:
+    from .facility import Facility
+
+# facilities fetched from the database and written at a time
+EXPORT_CHUNK_SIZE = 500
+# bytes an export keeps in memory before spilling to disk
+SPOOL_MAX_BYTES = 4_000_000
+# first bytes of a columnar export, the digit is the format version
+COLUMNAR_MAGIC = b"FLCOL1\n"
+
+# (column, is integer) in the order they're exported
+EXPORT_COLUMNS: tuple[tuple[str, bool], ...] = (
+    ("id_", True),
+    ("name", False),
+    ("description", False),
+    ("region", False),
+    ("coordinates", False),
+    ("marker", False),
+    ("maintainer", False),
+    ("author", True),
+    ("item_services", True),
+    ("vehicle_services", True),
+    ("creation_time", True),
+    ("image_url", False),
+    ("thread_id", True),
+)
+_INTEGER = struct.Struct("<q")
+_LENGTH = struct.Struct("<I")
+
+
+class ExportFormat(Enum):
+    CSV = "csv"
+    JSONL = "jsonl"
+    COLUMNAR = "col"
+
+    @property
+    def extension(self) -> str:
+        return self.value
+
+
+def _service_names(flags: FacilityFlags) -> list[str]:
+    return [name for name in flags.MAPPED_FLAGS if getattr(flags, name)]
+
+
+def _row(facility: Facility) -> dict[str, Any]:
+    """Columns of a facility for text exports, services as names /import accepts"""
+    return {
+        "id_": facility.id_,
+        "name": facility.name,
+        "description": facility.description,
+        "region": facility.region,
+        "coordinates": facility.coordinates or "",
+        "marker": facility.marker,
+        "maintainer": facility.maintainer,
+        "author": facility.author,
+        "item_services": _service_names(facility.item_services),
+        "vehicle_services": _service_names(facility.vehicle_services),
+        "creation_time": facility.creation_time,
+        "image_url": facility.image_url,
+        "thread_id": facility.thread_id,
+    }
+
+
+def _value(facility: Facility, column: str) -> Any:
+    value = getattr(facility, column)
+    if isinstance(value, FacilityFlags):
+        return value.value
+    return value
+
+
+class ExportWriter:
+    """Writes facilities to a binary file a chunk at a time
+
+    Args:
+        file (IO[bytes]): File to write to
+    """
+
+    def __init__(self, file: IO[bytes]) -> None:
+        self.file: IO[bytes] = file
+        self.rows: int = 0
+
+    def write(self, facilities: list[Facility]) -> None:
+        self.rows += len(facilities)
+
+    def close(self) -> None:
+        pass
+
+
+class CsvWriter(ExportWriter):
+    def __init__(self, file: IO[bytes]) -> None:
+        super().__init__(file)
+        self._header_written: bool = False
+
+    def write(self, facilities: list[Facility]) -> None:
+        super().write(facilities)
+        buffer = io.StringIO(newline="")
+        writer = csv.writer(buffer)
+        if not self._header_written:
+            writer.writerow(column for column, _ in EXPORT_COLUMNS)
+            self._header_written = True
+        for facility in facilities:
+            row = _row(facility)
+            row["item_services"] = ", ".join(row["item_services"])
+            row["vehicle_services"] = ", ".join(row["vehicle_services"])
+            writer.writerow("" if value is None else value for value in row.values())
+        self.file.write(buffer.getvalue().encode())
+
+
+class JsonLinesWriter(ExportWriter):
+    def write(self, facilities: list[Facility]) -> None:
+        super().write(facilities)
+        lines = "".join(
+            json.dumps(_row(facility), ensure_ascii=False) + "\n"
+            for facility in facilities
+        )
+        self.file.write(lines.encode())
+
+
+class ColumnarWriter(ExportWriter):
+    """Each chunk is a row group with a compressed block per column
+
+    After the magic and a JSON header naming the columns, every row group is a
+    row count followed by one length prefixed zlib block per column. Integer
+    columns are little endian int64 with missing values as 0, text columns are
+    the UTF-8 lengths followed by the concatenated text.
+    """
+
+    def __init__(self, file: IO[bytes]) -> None:
+        super().__init__(file)
+        header = json.dumps(
+            [{"name": column, "integer": integer} for column, integer in EXPORT_COLUMNS]
+        ).encode()
+        file.write(COLUMNAR_MAGIC + _LENGTH.pack(len(header)) + header)
+
+    def write(self, facilities: list[Facility]) -> None:
+        if not facilities:
+            return
+        super().write(facilities)
+        self.file.write(_LENGTH.pack(len(facilities)))
+        for column, integer in EXPORT_COLUMNS:
+            values = [_value(facility, column) for facility in facilities]
+            if integer:
+                raw = struct.pack(f"<{len(values)}q", *(value or 0 for value in values))
+            else:
+                encoded = [(value or "").encode() for value in values]
+                raw = struct.pack(f"<{len(encoded)}I", *map(len, encoded))
+                raw += b"".join(encoded)
+            block = zlib.compress(raw)
+            self.file.write(_LENGTH.pack(len(block)) + block)
+
+
+WRITERS: dict[ExportFormat, type[ExportWriter]] = {
+    ExportFormat.CSV: CsvWriter,
+    ExportFormat.JSONL: JsonLinesWriter,
+    ExportFormat.COLUMNAR: ColumnarWriter,
+}
+
+
+def _read_exact(file: IO[bytes], size: int) -> bytes:
+    data = file.read(size)
+    if len(data) != size:
+        raise ValueError("Columnar export is truncated")
+    return data
+
+
+def read_columnar(file: IO[bytes]) -> Iterator[dict[str, list]]:
+    """Reads a columnar export a row group at a time
+
+    Args:
+        file (IO[bytes]): File positioned at the start of the export
+
+    Raises:
+        ValueError: The file isn't a columnar export or is truncated
+
+    Returns:
+        Iterator[dict[str, list]]: Values of each column in a row group
+    """
+    if file.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+        raise ValueError("Not a columnar export")
+    (header_length,) = _LENGTH.unpack(_read_exact(file, _LENGTH.size))
+    columns = json.loads(_read_exact(file, header_length))
+
+    while count_data := file.read(_LENGTH.size):
+        (count,) = _LENGTH.unpack(count_data)
+        group = {}
+        for column in columns:
+            (block_length,) = _LENGTH.unpack(_read_exact(file, _LENGTH.size))
+            raw = zlib.decompress(_read_exact(file, block_length))
+            if column["integer"]:
+                group[column["name"]] = list(struct.unpack(f"<{count}q", raw))
+                continue
+            lengths = struct.unpack_from(f"<{count}I", raw)
+            position = count * _LENGTH.size
+            values = []
+            for length in lengths:
+                values.append(raw[position : position + length].decode())
+                position += length
+            group[column["name"]] = values
+        yield group
@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+import json
+from copy import copy
+from typing import TYPE_CHECKING, Any, Iterable, NamedTuple
+
+from discord import Embed, Colour
+
+from .flags import FacilityFlags, ItemServiceFlags, VehicleServiceFlags
+
+
+if TYPE_CHECKING:
+    from .facility import Facility
+
+# text fields a modify can change, in the order they're shown
+TRACKED_FIELDS = ("name", "maintainer", "description", "image_url")
+# revisions shown on each page of /history
+REVISIONS_PER_PAGE = 4
+# discord's limit on the length of an embed field
+FIELD_LIMIT = 1024
+# characters of a changed value shown before it's cut off
+VALUE_PREVIEW_LENGTH = 80
+
+
+class Revision(NamedTuple):
+    """One modify of a facility, stored as the difference from the version before
+
+    Args:
+        id_ (int): ID, increasing with time
+        facility_id (int): Facility that was modified
+        author (int): User who modified it
+        time (int): When it was modified
+        changes (dict[str, str]): Previous values of the text fields that changed
+        item_services (int): Item services that were added or removed, XOR of both versions
+        vehicle_services (int): Vehicle services that were added or removed, XOR of both versions
+    """
+
+    id_: int
+    facility_id: int
+    author: int
+    time: int
+    changes: dict[str, str]
+    item_services: int
+    vehicle_services: int
+
+    @classmethod
+    def from_row(cls, row: Iterable[Any]) -> Revision:
+        id_, facility_id, author, time, changes, item_services, vehicle_services = row
+        return cls(
+            id_,
+            facility_id,
+            author,
+            time,
+            json.loads(changes),
+            item_services,
+            vehicle_services,
+        )
+
+
+def _value(facility: Facility, field: str) -> str:
+    # unset text fields can be None, stored and shown as empty
+    return getattr(facility, field) or ""
+
+
+def diff(before: Facility, after: Facility) -> tuple[str, int, int] | None:
+    """Compact difference between two versions of a facility
+
+    Args:
+        before (Facility): Previous version
+        after (Facility): New version
+
+    Returns:
+        tuple[str, int, int] | None: Previous text values as JSON with the XOR of each set of services, None if nothing changed
+    """
+    changes = {
+        field: _value(before, field)
+        for field in TRACKED_FIELDS
+        if _value(before, field) != _value(after, field)
+    }
+    item_services = before.item_services.value ^ after.item_services.value
+    vehicle_services = before.vehicle_services.value ^ after.vehicle_services.value
+    if not changes and not item_services and not vehicle_services:
+        return None
+    return json.dumps(changes, separators=(",", ":")), item_services, vehicle_services
+
+
+def undo(facility: Facility, revision: Revision) -> Facility:
+    """Rebuilds the version of a facility before a revision
+
+    Args:
+        facility (Facility): Version the revision produced
+        revision (Revision): Revision to undo
+
+    Returns:
+        Facility: New facility with the revision undone
+    """
+    previous = copy(facility)
+    for field, value in revision.changes.items():
+        setattr(previous, field, value)
+    previous.item_services = ItemServiceFlags._from_value(
+        facility.item_services.value ^ revision.item_services
+    )
+    previous.vehicle_services = VehicleServiceFlags._from_value(
+        facility.vehicle_services.value ^ revision.vehicle_services
+    )
+    return previous
+
+
+def versions(
+    facility: Facility, revisions: list[Revision]
+) -> list[tuple[Facility, Facility]]:
+    """Pairs each revision with the versions before and after it
+
+    Args:
+        facility (Facility): Current facility
+        revisions (list[Revision]): Every revision of the facility newer than the oldest wanted, newest first
+
+    Returns:
+        list[tuple[Facility, Facility]]: Before and after of each revision, newest first
+    """
+    pairs = []
+    after = facility
+    for revision in revisions:
+        before = undo(after, revision)
+        pairs.append((before, after))
+        after = before
+    return pairs
+
+
+def _preview(value: str | None) -> str:
+    value = " ".join((value or "").split()) or "(empty)"
+    if len(value) > VALUE_PREVIEW_LENGTH:
+        value = value[: VALUE_PREVIEW_LENGTH - 1] + "…"
+    return value.replace("`", "'")
+
+
+def _service_changes(flags: FacilityFlags, mask: int) -> list[str]:
+    added = []
+    removed = []
+    for name, descriptor in flags.MAPPED_FLAGS.items():
+        if mask & descriptor.flag_value:
+            changed = added if getattr(flags, name) else removed
+            changed.append(descriptor.display_name)
+    return [
+        f"{sign} {', '.join(names)}"
+        for sign, names in (("+", added), ("-", removed))
+        if names
+    ]
+
+
+def describe(revision: Revision, after: Facility) -> str:
+    """Readable changes made by a revision
+
+    Args:
+        revision (Revision): Revision to describe
+        after (Facility): Version the revision produced
+
+    Returns:
+        str: A line per changed field, then added and removed services
+    """
+    lines = [
+        f"> {field.replace('_', ' ').capitalize()} : `{_preview(revision.changes[field])}` → `{_preview(getattr(after, field))}`"
+        for field in TRACKED_FIELDS
+        if field in revision.changes
+    ]
+    services = _service_changes(
+        after.item_services, revision.item_services
+    ) + _service_changes(after.vehicle_services, revision.vehicle_services)
+    if services:
+        lines.append("```diff\n" + "\n".join(services) + "\n```")
+    return "\n".join(lines)
+
+
+def history_pages(
+    facility: Facility, revisions: list[Revision], total: int
+) -> list[list[Embed]]:
+    """Embeds of a facility's revisions for a paginator
+
+    Args:
+        facility (Facility): Current facility
+        revisions (list[Revision]): Revisions to show, newest first
+        total (int): Revisions the facility has, used to number them
+
+    Returns:
+        list[list[Embed]]: Pages of one embed each
+    """
+    pages = []
+    pairs = versions(facility, revisions)
+    for start in range(0, len(pairs), REVISIONS_PER_PAGE):
+        embed = Embed(title=f"History of {facility.name}", colour=Colour.blue())
+        for offset, (_, after) in enumerate(pairs[start : start + REVISIONS_PER_PAGE]):
+            index = start + offset
+            revision = revisions[index]
+            value = f"<t:{revision.time}:R> by <@{revision.author}>\n"
+            value += describe(revision, after)
+            if len(value) > FIELD_LIMIT:
+                value = value[: FIELD_LIMIT - 4] + "\n..."
+            embed.add_field(name=f"Version {total - index}", value=value, inline=False)
+        embed.set_footer(
+            text=f"ID {facility.id_}, version 0 is the facility as created"
+        )
+        pages.append([embed])
+    return pages
@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+import re
+from typing import Any, Iterator
+
+from .facility import Facility
+from .flags import ItemServiceFlags, VehicleServiceFlags
+from .query import QuerySyntaxError, service_masks
+from .regions import REGIONS
+
+# largest attachment read by an import
+MAX_IMPORT_BYTES = 2_000_000
+# most rows one import can create
+MAX_IMPORT_ROWS = 5000
+# rows inserted per transaction
+IMPORT_CHUNK_SIZE = 250
+
+SERVICE_SEPARATOR = re.compile(r"[,;|\n]")
+
+# other spellings of column names, after lowercasing and replacing spaces with _
+COLUMN_ALIASES = {
+    "facility_name": "name",
+    "facility": "name",
+    "location": "marker",
+    "coords": "coordinates",
+    "image": "image_url",
+    "items": "item_services",
+    "vehicles": "vehicle_services",
+}
+SERVICE_COLUMNS = ("services", "item_services", "vehicle_services")
+# (column, max length) of text columns, matching the limits of the edit modal
+TEXT_COLUMNS = (
+    ("name", 100),
+    ("maintainer", 200),
+    ("description", 1024),
+    ("image_url", 300),
+)
+
+_REGION_NAMES = {region.lower(): region for region in REGIONS}
+_MARKER_NAMES = {
+    region: {marker.lower(): marker for marker in markers}
+    for region, markers in REGIONS.items()
+}
+
+
+class ImportRowError(ValueError):
+    pass
+
+
+def _column(name: str) -> str:
+    column = "_".join(name.strip().lower().replace("-", " ").split())
+    return COLUMN_ALIASES.get(column, column)
+
+
+def _csv_records(text: io.TextIOBase) -> Iterator[tuple[int, dict[str, Any]]]:
+    reader = csv.reader(text)
+    try:
+        header = next(reader, None)
+        if header is None:
+            return
+        columns = [_column(name) for name in header]
+        for row in reader:
+            if not any(cell.strip() for cell in row):
+                continue
+            yield reader.line_num, dict(zip(columns, row))
+    except csv.Error as exc:
+        raise ImportRowError(f"Line {reader.line_num}: {exc}") from exc
+
+
+def _json_records(text: str) -> Iterator[tuple[int, dict[str, Any]]]:
+    """Decodes the objects of an array or JSON Lines one at a time"""
+    decoder = json.JSONDecoder()
+    position = 0
+    length = len(text)
+    in_array = False
+    while True:
+        while position < length and text[position] in " \t\r\n,":
+            position += 1
+        if position >= length:
+            return
+        if text[position] == "[" and not in_array:
+            in_array = True
+            position += 1
+            continue
+        if text[position] == "]" and in_array:
+            return
+
+        line = text.count("\n", 0, position) + 1
+        try:
+            record, position = decoder.raw_decode(text, position)
+        except json.JSONDecodeError as exc:
+            raise ImportRowError(f"Line {exc.lineno}: {exc.msg}") from exc
+        if not isinstance(record, dict):
+            raise ImportRowError(f"Line {line}: Expected an object per facility")
+        yield line, {_column(key): value for key, value in record.items()}
+
+
+def iter_records(data: bytes, filename: str) -> Iterator[tuple[int, dict[str, Any]]]:
+    """Parses the rows of a CSV, JSON array or JSON Lines file as they're read
+
+    Args:
+        data (bytes): File contents
+        filename (str): Name of the file, its extension picks the format
+
+    Raises:
+        ImportRowError: The file can't be read
+
+    Returns:
+        Iterator[tuple[int, dict[str, Any]]]: Line number and columns of each row
+    """
+    try:
+        text = data.decode("utf-8-sig")
+    except UnicodeDecodeError as exc:
+        raise ImportRowError("File must be UTF-8 text") from exc
+
+    extension = filename.rpartition(".")[2].lower()
+    if extension in ("json", "jsonl", "ndjson") or (
+        extension != "csv" and text.lstrip()[:1] in ("[", "{")
+    ):
+        return _json_records(text)
+    return _csv_records(io.StringIO(text, newline=""))
+
+
+def _text(record: dict[str, Any], column: str) -> str:
+    value = record.get(column)
+    if value is None:
+        return ""
+    return str(value).strip()
+
+
+def _service_names(value: Any) -> list[str]:
+    if isinstance(value, list):
+        return [str(name).strip() for name in value if str(name).strip()]
+    return [
+        name.strip() for name in SERVICE_SEPARATOR.split(str(value)) if name.strip()
+    ]
+
+
+def build_facility(
+    record: dict[str, Any], *, author: int, guild_id: int, creation_time: int
+) -> Facility:
+    """Validates a row and creates the facility it describes
+
+    Args:
+        record (dict[str, Any]): Columns of the row
+        author (int): ID of the user importing
+        guild_id (int): Guild the facility is imported into
+        creation_time (int): Creation time to give the facility
+
+    Raises:
+        ImportRowError: The row is invalid
+
+    Returns:
+        Facility: Facility without an ID
+    """
+    values = {}
+    for column, max_length in TEXT_COLUMNS:
+        values[column] = _text(record, column)
+        if len(values[column]) > max_length:
+            raise ImportRowError(f"{column} is longer than {max_length} characters")
+    for column in ("name", "maintainer"):
+        if not values[column]:
+            raise ImportRowError(f"Missing {column}")
+
+    region = _REGION_NAMES.get(_text(record, "region").lower())
+    if region is None:
+        raise ImportRowError(f"Unknown region `{_text(record, 'region')}`")
+    marker = _MARKER_NAMES[region].get(_text(record, "marker").lower())
+    if marker is None:
+        raise ImportRowError(f"Unknown marker `{_text(record, 'marker')}` in {region}")
+
+    names = []
+    for column in SERVICE_COLUMNS:
+        if record.get(column):
+            names.extend(_service_names(record[column]))
+    try:
+        item_services, vehicle_services = service_masks(names)
+    except QuerySyntaxError as exc:
+        raise ImportRowError(str(exc)) from exc
+
+    return Facility(
+        name=values["name"],
+        description=values["description"],
+        region=region,
+        coordinates=_text(record, "coordinates").upper(),
+        marker=marker,
+        maintainer=values["maintainer"],
+        author=author,
+        item_services=ItemServiceFlags._from_value(item_services),
+        vehicle_services=VehicleServiceFlags._from_value(vehicle_services),
+        creation_time=creation_time,
+        guild_id=guild_id,
+        image_url=values["image_url"],
+    )
@@ -1,10 +1,12 @@
 from __future__ import annotations
 
+import asyncio
 import logging
-from typing import TYPE_CHECKING
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any
 
 from discord.ui import View, Item, Modal
-from discord.errors import NotFound
+from discord.errors import NotFound, HTTPException
 from discord.ext import commands
 
 
@@ -16,6 +18,11 @@ if TYPE_CHECKING:
 
 view_error_logger = logging.getLogger("view_error")
 modal_error_logger = logging.getLogger("modal_error")
+logger = logging.getLogger(__name__)
+
+# live views kept before the oldest are disabled
+MAX_LIVE_VIEWS = 1000
+MAX_LIVE_VIEWS_PER_USER = 5
 
 
 class BaseView(View):
@@ -96,12 +103,111 @@ class ErrorLoggedModal(Modal):
         )
 
 
+class ViewRegistry:
+    """Tracks live views, disabling the oldest once the global or per user cap is reached
+
+    Args:
+        max_views (int): Live views allowed in total
+        max_per_user (int): Live views allowed for a single user
+    """
+
+    def __init__(
+        self,
+        max_views: int = MAX_LIVE_VIEWS,
+        max_per_user: int = MAX_LIVE_VIEWS_PER_USER,
+    ) -> None:
+        self.max_views: int = max_views
+        self.max_per_user: int = max_per_user
+        self._views: OrderedDict[BaseView, int] = OrderedDict()
+        self._user_views: dict[int, OrderedDict[BaseView, None]] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self.registered: int = 0
+        self.evicted: int = 0
+        self.evicted_per_user: int = 0
+        self.peak: int = 0
+
+    def __len__(self) -> int:
+        return len(self._views)
+
+    def register(self, view: BaseView, user_id: int) -> None:
+        """Adds a view, evicting the oldest views over the caps
+
+        Args:
+            view (BaseView): View to track
+            user_id (int): User the view belongs to
+        """
+        self._prune()
+        self._views[view] = user_id
+        user_views = self._user_views.setdefault(user_id, OrderedDict())
+        user_views[view] = None
+        self.registered += 1
+
+        while len(user_views) > self.max_per_user:
+            self._evict(next(iter(user_views)))
+            self.evicted_per_user += 1
+        while len(self._views) > self.max_views:
+            self._evict(next(iter(self._views)))
+
+        self.peak = max(self.peak, len(self._views))
+
+    def unregister(self, view: BaseView) -> None:
+        user_id = self._views.pop(view, None)
+        if user_id is None:
+            return
+        user_views = self._user_views.get(user_id)
+        if user_views is not None:
+            user_views.pop(view, None)
+            if not user_views:
+                del self._user_views[user_id]
+
+    def _prune(self) -> None:
+        # views that timed out without stopping
+        for view in [view for view in self._views if view.is_finished()]:
+            self.unregister(view)
+
+    def _evict(self, view: BaseView) -> None:
+        self.unregister(view)
+        self.evicted += 1
+        logger.debug("Evicting view %r", view)
+        task = asyncio.create_task(self._disable(view))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    @staticmethod
+    async def _disable(view: BaseView) -> None:
+        try:
+            await view._finish_view()
+        except HTTPException:
+            # interaction tokens expire, the view is stopped either way
+            view.stop()
+
+    def stats(self) -> dict[str, Any]:
+        self._prune()
+        return {
+            "live": len(self._views),
+            "users": len(self._user_views),
+            "peak": self.peak,
+            "registered": self.registered,
+            "evicted": self.evicted,
+            "evicted_per_user": self.evicted_per_user,
+            "max_views": self.max_views,
+            "max_per_user": self.max_per_user,
+        }
+
+
 class InteractionCheckedView(BaseView):
-    """View to check interaction"""
+    """View to check interaction, live views are capped by `registry`"""
+
+    registry = ViewRegistry()
 
     def __init__(self, *, timeout: float = 180, original_author: User | Member) -> None:
         super().__init__(timeout=timeout)
         self.original_author = original_author
+        self.registry.register(self, original_author.id)
+
+    def stop(self) -> None:
+        super().stop()
+        self.registry.unregister(self)
 
     async def interaction_check(self, interaction: Interaction, /) -> bool:
         """Only allow bot owner and author to control the menu
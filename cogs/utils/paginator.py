@@ -1,3 +1,8 @@
+from __future__ import annotations
+
+import zlib
+from typing import TYPE_CHECKING, Iterable
+
 from discord import (
     ui,
     Interaction,
@@ -9,6 +14,51 @@ from discord import (
 )
 
 from .mixins import InteractionCheckedView
+from .embeds import FeedbackEmbed, FeedbackType
+from .flags import ItemServiceFlags, VehicleServiceFlags
+from .regions import REGIONS, MARKER_REGIONS
+
+
+if TYPE_CHECKING:
+    from .context import GuildInteraction
+    from .facility import Facility
+
+
+# discord's limit on custom ID length
+MAX_CUSTOM_ID_LENGTH = 100
+# regions away from the marker searched when ranking by distance without a region
+NEAR_HOPS = 1
+
+
+def _key(name: str) -> str:
+    """Key of a name in custom IDs, the same whatever order names are listed in"""
+    if not name:
+        return ""
+    return f"{zlib.crc32(name.encode()) & 0xFFFFFF:x}"
+
+
+def _stable_keys(names: Iterable[str]) -> dict[str, str]:
+    """Looks up names from their keys
+
+    Args:
+        names (Iterable[str]): Names to key
+
+    Raises:
+        ValueError: Two names share a key
+
+    Returns:
+        dict[str, str]: Key to name
+    """
+    names = list(names)
+    keys = {_key(name): name for name in names}
+    if len(keys) != len(names):
+        raise ValueError("Names share a custom ID key")
+    return keys
+
+
+_REGION_KEYS = _stable_keys(REGIONS)
+_VEHICLE_KEYS = _stable_keys(name for name, _ in VehicleServiceFlags.all_vehicles())
+_MARKER_KEYS = _stable_keys(MARKER_REGIONS)
 
 
 class Paginator(InteractionCheckedView):
@@ -63,6 +113,7 @@ class Paginator(InteractionCheckedView):
             embeds=page, view=self, ephemeral=ephemeral
         )
         self.original_message = await interaction.original_response()
+        self.message = self.original_message
 
     def _update_labels(self, page_number: int) -> None:
         max_pages = self.total_page_count
@@ -123,3 +174,278 @@ class Paginator(InteractionCheckedView):
     async def go_to_last_page(self, interaction: Interaction, _: ui.Button):
         """go to the last page"""
         await self.show_page(interaction, self.total_page_count - 1)
+
+
+class FacilityPages:
+    """Facilities shown one per page, encoded small enough to fit in a custom ID
+
+    Args:
+        ids (tuple[int], optional): Facility ID's to show, used instead of the search
+        region (str, optional): Region to search in
+        item_service (int, optional): Item service flags to search for
+        vehicle_service (int, optional): Vehicle service flags to search for
+        creator_id (int, optional): Facility author to search for
+        vehicle (str, optional): Vehicle to highlight
+        near (str, optional): Marker to order results by distance from
+    """
+
+    def __init__(
+        self,
+        *,
+        ids: tuple[int, ...] = (),
+        region: str = "",
+        item_service: int = 0,
+        vehicle_service: int = 0,
+        creator_id: int = 0,
+        vehicle: str = "",
+        near: str = "",
+    ) -> None:
+        self.ids: tuple[int, ...] = ids
+        self.region: str = region
+        self.item_service: int = item_service
+        self.vehicle_service: int = vehicle_service
+        self.creator_id: int = creator_id
+        self.vehicle: str = vehicle
+        self.near: str = near
+
+    def encode(self) -> str:
+        if self.ids:
+            return "v" + ",".join(str(facility_id) for facility_id in self.ids)
+
+        values = (
+            _key(self.region),
+            self.item_service,
+            self.vehicle_service,
+            self.creator_id,
+            _key(self.vehicle),
+            _key(self.near),
+        )
+        return "s" + ".".join(str(value) if value else "" for value in values)
+
+    @classmethod
+    def decode(cls, state: str) -> FacilityPages:
+        kind, data = state[0], state[1:]
+        if kind == "v":
+            ids = tuple(
+                int(facility_id) for facility_id in data.split(",") if facility_id
+            )
+            return cls(ids=ids)
+        if kind != "s":
+            raise ValueError(f"Unknown page state `{state}`")
+
+        values = data.split(".")
+        region, item_service, vehicle_service, creator_id, vehicle, near = values
+        # names that no longer exist are dropped from the search
+        return cls(
+            region=_REGION_KEYS.get(region, ""),
+            item_service=int(item_service or 0),
+            vehicle_service=int(vehicle_service or 0),
+            creator_id=int(creator_id or 0),
+            vehicle=_VEHICLE_KEYS.get(vehicle, ""),
+            near=_MARKER_KEYS.get(near, ""),
+        )
+
+    def conditions(self, guild_id: int) -> dict[str, str | int]:
+        """Search conditions for get_facilities, ignoring ids and ordering
+
+        Args:
+            guild_id (int): Guild to search in
+
+        Returns:
+            dict[str, str | int]: Conditions with their parameters
+        """
+        return {
+            name: value
+            for name, value in (
+                (" region == ? ", self.region),
+                (" item_services & ? ", self.item_service),
+                (" vehicle_services & ? ", self.vehicle_service),
+                (" author == ? ", self.creator_id),
+                (" guild_id == ? ", guild_id),
+            )
+            if value
+        }
+
+    async def fetch(self, interaction: GuildInteraction) -> list[Facility]:
+        """Runs the lookup or search for the interaction's guild
+
+        Args:
+            interaction (GuildInteraction): Interaction to scope the results to
+
+        Returns:
+            list[Facility]: Facilities, one for each page
+        """
+        db = interaction.client.db
+        if self.ids:
+            facilities = await db.get_facility_ids(self.ids)
+            return [
+                facility
+                for facility in facilities
+                if facility.guild_id == interaction.guild_id
+            ]
+
+        facilities = await db.get_facilities(self.conditions(interaction.guild_id))
+        if self.near:
+            hops = None if self.region else NEAR_HOPS
+            return interaction.client.gazetteer.rank(
+                interaction.guild_id, self.near, facilities, hops=hops
+            )
+        return facilities
+
+    def embeds(self, facility: Facility) -> list[Embed]:
+        return facility.embeds(
+            ItemServiceFlags(self.item_service),
+            VehicleServiceFlags(self.vehicle_service),
+            self.vehicle,
+        )
+
+
+class PageButton(
+    ui.DynamicItem[ui.Button],
+    template=r"page:(?P<action>[fbcnl]):(?P<page>\d+):(?P<author>\d+):(?P<state>[sv][\da-f.,]*)",
+):
+    """Paginator button that keeps its state in the custom ID, so it works across restarts
+
+    Args:
+        action (str): First, back, current, next or last as a single letter
+        page (int): Page to show when pressed
+        author_id (int): User allowed to press it
+        pages (FacilityPages): Facilities being paged
+    """
+
+    STYLES = {
+        "f": ("≪", ButtonStyle.grey),
+        "b": ("Back", ButtonStyle.blurple),
+        "c": ("Current", ButtonStyle.grey),
+        "n": ("Next", ButtonStyle.blurple),
+        "l": ("≫", ButtonStyle.grey),
+    }
+
+    def __init__(
+        self,
+        action: str,
+        page: int,
+        author_id: int,
+        pages: FacilityPages,
+        *,
+        label: str | None = None,
+        disabled: bool = False,
+    ) -> None:
+        default_label, style = self.STYLES[action]
+        super().__init__(
+            ui.Button(
+                label=label or default_label,
+                style=style,
+                disabled=disabled,
+                custom_id=self.custom_id_for(action, page, author_id, pages),
+            )
+        )
+        self.page: int = page
+        self.author_id: int = author_id
+        self.pages: FacilityPages = pages
+
+    @staticmethod
+    def custom_id_for(
+        action: str, page: int, author_id: int, pages: FacilityPages
+    ) -> str:
+        return f"page:{action}:{page}:{author_id}:{pages.encode()}"
+
+    @classmethod
+    async def from_custom_id(cls, _: Interaction, item: ui.Button, match) -> PageButton:
+        return cls(
+            match["action"],
+            int(match["page"]),
+            int(match["author"]),
+            FacilityPages.decode(match["state"]),
+            label=item.label,
+            disabled=item.disabled,
+        )
+
+    async def interaction_check(self, interaction: Interaction, /) -> bool:
+        """Only allow bot owner and author to control the menu"""
+        if interaction.user.id in (interaction.client.owner_id, self.author_id):
+            return True
+        await interaction.response.send_message(
+            ":x: This menu cannot be controlled by you!",
+            ephemeral=True,
+        )
+        return False
+
+    async def callback(self, interaction: GuildInteraction) -> None:
+        facilities = await self.pages.fetch(interaction)
+        if not facilities:
+            embed = FeedbackEmbed("No facilities found", FeedbackType.WARNING)
+            return await interaction.response.edit_message(embeds=[embed], view=None)
+
+        page = min(self.page, len(facilities) - 1)
+        view = page_view(self.pages, self.author_id, page, len(facilities))
+        await interaction.response.edit_message(
+            embeds=self.pages.embeds(facilities[page]), view=view
+        )
+
+
+def page_view(pages: FacilityPages, author_id: int, page: int, total: int) -> ui.View:
+    """Creates the navigation buttons for a page
+
+    Args:
+        pages (FacilityPages): Facilities being paged
+        author_id (int): User allowed to use the buttons
+        page (int): Page being shown
+        total (int): Total pages
+
+    Returns:
+        ui.View: View made up of dynamic items only
+    """
+    last_page = total - 1
+    view = ui.View(timeout=None)
+    for action, target, disabled, label in (
+        ("f", 0, page == 0, None),
+        ("b", max(page - 1, 0), page == 0, None),
+        ("c", page, True, f"{page + 1}/{total}"),
+        ("n", min(page + 1, last_page), page >= last_page, None),
+        ("l", last_page, page >= last_page, None),
+    ):
+        view.add_item(
+            PageButton(action, target, author_id, pages, label=label, disabled=disabled)
+        )
+
+    # registered dynamic items handle every press, a stopped view isn't kept by the view store
+    view.stop()
+    return view
+
+
+async def send_facility_pages(
+    interaction: GuildInteraction,
+    pages: FacilityPages,
+    facilities: list[Facility],
+    ephemeral: bool = False,
+    one_time_message: Embed | None = None,
+) -> None:
+    """Sends facilities one per page, falling back to an in memory paginator when the state is too long
+
+    Args:
+        interaction (GuildInteraction): Interaction to respond to
+        pages (FacilityPages): Lookup or search that found the facilities
+        facilities (list[Facility]): Facilities to page through
+        ephemeral (bool): Show results to only the user. Defaults to False
+        one_time_message (Embed, optional): Embed only shown on the first page
+    """
+    author_id = interaction.user.id
+    custom_id = PageButton.custom_id_for("f", len(facilities), author_id, pages)
+    if len(custom_id) > MAX_CUSTOM_ID_LENGTH:
+        embeds = [pages.embeds(facility) for facility in facilities]
+        return await Paginator(original_author=interaction.user).start(
+            interaction,
+            pages=embeds,
+            ephemeral=ephemeral,
+            one_time_message=one_time_message,
+        )
+
+    embeds = pages.embeds(facilities[0])
+    if one_time_message:
+        embeds.append(one_time_message)
+
+    view = page_view(pages, author_id, 0, len(facilities))
+    await interaction.response.send_message(
+        embeds=embeds, view=view, ephemeral=ephemeral
+    )
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import re
+from collections import Counter
+from functools import lru_cache
+from typing import NamedTuple
+
+from .cost import Building, Cost, building_data, building_matcher, raw_materials
+
+# most of one building a plan can ask for
+MAX_PLAN_COUNT = 1000
+# compiled plans kept for reuse
+PLAN_CACHE_SIZE = 128
+
+ITEM_SEPARATOR = re.compile(r"[,;\n]")
+UPGRADE_SEPARATOR = re.compile(r"\s*(?:&|\+|\band\b)\s*", flags=re.IGNORECASE)
+WITH_SEPARATOR = re.compile(r"\s+with\s+", flags=re.IGNORECASE)
+# 2 Forge, 2x Forge, x2 Forge or Forge x2
+COUNT_PATTERN = re.compile(
+    r"^(?:(\d+)\s*x?\s+|x(\d+)\s+)?(.+?)(?:\s+x(\d+))?$", flags=re.IGNORECASE
+)
+
+
+class PlanSyntaxError(ValueError):
+    pass
+
+
+class PlanItem(NamedTuple):
+    count: int
+    building: Building
+    upgrades: tuple[Building, ...]
+
+    def buildings(self) -> set[Building]:
+        """Buildings making up one of this item, parents shared by upgrades are counted once"""
+        buildings = {self.building, *self.building.ancestors}
+        for upgrade in self.upgrades:
+            buildings.add(upgrade)
+            buildings.update(upgrade.ancestors)
+        return buildings
+
+    def __str__(self) -> str:
+        text = f"{self.count}x {self.building.name}"
+        if self.upgrades:
+            text += " with " + " and ".join(upgrade.name for upgrade in self.upgrades)
+        return text
+
+
+class BuildPlan(NamedTuple):
+    """Bill of materials of a build plan
+
+    Args:
+        items (tuple[PlanItem, ...]): Parsed items of the plan
+        bill (tuple[tuple[Building, int], ...]): How many of each building is built
+        total (Cost): Total cost
+        raw (Cost): Total cost in raw materials
+    """
+
+    items: tuple[PlanItem, ...]
+    bill: tuple[tuple[Building, int], ...]
+    total: Cost
+    raw: Cost
+
+
+def _parse_item(text: str) -> PlanItem:
+    match = COUNT_PATTERN.match(text.strip())
+    if match is None:
+        raise PlanSyntaxError(f"Can't read `{text.strip()}`")
+    leading, prefixed, names, trailing = match.groups()
+    count = int(leading or prefixed or trailing or 1)
+    if not 0 < count <= MAX_PLAN_COUNT:
+        raise PlanSyntaxError(f"Counts must be between 1 and {MAX_PLAN_COUNT}")
+
+    base_name, *rest = WITH_SEPARATOR.split(names, maxsplit=1)
+    building = building_matcher.match(base_name)
+    if building is None:
+        raise PlanSyntaxError(f"Unknown building `{base_name}`")
+
+    upgrades = []
+    for upgrade_name in UPGRADE_SEPARATOR.split(rest[0]) if rest else ():
+        upgrade = building_matcher.match(upgrade_name)
+        if upgrade is None:
+            raise PlanSyntaxError(f"Unknown building `{upgrade_name}`")
+        if building not in upgrade.ancestors:
+            raise PlanSyntaxError(f"{upgrade.name} isn't an upgrade of {building.name}")
+        upgrades.append(upgrade)
+    return PlanItem(count, building, tuple(upgrades))
+
+
+def normalise_plan(text: str) -> str:
+    lines = (" ".join(line.split()) for line in text.lower().splitlines())
+    return ", ".join(line for line in lines if line)
+
+
+@lru_cache(maxsize=PLAN_CACHE_SIZE)
+def _compile(text: str) -> BuildPlan:
+    items = tuple(
+        _parse_item(part) for part in ITEM_SEPARATOR.split(text) if part.strip()
+    )
+    if not items:
+        raise PlanSyntaxError("Empty plan")
+
+    counts: Counter[Building] = Counter()
+    for item in items:
+        for building in item.buildings():
+            counts[building] += item.count
+
+    # keep catalogue order so parents come before their upgrades
+    bill = tuple(
+        (building, counts[building])
+        for building in building_data.values()
+        if building in counts
+    )
+    total = Cost.sum(building.cost * count for building, count in bill)
+    return BuildPlan(items, bill, total, raw_materials(total))
+
+
+def compile_plan(text: str) -> BuildPlan:
+    """Parses a plan like `2 Materials Factory with Forge and Smelter, 1 Oil Refinery`
+
+    Items are separated by commas, upgrades by `and`, `&` or `+`. An upgrade on
+    its own includes the buildings it's upgraded from.
+
+    Args:
+        text (str): Plan to compile
+
+    Raises:
+        PlanSyntaxError: The plan is invalid
+
+    Returns:
+        BuildPlan: Compiled plan, shared between identical plans
+    """
+    return _compile(normalise_plan(text))
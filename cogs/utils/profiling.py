@@ -0,0 +1,293 @@
+from __future__ import annotations
+
+import io
+import sys
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from enum import Enum
+from collections import Counter, deque
+from traceback import extract_stack
+
+
+class ProfileMode(Enum):
+    CPROFILE = "cprofile"
+    SAMPLING = "sampling"
+
+
+class SamplingProfiler:
+    """Samples the stack of a thread at a fixed interval from a background thread
+
+    Args:
+        thread_id (int): Thread to sample, defaults to the calling thread
+        interval (float): Seconds between samples
+    """
+
+    def __init__(self, thread_id: int | None = None, interval: float = 0.005) -> None:
+        self.thread_id: int = thread_id or threading.get_ident()
+        self.interval: float = interval
+        self.samples: Counter[tuple[str, ...]] = Counter()
+        self.sample_count: int = 0
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = tuple(
+                f"{summary.filename}:{summary.lineno}({summary.name})"
+                for summary in extract_stack(frame)
+            )
+            self.samples[stack] += 1
+            self.sample_count += 1
+
+    def enable(self) -> None:
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="sampling-profiler", daemon=True
+        )
+        self._thread.start()
+
+    def disable(self) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def report(self, limit: int = 30) -> str:
+        """Generates a report of the functions most often seen on the stack
+
+        Args:
+            limit (int): Amount of functions to include
+
+        Returns:
+            str: Formatted report
+        """
+        own: Counter[str] = Counter()
+        cumulative: Counter[str] = Counter()
+        for stack, count in self.samples.items():
+            own[stack[-1]] += count
+            for entry in set(stack):
+                cumulative[entry] += count
+
+        total = self.sample_count or 1
+        lines = [
+            f"{self.sample_count} samples every {self.interval * 1000:.1f}ms",
+            "",
+            "Own time:",
+        ]
+        for entry, count in own.most_common(limit):
+            lines.append(f"{count / total:>7.2%} {count:>7} {entry}")
+        lines.extend(("", "Cumulative time:"))
+        for entry, count in cumulative.most_common(limit):
+            lines.append(f"{count / total:>7.2%} {count:>7} {entry}")
+        return "\n".join(lines)
+
+
+class ProfileSession:
+    """Single profiling run using either cProfile or the sampling profiler
+
+    Args:
+        mode (ProfileMode): Profiler to use
+        command_name (str, optional): Command to profile invocations of
+        invocations (int): Amount of command invocations to profile
+    """
+
+    def __init__(
+        self,
+        mode: ProfileMode,
+        *,
+        command_name: str | None = None,
+        invocations: int = 0,
+    ) -> None:
+        self.mode: ProfileMode = mode
+        self.command_name: str | None = command_name
+        self.remaining: int = invocations
+        self.running: bool = False
+        self.started_at: float | None = None
+        self.elapsed: float = 0.0
+        self._active_invocations: int = 0
+
+        if mode is ProfileMode.CPROFILE:
+            self.profiler: cProfile.Profile | SamplingProfiler = cProfile.Profile()
+        else:
+            self.profiler = SamplingProfiler()
+
+    def enable(self) -> None:
+        if self.running:
+            return
+        self.profiler.enable()
+        self.running = True
+        self.started_at = time.perf_counter()
+
+    def disable(self) -> None:
+        if not self.running:
+            return
+        self.profiler.disable()
+        self.running = False
+        self.elapsed += time.perf_counter() - self.started_at
+
+    def invocation_started(self) -> None:
+        self._active_invocations += 1
+        self.enable()
+
+    def invocation_finished(self) -> bool:
+        """Marks a profiled invocation as finished
+
+        Returns:
+            bool: Whether all requested invocations have been profiled
+        """
+        self._active_invocations = max(self._active_invocations - 1, 0)
+        self.remaining -= 1
+        if not self._active_invocations:
+            self.disable()
+        return self.remaining <= 0
+
+    def report(self, limit: int = 30) -> str:
+        """Generates a report of the run
+
+        Args:
+            limit (int): Amount of entries to include
+
+        Returns:
+            str: Formatted report
+        """
+        header = f"Profiled for {self.elapsed:.3f}s using {self.mode.value}"
+        if self.command_name:
+            header += f" on command {self.command_name!r}"
+
+        if isinstance(self.profiler, SamplingProfiler):
+            return f"{header}\n\n{self.profiler.report(limit)}"
+
+        stream = io.StringIO()
+        try:
+            stats = pstats.Stats(self.profiler, stream=stream)
+        except TypeError:
+            return f"{header}\n\nNo data collected"
+        stats.strip_dirs().sort_stats(pstats.SortKey.CUMULATIVE).print_stats(limit)
+        stats.sort_stats(pstats.SortKey.TIME).print_stats(limit)
+        return f"{header}\n{stream.getvalue()}"
+
+
+class MemorySnapshots:
+    """Keeps tracemalloc snapshots to compare against each other
+
+    The first snapshot is kept as a baseline, after it only the latest ones are kept
+
+    Args:
+        frames (int): Frames of traceback to store per allocation
+        max_recent (int): Snapshots to keep after the baseline
+    """
+
+    def __init__(self, frames: int = 10, max_recent: int = 10) -> None:
+        self.frames: int = frames
+        self.baseline: tuple[float, tracemalloc.Snapshot] | None = None
+        self.recent: deque[tuple[float, tracemalloc.Snapshot]] = deque(
+            maxlen=max_recent
+        )
+        self._started_tracing: bool = False
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    @property
+    def snapshots(self) -> list[tuple[float, tracemalloc.Snapshot]]:
+        """Kept snapshots, oldest first"""
+        if self.baseline is None:
+            return []
+        return [self.baseline, *self.recent]
+
+    def take(self) -> tracemalloc.Snapshot:
+        """Takes a snapshot, starting tracemalloc if needed
+
+        Returns:
+            tracemalloc.Snapshot: Snapshot that was taken
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._started_tracing = True
+
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            (
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                tracemalloc.Filter(False, "<unknown>"),
+            )
+        )
+        if self.baseline is None:
+            self.baseline = (time.time(), snapshot)
+        else:
+            self.recent.append((time.time(), snapshot))
+        return snapshot
+
+    def stop(self) -> None:
+        if self._started_tracing and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self._started_tracing = False
+        self.baseline = None
+        self.recent.clear()
+
+    def report(self, limit: int = 25, key_type: str = "lineno") -> str:
+        """Top allocations of the latest snapshot
+
+        Args:
+            limit (int): Amount of entries to include
+            key_type (str): Grouping used by tracemalloc
+
+        Returns:
+            str: Formatted report
+        """
+        if not self.snapshots:
+            return "No snapshots taken"
+
+        snapshots = self.snapshots
+        taken, snapshot = snapshots[-1]
+        stats = snapshot.statistics(key_type)
+        total = sum(stat.size for stat in stats)
+        lines = [
+            f"Snapshot {len(snapshots)} taken at {time.ctime(taken)}",
+            f"Total traced: {total / 1024:.1f} KiB",
+            "",
+        ]
+        lines.extend(str(stat) for stat in stats[:limit])
+        return "\n".join(lines)
+
+    def diff(
+        self,
+        first: int = -2,
+        second: int = -1,
+        limit: int = 25,
+        key_type: str = "lineno",
+    ) -> str:
+        """Compares two snapshots
+
+        Args:
+            first (int): Index of the older snapshot, 0 is the baseline
+            second (int): Index of the newer snapshot
+            limit (int): Amount of entries to include
+            key_type (str): Grouping used by tracemalloc
+
+        Raises:
+            IndexError: Snapshot index doesn't exist
+
+        Returns:
+            str: Formatted report
+        """
+        snapshots = self.snapshots
+        first_taken, first_snapshot = snapshots[first]
+        second_taken, second_snapshot = snapshots[second]
+
+        stats = second_snapshot.compare_to(first_snapshot, key_type)
+        size_diff = sum(stat.size_diff for stat in stats)
+        lines = [
+            f"Compared snapshots taken {second_taken - first_taken:.1f}s apart",
+            f"Total difference: {size_diff / 1024:+.1f} KiB",
+            "",
+        ]
+        lines.extend(str(stat) for stat in stats[:limit])
+        return "\n".join(lines)
@@ -0,0 +1,336 @@
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+from typing import TYPE_CHECKING, Iterable, Iterator, NamedTuple
+
+from .flags import FacilityFlags, ItemServiceFlags, VehicleServiceFlags
+from .regions import REGIONS
+
+
+if TYPE_CHECKING:
+    from .facility import Facility
+
+# terms a query may expand to, each OR of ANDs multiplies them
+MAX_TERMS = 64
+# compiled queries kept for reuse
+QUERY_CACHE_SIZE = 256
+
+TOKEN_PATTERN = re.compile(
+    r"""\s*(?:
+        (?P<operator>[&|!()])
+        |(?P<field>region):(?:"(?P<quoted>[^"]*)"|(?P<value>[^\s&|!()]+))
+        |(?P<name>[\w.]+)
+    )""",
+    flags=re.VERBOSE | re.IGNORECASE,
+)
+
+
+class QuerySyntaxError(ValueError):
+    pass
+
+
+class Term(NamedTuple):
+    """Services and region a facility must all match"""
+
+    item_all: int = 0
+    item_none: int = 0
+    vehicle_all: int = 0
+    vehicle_none: int = 0
+    region: str = ""
+    excluded_regions: frozenset[str] = frozenset()
+
+    def merge(self, other: Term) -> Term | None:
+        if self.region and other.region and self.region != other.region:
+            return None
+        term = Term(
+            self.item_all | other.item_all,
+            self.item_none | other.item_none,
+            self.vehicle_all | other.vehicle_all,
+            self.vehicle_none | other.vehicle_none,
+            self.region or other.region,
+            self.excluded_regions | other.excluded_regions,
+        )
+        if (
+            term.item_all & term.item_none
+            or term.vehicle_all & term.vehicle_none
+            or term.region in term.excluded_regions
+        ):
+            return None
+        return term
+
+    def matches(self, item_services: int, vehicle_services: int, region: str) -> bool:
+        return (
+            item_services & self.item_all == self.item_all
+            and not item_services & self.item_none
+            and vehicle_services & self.vehicle_all == self.vehicle_all
+            and not vehicle_services & self.vehicle_none
+            and (not self.region or region == self.region)
+            and region not in self.excluded_regions
+        )
+
+
+def _normalise(name: str) -> str:
+    return re.sub(r"[^a-z0-9]", "", name.lower())
+
+
+def _flag_names(flags: type[FacilityFlags]) -> dict[str, int]:
+    names = {}
+    for name, descriptor in flags.MAPPED_FLAGS.items():
+        names[_normalise(descriptor.display_name)] = descriptor.flag_value
+        names[_normalise(name)] = descriptor.flag_value
+    return names
+
+
+_ITEM_NAMES = _flag_names(ItemServiceFlags)
+_VEHICLE_NAMES = _flag_names(VehicleServiceFlags)
+
+
+def _service_term(name: str) -> Term:
+    normalised = _normalise(name)
+    if normalised in _ITEM_NAMES:
+        return Term(item_all=_ITEM_NAMES[normalised])
+    if normalised in _VEHICLE_NAMES:
+        return Term(vehicle_all=_VEHICLE_NAMES[normalised])
+
+    # unambiguous prefixes like pcons for pcons_pipes
+    items = {_ITEM_NAMES[key] for key in _ITEM_NAMES if key.startswith(normalised)}
+    vehicles = {
+        _VEHICLE_NAMES[key] for key in _VEHICLE_NAMES if key.startswith(normalised)
+    }
+    if normalised and len(items) + len(vehicles) == 1:
+        if items:
+            return Term(item_all=items.pop())
+        return Term(vehicle_all=vehicles.pop())
+    if items or vehicles:
+        raise QuerySyntaxError(f"`{name}` matches more than one service")
+    raise QuerySyntaxError(f"Unknown service `{name}`")
+
+
+def service_masks(names: Iterable[str]) -> tuple[int, int]:
+    """Resolves service names the same way queries do
+
+    Args:
+        names (Iterable[str]): Flag names, display names or unambiguous starts of one
+
+    Raises:
+        QuerySyntaxError: A name is unknown or ambiguous
+
+    Returns:
+        tuple[int, int]: Item and vehicle service flag values
+    """
+    item_services = vehicle_services = 0
+    for name in names:
+        term = _service_term(name)
+        item_services |= term.item_all
+        vehicle_services |= term.vehicle_all
+    return item_services, vehicle_services
+
+
+def _region_term(value: str) -> Term:
+    lowered = value.lower()
+    for region in REGIONS:
+        if region.lower() == lowered:
+            return Term(region=region)
+    matches = [region for region in REGIONS if lowered in region.lower()]
+    if len(matches) == 1:
+        return Term(region=matches[0])
+    raise QuerySyntaxError(f"Unknown region `{value}`")
+
+
+def _tokenize(text: str) -> Iterator[tuple[str, Term | None, str]]:
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = TOKEN_PATTERN.match(text, position)
+        if match is None or match.end() == position:
+            raise QuerySyntaxError(f"Unexpected `{text[position:].strip()[:20]}`")
+        position = match.end()
+        raw = match.group().strip()
+        if match["operator"]:
+            yield match["operator"], None, raw
+        elif match["field"]:
+            value = match["quoted"] if match["quoted"] is not None else match["value"]
+            yield "atom", _region_term(value), raw
+        else:
+            yield "atom", _service_term(match["name"]), raw
+
+
+# parsed expressions are nested tuples, ("atom", Term), ("!", node),
+# ("&", left, right) and ("|", left, right)
+class _Parser:
+    def __init__(self, text: str) -> None:
+        self.tokens: list[tuple[str, Term | None, str]] = list(_tokenize(text))
+        self.index: int = 0
+
+    def peek(self) -> str | None:
+        if self.index < len(self.tokens):
+            return self.tokens[self.index][0]
+        return None
+
+    def take(self) -> tuple[str, Term | None, str]:
+        token = self.tokens[self.index]
+        self.index += 1
+        return token
+
+    def parse(self) -> tuple:
+        if not self.tokens:
+            raise QuerySyntaxError("Empty query")
+        node = self.parse_or()
+        if self.peek() is not None:
+            raise QuerySyntaxError(f"Unexpected `{self.tokens[self.index][2]}`")
+        return node
+
+    def parse_or(self) -> tuple:
+        node = self.parse_and()
+        while self.peek() == "|":
+            self.take()
+            node = ("|", node, self.parse_and())
+        return node
+
+    def parse_and(self) -> tuple:
+        node = self.parse_not()
+        # juxtaposed terms are ANDed, scons mm120 is scons & mm120
+        while self.peek() in ("&", "!", "(", "atom"):
+            if self.peek() == "&":
+                self.take()
+            node = ("&", node, self.parse_not())
+        return node
+
+    def parse_not(self) -> tuple:
+        if self.peek() == "!":
+            self.take()
+            return ("!", self.parse_not())
+        return self.parse_atom()
+
+    def parse_atom(self) -> tuple:
+        kind = self.peek()
+        if kind is None:
+            raise QuerySyntaxError("Query ends early")
+        if kind == "(":
+            self.take()
+            node = self.parse_or()
+            if self.peek() != ")":
+                raise QuerySyntaxError("Missing `)`")
+            self.take()
+            return node
+        if kind == "atom":
+            return ("atom", self.take()[1])
+        raise QuerySyntaxError(f"Unexpected `{kind}`")
+
+
+def _negate(term: Term) -> list[Term]:
+    """Splits a negated term into one term per condition it has"""
+    terms = [
+        Term(item_none=1 << bit)
+        for bit in range(term.item_all.bit_length())
+        if term.item_all >> bit & 1
+    ]
+    terms.extend(
+        Term(vehicle_none=1 << bit)
+        for bit in range(term.vehicle_all.bit_length())
+        if term.vehicle_all >> bit & 1
+    )
+    if term.region:
+        terms.append(Term(excluded_regions=frozenset((term.region,))))
+    return terms
+
+
+def _product(left: list[Term], right: list[Term]) -> list[Term]:
+    terms = []
+    for first in left:
+        for second in right:
+            merged = first.merge(second)
+            if merged is not None:
+                terms.append(merged)
+    if len(terms) > MAX_TERMS:
+        raise QuerySyntaxError("Query is too complex")
+    return terms
+
+
+def _to_terms(node: tuple, negated: bool = False) -> list[Term]:
+    """Expands an expression into an OR of terms, pushing negation down to the services"""
+    kind = node[0]
+    if kind == "atom":
+        return _negate(node[1]) if negated else [node[1]]
+    if kind == "!":
+        return _to_terms(node[1], not negated)
+
+    left = _to_terms(node[1], negated)
+    right = _to_terms(node[2], negated)
+    # De Morgan, a negated AND is an OR and the other way round
+    if (kind == "&") != negated:
+        return _product(left, right)
+    terms = left + right
+    if len(terms) > MAX_TERMS:
+        raise QuerySyntaxError("Query is too complex")
+    return terms
+
+
+class ServiceQuery:
+    """Query compiled to bitmask terms, a facility matches if it matches any term
+
+    Args:
+        text (str): Query it was compiled from
+        terms (list[Term]): Terms to match
+    """
+
+    def __init__(self, text: str, terms: list[Term]) -> None:
+        self.text: str = text
+        self.terms: tuple[Term, ...] = tuple(dict.fromkeys(terms))
+        # services the query asks for, used to rank results
+        self.item_services: int = 0
+        self.vehicle_services: int = 0
+        for term in self.terms:
+            self.item_services |= term.item_all
+            self.vehicle_services |= term.vehicle_all
+
+    def __repr__(self) -> str:
+        return f"<ServiceQuery text={self.text!r} terms={len(self.terms)}>"
+
+    def matches(self, facility: Facility) -> bool:
+        item_services = facility.item_services.value
+        vehicle_services = facility.vehicle_services.value
+        return any(
+            term.matches(item_services, vehicle_services, facility.region)
+            for term in self.terms
+        )
+
+    def score(self, facility: Facility) -> int:
+        """Number of requested services the facility has"""
+        return (facility.item_services.value & self.item_services).bit_count() + (
+            facility.vehicle_services.value & self.vehicle_services
+        ).bit_count()
+
+    def search(self, facilities: Iterable[Facility]) -> list[Facility]:
+        """Filters facilities in one pass, most matched services first
+
+        Args:
+            facilities (Iterable[Facility]): Facilities to search
+
+        Returns:
+            list[Facility]: Matching facilities, ties keep their order
+        """
+        matched = [facility for facility in facilities if self.matches(facility)]
+        matched.sort(key=self.score, reverse=True)
+        return matched
+
+
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+def compile_query(text: str) -> ServiceQuery:
+    """Parses and compiles a query like `scons & (mm120 | mm150) region:Origin`
+
+    Services are flag names or display names, or an unambiguous start of one.
+    `&` or a space is AND, `|` is OR and `!` is NOT.
+
+    Args:
+        text (str): Query to compile
+
+    Raises:
+        QuerySyntaxError: The query is invalid
+
+    Returns:
+        ServiceQuery: Compiled query
+    """
+    node = _Parser(text).parse()
+    return ServiceQuery(text, _to_terms(node))
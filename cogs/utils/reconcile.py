@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Iterable
+
+from discord import Embed
+
+
+if TYPE_CHECKING:
+    from discord import ForumChannel, Message, Thread
+
+    from .facility import Facility
+
+
+def thread_name(facility: Facility) -> str:
+    return f"{facility.name} - {facility.marker}, {facility.region}"
+
+
+def _embed_key(embed: Embed) -> tuple:
+    # only compare what we set, discord adds its own fields to sent embeds
+    return (
+        embed.title or None,
+        embed.description or None,
+        tuple((field.name, field.value) for field in embed.fields),
+        embed.footer.text,
+        embed.image.url,
+    )
+
+
+def embeds_match(message: Message, facility: Facility) -> bool:
+    """Checks if a thread's starter message shows the current facility"""
+    current = [_embed_key(embed) for embed in message.embeds]
+    return current == [_embed_key(embed) for embed in facility.embeds()]
+
+
+async def fetch_forum_threads(forum: ForumChannel) -> dict[int, Thread]:
+    """Fetches every active and archived thread of a forum
+
+    Args:
+        forum (ForumChannel): Forum to fetch from
+
+    Returns:
+        dict[int, Thread]: Thread ID to thread
+    """
+    threads = {
+        thread.id: thread
+        for thread in await forum.guild.active_threads()
+        if thread.parent_id == forum.id
+    }
+    async for thread in forum.archived_threads(limit=None):
+        threads[thread.id] = thread
+    return threads
+
+
+class ForumPlan:
+    """Difference between facility rows and the threads in their forum
+
+    Attributes:
+        create (list[Facility]): Facilities without a thread in the forum
+        check (list[tuple[Facility, Thread]]): Facilities and the thread they point to
+        delete (list[Thread]): Threads no facility points to
+    """
+
+    def __init__(self) -> None:
+        self.create: list[Facility] = []
+        self.check: list[tuple[Facility, Thread]] = []
+        self.delete: list[Thread] = []
+
+
+def plan_forum(
+    facilities: Iterable[Facility],
+    threads: dict[int, Thread],
+    keep: Iterable[int] = (),
+) -> ForumPlan:
+    """Works out which threads to create, check and delete
+
+    Args:
+        facilities (Iterable[Facility]): Facilities of the guild
+        threads (dict[int, Thread]): Threads currently in the forum
+        keep (Iterable[int]): Thread ID's that aren't facilities and must be left alone, such as the list index
+
+    Returns:
+        ForumPlan: Work needed to bring the forum in line with the facilities
+    """
+    plan = ForumPlan()
+    claimed = set(keep)
+    for facility in facilities:
+        thread = threads.get(facility.thread_id or 0)
+        # a thread can only belong to one facility, later duplicates get their own
+        if thread is None or thread.id in claimed:
+            plan.create.append(facility)
+            continue
+        claimed.add(thread.id)
+        plan.check.append((facility, thread))
+
+    plan.delete = [
+        thread for thread_id, thread in threads.items() if thread_id not in claimed
+    ]
+    return plan
+
+
+class ReconcileResult:
+    def __init__(self) -> None:
+        self.created: int = 0
+        self.updated: int = 0
+        self.deleted: int = 0
+        self.unchanged: int = 0
+        self.failed: int = 0
+
+    def __str__(self) -> str:
+        return (
+            f"> Created : {self.created}\n"
+            f"> Updated : {self.updated}\n"
+            f"> Deleted : {self.deleted}\n"
+            f"> Unchanged : {self.unchanged}\n"
+            f"> Failed : {self.failed}\n"
+        )
@@ -1,4 +1,15 @@
+from __future__ import annotations
+
+import math
+from collections import deque
 from itertools import chain
+from typing import TYPE_CHECKING, Iterable
+
+from .spatial import GridPosition, parse_coordinates
+
+
+if TYPE_CHECKING:
+    from .facility import Facility
 
 
 def all_markers():
@@ -898,3 +909,227 @@ REGIONS: dict[str, tuple[str, ...]] = {
         "Wolfsbait",
     ),
 }
+
+
+# approximate world map layout, regions are flat topped hexes given as
+# (column, row) where odd columns sit half a hex lower
+REGION_HEXES: dict[str, tuple[int, float]] = {
+    "Basin Sionnach": (0, -3),
+    "Reaching Trail": (0, -2),
+    "Callahans Passage": (0, -1),
+    "DeadLands": (0, 0),
+    "Umbral Wildwood": (0, 1),
+    "Great March": (0, 2),
+    "Kalokai": (0, 3),
+    "Speaking Woods": (-1, -2.5),
+    "The Moors": (-1, -1.5),
+    "The Linn of Mercy": (-1, -0.5),
+    "Loch Mór": (-1, 0.5),
+    "The Heartlands": (-1, 1.5),
+    "Red River": (-1, 2.5),
+    "Howl County": (1, -2.5),
+    "Viper Pit": (1, -1.5),
+    "Marban Hollow": (1, -0.5),
+    "The Drowned Vale": (1, 0.5),
+    "Shackled Chasm": (1, 1.5),
+    "Acrithia": (1, 2.5),
+    "Callums Cape": (-2, -2),
+    "Stonecradle": (-2, -1),
+    "Farranac Coast": (-2, 0),
+    "Westgate": (-2, 1),
+    "Ash Fields": (-2, 2),
+    "Clanshead Valley": (2, -2),
+    "Weathered Expanse": (2, -1),
+    "Endless Shore": (2, 0),
+    "Allods Bight": (2, 1),
+    "Terminus": (2, 2),
+    "Nevish Line": (-3, -1.5),
+    "King's Cage": (-3, -0.5),
+    "Sableport": (-3, 0.5),
+    "Origin": (-3, 1.5),
+    "Morgens Crossing": (3, -1.5),
+    "Godcrofts": (3, -0.5),
+    "Tempest Island": (3, 0.5),
+    "The Fingers": (3, 1.5),
+}
+# a region's map is 17 grid squares across, the width of its hex
+HEX_SIZE = 8.5
+HEX_HEIGHT = math.sqrt(3) * HEX_SIZE
+
+
+def _adjacent(first: tuple[int, float], second: tuple[int, float]) -> bool:
+    columns = abs(first[0] - second[0])
+    rows = abs(first[1] - second[1])
+    return (columns == 0 and rows == 1) or (columns == 1 and rows == 0.5)
+
+
+def _hop_distances(region: str) -> dict[str, int]:
+    distances = {region: 0}
+    queue = deque([region])
+    while queue:
+        current = queue.popleft()
+        for neighbour in REGION_ADJACENCY[current]:
+            if neighbour not in distances:
+                distances[neighbour] = distances[current] + 1
+                queue.append(neighbour)
+    return distances
+
+
+REGION_ADJACENCY: dict[str, frozenset[str]] = {
+    region: frozenset(
+        other for other, other_hex in REGION_HEXES.items() if _adjacent(hex_, other_hex)
+    )
+    for region, hex_ in REGION_HEXES.items()
+}
+HOP_DISTANCES: dict[str, dict[str, int]] = {
+    region: _hop_distances(region) for region in REGION_HEXES
+}
+# region a marker is in, markers spanning regions like rivers keep the first
+MARKER_REGIONS: dict[str, str] = {
+    marker: region
+    for region, markers in reversed(REGIONS.items())
+    for marker in markers
+}
+
+
+def regions_within(region: str, hops: int) -> set[str]:
+    """Regions at most this many borders away, including the region itself"""
+    return {
+        other
+        for other, distance in HOP_DISTANCES.get(region, {region: 0}).items()
+        if distance <= hops
+    }
+
+
+def region_centre(region: str) -> GridPosition:
+    return GridPosition(region, HEX_SIZE, HEX_HEIGHT / 2)
+
+
+def world_position(position: GridPosition) -> tuple[float, float]:
+    """Converts a position within a region to grid squares from the centre of the map
+
+    Args:
+        position (GridPosition): Position within its region
+
+    Returns:
+        tuple[float, float]: Position across the whole map
+    """
+    column, row = REGION_HEXES.get(position.region, (0, 0))
+    centre = region_centre(position.region)
+    return (
+        column * HEX_SIZE * 1.5 + position.x - centre.x,
+        row * HEX_HEIGHT + position.y - centre.y,
+    )
+
+
+class Gazetteer:
+    """Approximate marker positions, learned from the coordinates of facilities placed at each marker
+
+    Each guild learns only from its own facilities, so one guild's locations
+    don't show through another's. Markers a guild has no coordinates for fall
+    back to the centre of their region
+    """
+
+    def __init__(self) -> None:
+        # guild, region and marker to summed x, summed y and count of positions
+        self._totals: dict[tuple[int, str, str], list[float]] = {}
+
+    def load(self, rows: Iterable[tuple[int, str, str, str, int]]) -> None:
+        """Replaces what was learned with aggregated facility coordinates
+
+        Args:
+            rows (Iterable[tuple[int, str, str, str, int]]): Guild, region, marker, coordinates and how many facilities use them
+        """
+        self.clear()
+        for guild_id, region, marker, coordinates, count in rows:
+            self.learn(guild_id, region, marker, coordinates, count)
+
+    def clear(self) -> None:
+        self._totals.clear()
+
+    def learn(
+        self,
+        guild_id: int,
+        region: str,
+        marker: str,
+        coordinates: str | None,
+        count: int = 1,
+    ) -> None:
+        """Adds coordinates given for a marker, a negative count removes them"""
+        if marker not in REGIONS.get(region, ()):
+            return
+        position = parse_coordinates(region, coordinates)
+        if position is None:
+            return
+
+        key = (guild_id, region, marker)
+        totals = self._totals.setdefault(key, [0.0, 0.0, 0])
+        totals[0] += position.x * count
+        totals[1] += position.y * count
+        totals[2] += count
+        if totals[2] <= 0:
+            del self._totals[key]
+
+    def position(
+        self, guild_id: int, marker: str, region: str | None = None
+    ) -> GridPosition | None:
+        """Approximate position of a marker
+
+        Args:
+            guild_id (int): Guild whose facilities the position is learned from
+            marker (str): Marker to find
+            region (str, optional): Region the marker is in, defaults to the first region it's in
+
+        Returns:
+            GridPosition | None: Position, or None for an unknown marker
+        """
+        region = region or MARKER_REGIONS.get(marker)
+        if region is None or marker not in REGIONS.get(region, ()):
+            return None
+        totals = self._totals.get((guild_id, region, marker))
+        if totals is None:
+            return region_centre(region)
+        x, y, count = totals
+        return GridPosition(region, x / count, y / count)
+
+    def facility_position(self, facility: Facility) -> GridPosition:
+        """Position of a facility from its coordinates, otherwise its marker"""
+        return (
+            parse_coordinates(facility.region, facility.coordinates)
+            or self.position(facility.guild_id, facility.marker, facility.region)
+            or region_centre(facility.region)
+        )
+
+    def rank(
+        self,
+        guild_id: int,
+        marker: str,
+        facilities: Iterable[Facility],
+        *,
+        hops: int | None = None,
+    ) -> list[Facility]:
+        """Orders facilities by distance from a marker, closest first
+
+        Args:
+            guild_id (int): Guild the facilities are in
+            marker (str): Marker to measure from
+            facilities (Iterable[Facility]): Facilities to order
+            hops (int, optional): Leaves out facilities more than this many regions away
+
+        Returns:
+            list[Facility]: Ordered facilities
+        """
+        origin = self.position(guild_id, marker)
+        if origin is None:
+            return list(facilities)
+
+        nearby = regions_within(origin.region, hops) if hops is not None else None
+        origin_x, origin_y = world_position(origin)
+        distances = []
+        for facility in facilities:
+            if nearby is not None and facility.region not in nearby:
+                continue
+            x, y = world_position(self.facility_position(facility))
+            distances.append((math.hypot(x - origin_x, y - origin_y), facility))
+        distances.sort(key=lambda item: item[0])
+        return [facility for _, facility in distances]
@@ -0,0 +1,283 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import itertools
+from enum import IntEnum
+from collections import Counter, deque
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, TypeVar
+
+from discord import HTTPException, RateLimited
+
+
+if TYPE_CHECKING:
+    from discord.http import HTTPClient
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+
+class Lane(IntEnum):
+    """Priority of outbound work, lower values run first"""
+
+    INTERACTION = 0
+    LIST = 1
+    FORUM = 2
+
+
+class _Job:
+    __slots__ = ("lane", "channel_id", "func", "future", "limit", "attempts")
+
+    def __init__(
+        self,
+        lane: Lane,
+        channel_id: int,
+        func: Callable[[], Awaitable[Any]],
+        future: asyncio.Future,
+        limit: int,
+    ) -> None:
+        self.lane: Lane = lane
+        self.channel_id: int = channel_id
+        self.func: Callable[[], Awaitable[Any]] = func
+        self.future: asyncio.Future = future
+        self.limit: int = limit
+        self.attempts: int = 0
+
+
+def retry_after(exc: Exception) -> float | None:
+    """Seconds to wait before retrying a rate limited request
+
+    Args:
+        exc (Exception): Exception raised by the request
+
+    Returns:
+        float | None: Seconds to wait, None if it wasn't rate limited
+    """
+    if isinstance(exc, RateLimited):
+        return exc.retry_after
+    if isinstance(exc, HTTPException) and exc.status == 429:
+        headers = exc.response.headers
+        value = headers.get("Retry-After") or headers.get("X-RateLimit-Reset-After")
+        return float(value or 1)
+    return None
+
+
+class RestScheduler:
+    """Runs outbound REST work by lane priority with a concurrency limit per channel
+
+    Background work for a channel whose rate limit bucket is used up is put back
+    until the bucket resets, so the worker moves on to other work instead of
+    sleeping inside the HTTP client
+
+    Args:
+        http (HTTPClient): Client whose rate limit buckets are checked
+        workers (int): Jobs run at once
+        per_channel (int): Jobs run at once in a single channel
+        max_attempts (int): Times a rate limited job is tried before failing
+    """
+
+    def __init__(
+        self,
+        http: HTTPClient,
+        *,
+        workers: int = 4,
+        per_channel: int = 1,
+        max_attempts: int = 3,
+    ) -> None:
+        self.http: HTTPClient = http
+        self.worker_count: int = workers
+        self.per_channel: int = per_channel
+        self.max_attempts: int = max_attempts
+        self._queue: asyncio.PriorityQueue[tuple[int, int, _Job]] | None = None
+        self._order = itertools.count()
+        self._workers: list[asyncio.Task] = []
+        self._active: Counter[int] = Counter()
+        self._waiting: dict[int, deque[_Job]] = {}
+        self._delayed: set[asyncio.TimerHandle] = set()
+        self.submitted: Counter[Lane] = Counter()
+        self.completed: Counter[Lane] = Counter()
+        self.failed: Counter[Lane] = Counter()
+        self.rate_limited: Counter[Lane] = Counter()
+        self.deferred: Counter[Lane] = Counter()
+
+    def start(self) -> None:
+        if self._workers:
+            return
+        self._queue = asyncio.PriorityQueue()
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"rest-scheduler-{index}")
+            for index in range(self.worker_count)
+        ]
+
+    async def close(self) -> None:
+        for handle in self._delayed:
+            handle.cancel()
+        self._delayed.clear()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+
+        jobs = [job for _, _, job in self._queue._queue] if self._queue else []
+        for waiting in self._waiting.values():
+            jobs.extend(waiting)
+        self._waiting.clear()
+        for job in jobs:
+            job.future.cancel()
+
+    def submit(
+        self,
+        lane: Lane,
+        channel_id: int,
+        func: Callable[[], Awaitable[T]],
+        *,
+        limit: int | None = None,
+    ) -> asyncio.Future[T]:
+        """Queues work, runs it directly if the scheduler isn't running
+
+        Args:
+            lane (Lane): Priority of the work
+            channel_id (int): Channel the work sends to, used for concurrency and rate limits
+            func (Callable[[], Awaitable[T]]): Creates the request, may be called more than once
+            limit (int, optional): Jobs run at once in the channel, defaults to per_channel
+
+        Returns:
+            asyncio.Future[T]: Result of the work
+        """
+        if not self._workers:
+            return asyncio.ensure_future(func())
+
+        future = asyncio.get_running_loop().create_future()
+        self.submitted[lane] += 1
+        self._put(_Job(lane, channel_id, func, future, limit or self.per_channel))
+        return future
+
+    async def run(
+        self,
+        lane: Lane,
+        channel_id: int,
+        func: Callable[[], Awaitable[T]],
+        *,
+        limit: int | None = None,
+    ) -> T:
+        """Queues work and waits for its result
+
+        Args:
+            lane (Lane): Priority of the work
+            channel_id (int): Channel the work sends to
+            func (Callable[[], Awaitable[T]]): Creates the request, may be called more than once
+            limit (int, optional): Jobs run at once in the channel, defaults to per_channel
+
+        Returns:
+            T: Result of the work
+        """
+        return await self.submit(lane, channel_id, func, limit=limit)
+
+    def stats(self) -> dict[str, Any]:
+        lanes = {}
+        for lane in Lane:
+            lanes[lane.name.lower()] = {
+                "submitted": self.submitted[lane],
+                "completed": self.completed[lane],
+                "failed": self.failed[lane],
+                "rate_limited": self.rate_limited[lane],
+                "deferred": self.deferred[lane],
+            }
+        return {
+            "queued": self._queue.qsize() if self._queue else 0,
+            "waiting_on_channel": sum(len(jobs) for jobs in self._waiting.values()),
+            "delayed": len(self._delayed),
+            "active_channels": len(self._active),
+            "lanes": lanes,
+        }
+
+    def _put(self, job: _Job) -> None:
+        self._queue.put_nowait((job.lane, next(self._order), job))
+
+    def _put_later(self, job: _Job, delay: float) -> None:
+        def put() -> None:
+            self._delayed.discard(handle)
+            self._put(job)
+
+        handle = asyncio.get_running_loop().call_later(delay, put)
+        self._delayed.add(handle)
+
+    def _bucket_delay(self, channel_id: int) -> float:
+        """Seconds until the channel's exhausted rate limit buckets reset
+
+        Reads the bucket state the HTTP client keeps from rate limit headers
+        """
+        loop = asyncio.get_running_loop()
+        global_over = getattr(self.http, "_global_over", None)
+        if isinstance(global_over, asyncio.Event) and not global_over.is_set():
+            return 1.0
+
+        delay = 0.0
+        suffix = str(channel_id)
+        for key, bucket in tuple(getattr(self.http, "_buckets", {}).items()):
+            if not key.endswith(suffix) or bucket.expires is None:
+                continue
+            if bucket.remaining - bucket.outgoing <= 0:
+                delay = max(delay, bucket.expires - loop.time())
+        return delay
+
+    async def _worker(self) -> None:
+        while True:
+            _, _, job = await self._queue.get()
+            if job.future.done():
+                continue
+
+            channel_id = job.channel_id
+            if self._active[channel_id] >= job.limit:
+                self._waiting.setdefault(channel_id, deque()).append(job)
+                continue
+
+            # interaction work always goes straight through
+            if job.lane is not Lane.INTERACTION:
+                delay = self._bucket_delay(channel_id)
+                if delay > 0:
+                    self.deferred[job.lane] += 1
+                    self._put_later(job, delay)
+                    continue
+
+            self._active[channel_id] += 1
+            try:
+                await self._run(job)
+            finally:
+                self._active[channel_id] -= 1
+                if not self._active[channel_id]:
+                    del self._active[channel_id]
+                waiting = self._waiting.get(channel_id)
+                if waiting:
+                    self._put(waiting.popleft())
+                    if not waiting:
+                        del self._waiting[channel_id]
+
+    async def _run(self, job: _Job) -> None:
+        job.attempts += 1
+        try:
+            result = await job.func()
+        except asyncio.CancelledError:
+            job.future.cancel()
+            raise
+        except Exception as exc:
+            delay = retry_after(exc)
+            if delay is not None and job.attempts < self.max_attempts:
+                logger.warning(
+                    "Rate limited in channel %r, retrying %s work in %.2fs",
+                    job.channel_id,
+                    job.lane.name,
+                    delay,
+                )
+                self.rate_limited[job.lane] += 1
+                self._put_later(job, delay)
+                return
+
+            self.failed[job.lane] += 1
+            if not job.future.done():
+                job.future.set_exception(exc)
+        else:
+            self.completed[job.lane] += 1
+            if not job.future.done():
+                job.future.set_result(result)
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Any, Callable
+
+from discord.utils import _get_as_snowflake
+
+
+if TYPE_CHECKING:
+    from discord.state import ConnectionState
+
+
+def shard_for(guild_id: int | None, shard_count: int) -> int:
+    """Shard discord routes a guild's events to, DM's always go to shard 0
+
+    Args:
+        guild_id (int, optional): ID of the guild
+        shard_count (int): Total shards
+
+    Returns:
+        int: Shard ID
+    """
+    if not guild_id or shard_count <= 1:
+        return 0
+    return (guild_id >> 22) % shard_count
+
+
+class RateCounter:
+    """Counts events in one second buckets over a sliding window
+
+    Args:
+        window (int): Seconds to keep
+    """
+
+    def __init__(self, window: int = 60) -> None:
+        self.window: int = window
+        self.total: int = 0
+        self._buckets: deque[list[int]] = deque(maxlen=window)
+
+    def add(self, amount: int = 1) -> None:
+        now = int(time.monotonic())
+        if self._buckets and self._buckets[-1][0] == now:
+            self._buckets[-1][1] += amount
+        else:
+            self._buckets.append([now, amount])
+        self.total += amount
+
+    def per_second(self) -> float:
+        cutoff = int(time.monotonic()) - self.window
+        recent = sum(count for second, count in self._buckets if second > cutoff)
+        return recent / self.window
+
+
+class ShardHealth:
+    def __init__(self, shard_id: int) -> None:
+        self.shard_id: int = shard_id
+        self.events = RateCounter()
+        self.connected: bool = False
+        self.connected_at: float | None = None
+        self.disconnected_at: float | None = None
+        self.connects: int = 0
+        self.disconnects: int = 0
+        self.resumes: int = 0
+
+
+class ShardMonitor:
+    """Tracks connection state and event throughput for each shard
+
+    Args:
+        shard_count (Callable[[], int]): Returns the current shard count
+    """
+
+    def __init__(self, shard_count: Callable[[], int]) -> None:
+        self._shard_count: Callable[[], int] = shard_count
+        self.shards: dict[int, ShardHealth] = {}
+
+    def get(self, shard_id: int | None) -> ShardHealth:
+        shard_id = shard_id or 0
+        try:
+            return self.shards[shard_id]
+        except KeyError:
+            health = self.shards[shard_id] = ShardHealth(shard_id)
+            return health
+
+    def install(self, state: ConnectionState) -> None:
+        """Wraps the gateway parsers to attribute every event to its shard
+
+        Args:
+            state (ConnectionState): State the websockets dispatch into
+        """
+        for event, parser in state.parsers.items():
+            state.parsers[event] = self._counted(event, parser)
+
+    def _counted(
+        self, event: str, parser: Callable[[Any], None]
+    ) -> Callable[[Any], None]:
+        # GUILD_CREATE, GUILD_UPDATE and GUILD_DELETE carry the guild's own ID
+        guild_event = event.startswith("GUILD_")
+
+        def wrapper(data: Any) -> None:
+            guild_id = None
+            if isinstance(data, dict):
+                guild_id = _get_as_snowflake(data, "guild_id")
+                if guild_id is None and guild_event:
+                    guild_id = _get_as_snowflake(data, "id")
+            self.get(shard_for(guild_id, self._shard_count())).events.add()
+            return parser(data)
+
+        return wrapper
+
+    def connected(self, shard_id: int | None) -> None:
+        health = self.get(shard_id)
+        health.connected = True
+        health.connected_at = time.time()
+        health.connects += 1
+
+    def disconnected(self, shard_id: int | None) -> None:
+        health = self.get(shard_id)
+        if health.connected:
+            health.disconnects += 1
+        health.connected = False
+        health.disconnected_at = time.time()
+
+    def resumed(self, shard_id: int | None) -> None:
+        health = self.get(shard_id)
+        health.connected = True
+        health.resumes += 1
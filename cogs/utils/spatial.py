@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import re
+import heapq
+import math
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, NamedTuple
+
+
+if TYPE_CHECKING:
+    from .facility import Facility
+
+    FacilityPredicate = Callable[[Facility], bool]
+
+# map coordinates from ctrl-click, column letter, row number and keypad square
+COORDINATE_PATTERN = re.compile(r"([A-R])(\d{1,2})K([1-9])", flags=re.IGNORECASE)
+# approximate width of a map grid square in metres
+GRID_SQUARE_METRES = 125
+# width of an index cell in grid squares, a region is about 17 by 15 squares
+CELL_SIZE = 2.0
+
+
+class GridPosition(NamedTuple):
+    """Position within a region in grid squares from its top left corner"""
+
+    region: str
+    x: float
+    y: float
+
+    def distance(self, other: GridPosition) -> float:
+        return math.hypot(self.x - other.x, self.y - other.y)
+
+
+def parse_coordinates(region: str, coordinates: str | None) -> GridPosition | None:
+    """Converts map coordinates like G5K3 to the centre of the keypad square
+
+    Args:
+        region (str): Region the coordinates are in
+        coordinates (str, optional): Coordinates to convert
+
+    Returns:
+        GridPosition | None: Position, or None if the coordinates can't be parsed
+    """
+    if not coordinates:
+        return None
+    match = COORDINATE_PATTERN.search(coordinates)
+    if match is None:
+        return None
+
+    column, row, keypad = match.groups()
+    # keypad squares are laid out like a numpad, 7 8 9 along the top
+    keypad_index = int(keypad) - 1
+    sub_x = keypad_index % 3
+    sub_y = 2 - keypad_index // 3
+    x = ord(column.upper()) - ord("A") + (sub_x + 0.5) / 3
+    y = int(row) - 1 + (sub_y + 0.5) / 3
+    return GridPosition(region, x, y)
+
+
+def facility_position(facility: Facility) -> GridPosition | None:
+    return parse_coordinates(facility.region, facility.coordinates)
+
+
+def format_distance(distance: float) -> str:
+    metres = distance * GRID_SQUARE_METRES
+    if metres < 1000:
+        return f"~{metres:.0f}m"
+    return f"~{metres / 1000:.1f}km"
+
+
+class SpatialIndex:
+    """Facilities with coordinates bucketed into a uniform grid per region
+
+    Nearest neighbour searches only visit the cells around the origin rather than
+    every facility
+
+    Args:
+        cell_size (float): Width of a cell in grid squares
+    """
+
+    def __init__(self, cell_size: float = CELL_SIZE) -> None:
+        self.cell_size: float = cell_size
+        self._positions: dict[int, tuple[GridPosition, Facility]] = {}
+        self._cells: dict[str, dict[tuple[int, int], set[int]]] = {}
+
+    @classmethod
+    def from_facilities(cls, facilities: Iterable[Facility]) -> SpatialIndex:
+        index = cls()
+        for facility in facilities:
+            index.add(facility)
+        return index
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __contains__(self, facility_id: int) -> bool:
+        return facility_id in self._positions
+
+    def _cell(self, position: GridPosition) -> tuple[int, int]:
+        return (
+            math.floor(position.x / self.cell_size),
+            math.floor(position.y / self.cell_size),
+        )
+
+    def add(self, facility: Facility) -> bool:
+        """Adds or replaces a facility
+
+        Args:
+            facility (Facility): Facility to index
+
+        Returns:
+            bool: Whether it has coordinates and was indexed
+        """
+        self.remove(facility.id_)
+        position = facility_position(facility)
+        if position is None:
+            return False
+
+        self._positions[facility.id_] = (position, facility)
+        cells = self._cells.setdefault(position.region, {})
+        cells.setdefault(self._cell(position), set()).add(facility.id_)
+        return True
+
+    def remove(self, facility_id: int) -> None:
+        entry = self._positions.pop(facility_id, None)
+        if entry is None:
+            return
+
+        position, _ = entry
+        cells = self._cells[position.region]
+        cell = self._cell(position)
+        cells[cell].discard(facility_id)
+        if not cells[cell]:
+            del cells[cell]
+
+    def positions(self, region: str) -> Iterator[tuple[GridPosition, Facility]]:
+        for ids in self._cells.get(region, {}).values():
+            for facility_id in ids:
+                yield self._positions[facility_id]
+
+    @staticmethod
+    def _ring(x: int, y: int, radius: int) -> Iterator[tuple[int, int]]:
+        if radius == 0:
+            yield x, y
+            return
+        for offset in range(-radius, radius + 1):
+            yield x + offset, y - radius
+            yield x + offset, y + radius
+        for offset in range(-radius + 1, radius):
+            yield x - radius, y + offset
+            yield x + radius, y + offset
+
+    def nearest(
+        self,
+        origin: GridPosition,
+        k: int,
+        predicate: FacilityPredicate | None = None,
+    ) -> list[tuple[float, Facility]]:
+        """Finds the closest facilities in the origin's region
+
+        Args:
+            origin (GridPosition): Position to search from
+            k (int): Max facilities to return
+            predicate (FacilityPredicate, optional): Facilities must match it
+
+        Returns:
+            list[tuple[float, Facility]]: Distances in grid squares with facilities, closest first
+        """
+        cells = self._cells.get(origin.region)
+        if not cells or k <= 0:
+            return []
+
+        origin_x, origin_y = self._cell(origin)
+        max_radius = max(max(abs(x - origin_x), abs(y - origin_y)) for x, y in cells)
+        # max heap of the best k as (-distance, id)
+        best: list[tuple[float, int]] = []
+        for radius in range(max_radius + 1):
+            # everything in this ring is at least this far from the origin
+            if len(best) == k and -best[0][0] <= (radius - 1) * self.cell_size:
+                break
+            for cell in self._ring(origin_x, origin_y, radius):
+                for facility_id in cells.get(cell, ()):
+                    position, facility = self._positions[facility_id]
+                    if predicate is not None and not predicate(facility):
+                        continue
+                    item = (-origin.distance(position), facility_id)
+                    if len(best) < k:
+                        heapq.heappush(best, item)
+                    elif item > best[0]:
+                        heapq.heapreplace(best, item)
+
+        return [
+            (-distance, self._positions[facility_id][1])
+            for distance, facility_id in sorted(best, reverse=True)
+        ]
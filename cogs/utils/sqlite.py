@@ -1,15 +1,17 @@
 from __future__ import annotations
 
 from enum import Enum, auto
-from typing import List, Dict, Iterable, TYPE_CHECKING
+from typing import List, Dict, AsyncIterator, Iterable, TYPE_CHECKING
 from contextlib import asynccontextmanager
 import sqlite3
+import time
 import logging
 import aiosqlite
 from aiosqlite import Row
 
 from .facility import Facility
 from .flags import ItemServiceFlags, VehicleServiceFlags
+from .history import Revision, diff
 
 
 if TYPE_CHECKING:
@@ -20,6 +22,9 @@ if TYPE_CHECKING:
 
 logger = logging.getLogger(__name__)
 
+# columns written when a facility is created
+INSERT_FACILITY = """INSERT INTO facilities (name, description, region, coordinates, marker, maintainer, author, item_services, vehicle_services, creation_time, guild_id, image_url) VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"""
+
 
 class FetchMethod(Enum):
     NONE = auto()
@@ -200,7 +205,7 @@ class Database:
                     "creation_time"	INTEGER,
                     "guild_id"	INTEGER,
                     "image_url"	TEXT,
-                    "thread_id"	INTEGER,
+                    "thread_id"	INTEGER
                 );
                 CREATE TABLE "blacklist" (
 	                "object_id"	INTEGER UNIQUE,
@@ -240,12 +245,45 @@ class Database:
             """
         await self.executemultiple(sql)
         logger.info("Created database %r", str(self.db_file))
+        await self.migrate()
 
-    async def ephemeral_preference(self, user_id: int) -> bool | None:
+    async def migrate(self):
+        """Creates tables added since the first schema, safe to run on every start"""
+        sql = """
+                CREATE TABLE IF NOT EXISTS "reconcile_schedule" (
+	                "guild_id"	INTEGER,
+	                "interval"	INTEGER NOT NULL,
+	                "next_run"	INTEGER NOT NULL,
+	                PRIMARY KEY("guild_id")
+                );
+                CREATE TABLE IF NOT EXISTS "revisions" (
+	                "id_"	INTEGER PRIMARY KEY AUTOINCREMENT,
+	                "facility_id"	INTEGER NOT NULL,
+	                "author"	INTEGER NOT NULL,
+	                "time"	INTEGER NOT NULL,
+	                "changes"	TEXT NOT NULL,
+	                "item_services"	INTEGER NOT NULL,
+	                "vehicle_services"	INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS "revision_index" ON "revisions" (
+	                "facility_id",
+	                "id_"
+                );
+            """
+        await self.executemultiple(sql)
+
+    async def saved_ephemeral_preference(self, user_id: int) -> bool | None:
+        """Looks up a preference without saving the default for new users"""
         query = """SELECT ephemeral FROM user_options WHERE user_id = ?"""
         current_choice_row = await self.fetch_one(query, user_id)
         if current_choice_row:
             return current_choice_row[0]
+        return None
+
+    async def ephemeral_preference(self, user_id: int) -> bool | None:
+        preference = await self.saved_ephemeral_preference(user_id)
+        if preference is not None:
+            return preference
 
         query = """INSERT OR REPLACE INTO user_options VALUES (?,?)"""
         current_choice_row = await self.bot.db.execute(query, user_id, False)
@@ -258,8 +296,9 @@ class Database:
             results = await db.execute_fetchall("SELECT * FROM facilities")
             return [Facility(**row) for row in results]
 
-    async def add_facility(self, facility: Facility) -> int:
-        values = (
+    @staticmethod
+    def _facility_values(facility: Facility) -> tuple:
+        return (
             facility.name,
             facility.description,
             facility.region,
@@ -273,12 +312,32 @@ class Database:
             facility.guild_id,
             facility.image_url,
         )
+
+    async def add_facility(self, facility: Facility) -> int:
         lastrowid = await self._execute_query(
-            """INSERT INTO facilities (name, description, region, coordinates, marker, maintainer, author, item_services, vehicle_services, creation_time, guild_id, image_url) VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-            values,
+            INSERT_FACILITY, self._facility_values(facility)
         )
         return lastrowid
 
+    async def add_facilities(self, facilities: list[Facility]) -> None:
+        """Inserts facilities in a single transaction and sets their IDs
+
+        Args:
+            facilities (list[Facility]): Facilities to insert
+        """
+        values = [self._facility_values(facility) for facility in facilities]
+        async with self._connect() as db:
+            await db.executemany(INSERT_FACILITY, values)
+            # ids are consecutive as the transaction holds the write lock
+            cur = await db.execute("SELECT last_insert_rowid()")
+            (last_id,) = await cur.fetchone()
+            await db.commit()
+        logger.debug("Inserted %r facilities up to ID %r", len(values), last_id)
+
+        first_id = last_id - len(facilities) + 1
+        for offset, facility in enumerate(facilities):
+            facility.id_ = first_id + offset
+
     async def get_facilities(
         self, search_dict: Dict[str, str | int] = None
     ) -> List[Facility]:
@@ -292,6 +351,26 @@ class Database:
 
         return [Facility(**row) for row in rows]
 
+    async def iter_facilities(
+        self, search_dict: Dict[str, str | int], chunk_size: int
+    ) -> AsyncIterator[List[Facility]]:
+        """Steps through matching facilities by ID without fetching them all at once
+
+        Args:
+            search_dict (Dict[str, str | int]): Conditions with their parameters
+            chunk_size (int): Facilities fetched at a time
+
+        Yields:
+            List[Facility]: Up to chunk_size facilities
+        """
+        sql = "SELECT * FROM facilities WHERE " + "AND".join(search_dict)
+        sql += " ORDER BY id_"
+        async with self._connect() as db:
+            db.row_factory = Row
+            async with db.execute(sql, tuple(search_dict.values())) as cur:
+                while rows := await cur.fetchmany(chunk_size):
+                    yield [Facility(**row) for row in rows]
+
     async def get_facility_ids(
         self, ids: list[int], guild_id: int | None = None
     ) -> List[Facility]:
@@ -322,11 +401,36 @@ class Database:
             return None
         return Facility(**row)
 
+    async def marker_coordinates(self) -> Iterable[Row]:
+        """Coordinates given for each marker in each guild with how many facilities use them"""
+        query = """SELECT guild_id, region, marker, coordinates, count(*) FROM facilities WHERE coordinates != '' GROUP BY guild_id, region, marker, coordinates"""
+        return await self.fetch(query)
+
     async def remove_facilities(self, facilities: list[Facility]) -> None:
         ids = [(facility.id_,) for facility in facilities]
-        await self._execute_query("""DELETE FROM facilities WHERE id_ == ?""", ids)
+        async with self._connect() as db:
+            await db.executemany("""DELETE FROM facilities WHERE id_ == ?""", ids)
+            await db.executemany(
+                """DELETE FROM revisions WHERE facility_id == ?""", ids
+            )
+            await db.commit()
+
+    async def update_facility(
+        self, facility: Facility, author: int | None = None
+    ) -> Facility | None:
+        """Writes a facility, recording the change in its history when an author is given
 
-    async def update_facility(self, facility: Facility) -> None:
+        The stored row is read, replaced and its revision inserted in one
+        transaction, so concurrent modifies each diff against the version they
+        replaced and the revisions always chain
+
+        Args:
+            facility (Facility): Facility to write
+            author (int, optional): User who made the change, no revision is recorded without one
+
+        Returns:
+            Facility | None: Version that was replaced when an author is given
+        """
         values = (
             facility.name,
             facility.description,
@@ -337,19 +441,73 @@ class Database:
             facility.thread_id,
             facility.id_,
         )
+        query = """UPDATE facilities SET name = ?, description = ?, maintainer = ?, item_services = ?, vehicle_services = ?, image_url = ?, thread_id = ? WHERE id_ == ?"""
+        if author is None:
+            await self._execute_query(query, values)
+            return None
+
+        async with self._connect() as db:
+            db.row_factory = Row
+            # takes the write lock before reading so no other modify lands in between
+            await db.execute("BEGIN IMMEDIATE")
+            cur = await db.execute(
+                """SELECT * FROM facilities WHERE id_ == ?""", (facility.id_,)
+            )
+            row = await cur.fetchone()
+            if row is None:
+                await db.rollback()
+                return None
+            before = Facility(**row)
+
+            await db.execute(query, values)
+            difference = diff(before, facility)
+            if difference is not None:
+                changes, item_services, vehicle_services = difference
+                await db.execute(
+                    """INSERT INTO revisions (facility_id, author, time, changes, item_services, vehicle_services) VALUES (?, ?, ?, ?, ?, ?)""",
+                    (
+                        facility.id_,
+                        author,
+                        int(time.time()),
+                        changes,
+                        item_services,
+                        vehicle_services,
+                    ),
+                )
+            await db.commit()
+        return before
+
+    async def get_revisions(self, facility_id: int) -> list[Revision]:
+        """Revisions of a facility, newest first"""
+        rows = await self.fetch(
+            """SELECT id_, facility_id, author, time, changes, item_services, vehicle_services FROM revisions WHERE facility_id == ? ORDER BY id_ DESC""",
+            facility_id,
+        )
+        return [Revision.from_row(row) for row in rows]
+
+    async def set_thread_ids(self, facilities: list[Facility]) -> None:
+        """Writes the forum thread of each facility in a single transaction"""
+        values = [(facility.thread_id, facility.id_) for facility in facilities]
         await self._execute_query(
-            """UPDATE facilities SET name = ?, description = ?, maintainer = ?, item_services = ?, vehicle_services = ?, image_url = ?, thread_id = ? WHERE id_ == ?""",
-            values,
+            """UPDATE facilities SET thread_id = ? WHERE id_ == ?""", values
         )
 
     async def reset(self) -> None:
         sql = """
             DELETE FROM facilities;
-            UPDATE sqlite_sequence SET seq = 0 WHERE name == 'facilities';
+            DELETE FROM revisions;
+            UPDATE sqlite_sequence SET seq = 0 WHERE name IN ('facilities', 'revisions');
             VACUUM;
         """
         await self._execute_query(sql)
-        logger.info("Removed all entries from facilities and executed VACUUM")
+        logger.info(
+            "Removed all entries from facilities and revisions and executed VACUUM"
+        )
+
+    async def response_channels(self) -> dict[int, set[int]]:
+        """Channels answering questions for every guild that has any"""
+        rows = await self.fetch("""SELECT guild_id, channel_ids FROM response""")
+        return {guild_id: set(channel_ids) for guild_id, channel_ids in rows}
 
     async def set_roles(self, role_ids: list[int], guild_id: int) -> None:
         await self._execute_query(
@@ -396,3 +554,29 @@ class Database:
             (guild.id,),
             FetchMethod.ONE,
         )
+
+    async def set_reconcile_interval(self, guild_id: int, hours: int) -> None:
+        if not hours:
+            await self._execute_query(
+                """DELETE FROM reconcile_schedule WHERE guild_id == ?""", (guild_id,)
+            )
+            return
+        interval = hours * 3600
+        await self._execute_query(
+            """INSERT OR REPLACE INTO reconcile_schedule (guild_id, interval, next_run) VALUES (?, ?, ?)""",
+            (guild_id, interval, int(time.time()) + interval),
+        )
+
+    async def due_reconciles(self) -> list[int]:
+        rows = await self._execute_query(
+            """SELECT guild_id FROM reconcile_schedule WHERE next_run <= ?""",
+            (int(time.time()),),
+            FetchMethod.ALL,
+        )
+        return [row[0] for row in rows]
+
+    async def reschedule_reconcile(self, guild_id: int) -> None:
+        await self._execute_query(
+            """UPDATE reconcile_schedule SET next_run = ? + interval WHERE guild_id == ?""",
+            (int(time.time()), guild_id),
+        )
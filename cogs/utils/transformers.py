@@ -6,6 +6,7 @@ from typing import TYPE_CHECKING
 from discord import app_commands
 
 from .errors import MessageError
+from .query import QuerySyntaxError, ServiceQuery, compile_query
 
 
 if TYPE_CHECKING:
@@ -58,3 +59,13 @@ class IdTransformer(app_commands.Transformer):
 
         id_tuple = tuple(map(convert, seperated))
         return tuple(filter(None, id_tuple))
+
+
+class QueryTransformer(app_commands.Transformer):
+    async def transform(
+        self, interaction: GuildInteraction, value: str, /
+    ) -> ServiceQuery:
+        try:
+            return compile_query(value.strip())
+        except QuerySyntaxError as exc:
+            raise MessageError(f"Invalid query: {exc}") from exc
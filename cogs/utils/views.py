@@ -5,7 +5,7 @@ from copy import copy
 from typing import TYPE_CHECKING
 
 from discord import ui, User, Member, ButtonStyle, Button, ChannelType, utils
-from discord.errors import Forbidden, NotFound
+from discord.errors import Forbidden
 
 from .modals import FacilityInformationModal
 from .facility import Facility
@@ -13,11 +13,15 @@ from .mixins import InteractionCheckedView
 from .embeds import FeedbackEmbed, FeedbackType
 from .flags import ItemServiceFlags, VehicleServiceFlags
 from .embeds import create_list
+from .scheduler import Lane
+from .deletion import delete_messages
 
 
 if TYPE_CHECKING:
     from .context import GuildInteraction, ClientInteraction
+    from .backup import Snapshot
     from ..events import Events
+    from ..facility import FacilityCog
 
 
 class ButtonMessage(Exception):
@@ -53,12 +57,11 @@ class ChannelSelectDropdown(ui.ChannelSelect):
                 )
             channel = interaction.guild.get_channel_or_thread(cid)
             if channel:
-                for mid in messages:
-                    message = channel.get_partial_message(mid)
-                    try:
-                        await message.delete()
-                    except NotFound:
-                        pass
+                await delete_messages(
+                    interaction.client.rest,
+                    [channel.get_partial_message(mid) for mid in messages],
+                    lane=Lane.INTERACTION,
+                )
 
         facility_list = await create_list(
             self.view.parent_view.facilities, interaction.guild, interaction.client
@@ -155,9 +158,12 @@ class SetDynamicList(InteractionCheckedView):
             self.facilities, interaction.guild, interaction.client
         )
         initial_embed = facility_list.pop(0)
+        rest = interaction.client.rest
         try:
-            thread, message = await forum.create_thread(
-                name="Index", embed=initial_embed
+            thread, message = await rest.run(
+                Lane.INTERACTION,
+                forum.id,
+                lambda: forum.create_thread(name="Index", embed=initial_embed),
             )
         except Forbidden:
             embed = FeedbackEmbed(
@@ -172,9 +178,13 @@ class SetDynamicList(InteractionCheckedView):
 
         messages = [message.id]
 
-        await thread.edit(locked=True, pinned=True)
+        await rest.run(
+            Lane.INTERACTION, thread.id, lambda: thread.edit(locked=True, pinned=True)
+        )
         for embed in facility_list:
-            message = await thread.send(embed=embed)
+            message = await rest.run(
+                Lane.INTERACTION, thread.id, lambda: thread.send(embed=embed)
+            )
             messages.append(message.id)
 
         try:
@@ -256,6 +266,7 @@ class ResetView(InteractionCheckedView):
         resopnse = interaction.response
 
         try:
+            await interaction.client.snapshots.snapshot("reset")
             await interaction.client.db.reset()
         except Exception as exc:
             embed = FeedbackEmbed(
@@ -264,29 +275,83 @@ class ResetView(InteractionCheckedView):
             await resopnse.send_message(embed=embed, ephemeral=True)
             raise exc
         else:
+            facility_cog: FacilityCog | None = interaction.client.get_cog("FacilityCog")
+            if facility_cog is not None:
+                facility_cog.spatial.clear()
+            interaction.client.gazetteer.clear()
+            await interaction.client.cluster.broadcast("clear_spatial")
+
             events_cog: Events | None = interaction.client.get_cog("Events")
             if events_cog is None:
                 return
 
-            query = """SELECT guild_id FROM list"""
-            rows = await interaction.client.db.fetch(query)
-            for row in rows:
-                guild_id = row and row[0]
-                guild = interaction.client.get_guild(guild_id)
-
-            guilds = [interaction.client.get_guild(row[0]) for row in rows if row]
-            filtered_guilds = list(filter(None, guilds))
+            # other clusters update the lists of guilds on their shards in the background
+            updated = await events_cog.update_lists()
+            cluster = interaction.client.cluster
+            await cluster.broadcast("update_lists")
+            remote = cluster.cluster_count - 1 if cluster.connected else 0
 
-            if not filtered_guilds:
+            if not updated and not remote:
                 return
 
-            for guild in filtered_guilds:
-                await events_cog.update_list(guild)
+            message = f"Reset DB\nUpdated {updated} lists"
+            if remote:
+                message += f", requested updates from {remote} other clusters"
+            embed = FeedbackEmbed(message, FeedbackType.SUCCESS)
+            await resopnse.send_message(embed=embed, delete_after=10)
+
+
+class RestoreView(InteractionCheckedView):
+    """View used when restoring the database from a snapshot"""
 
+    def __init__(
+        self,
+        *,
+        timeout: float = 180,
+        original_author: User | Member,
+        snapshot: Snapshot,
+    ) -> None:
+        super().__init__(timeout=timeout, original_author=original_author)
+        self.snapshot: Snapshot = snapshot
+
+    @ui.button(label="Restore", style=ButtonStyle.danger)
+    async def confirm(self, interaction: ClientInteraction, _: ui.Button) -> None:
+        await self._finish_view(interaction)
+        client = interaction.client
+
+        try:
+            previous = await client.snapshots.restore(self.snapshot)
+        except Exception as exc:
             embed = FeedbackEmbed(
-                f"Reset DB\nUpdated {len(filtered_guilds)} lists", FeedbackType.SUCCESS
+                f"Failed to restore snapshot\n```py\n{exc}\n```", FeedbackType.ERROR
             )
-            await resopnse.send_message(embed=embed, delete_after=10)
+            await interaction.followup.send(embed=embed)
+            raise exc
+
+        # snapshots can predate tables added since
+        await client.db.migrate()
+        await client.reload_data()
+        facility_cog: FacilityCog | None = client.get_cog("FacilityCog")
+        if facility_cog is not None:
+            facility_cog.spatial.clear()
+        await client.cluster.broadcast("reload_data")
+
+        updated = remote = 0
+        events_cog: Events | None = client.get_cog("Events")
+        if events_cog is not None:
+            updated = await events_cog.update_lists()
+            await client.cluster.broadcast("update_lists")
+            if client.cluster.connected:
+                remote = client.cluster.cluster_count - 1
+
+        message = f"Restored `{self.snapshot.name}`, updated {updated} lists"
+        if remote:
+            message += f", requested updates from {remote} other clusters"
+        embed = FeedbackEmbed(
+            f"{message}\nPrevious state saved as `{previous.name}`",
+            FeedbackType.SUCCESS,
+        )
+        await interaction.followup.send(embed=embed)
 
 
 class BaseServicesSelectView(InteractionCheckedView):
@@ -453,7 +518,9 @@ class ModifyFacilityView(BaseServicesSelectView):
 
         followup = interaction.followup
         try:
-            await interaction.client.db.update_facility(self.facility)
+            before = await interaction.client.db.update_facility(
+                self.facility, interaction.user.id
+            )
         except Exception as exc:
             embed = FeedbackEmbed(
                 f"Failed to modify facility\n```py\n{exc}\n```", FeedbackType.ERROR
@@ -465,7 +532,90 @@ class ModifyFacilityView(BaseServicesSelectView):
             await followup.send(embed=embed, ephemeral=True)
             interaction.client.dispatch(
                 "facility_modify",
-                self.initial_facility,
+                before or self.initial_facility,
                 self.facility,
                 interaction,
             )
+
+
+class FacilityThreadButton(
+    ui.DynamicItem[Button],
+    template=r"facility:(?P<action>modify|remove):(?P<facility_id>\d+)",
+):
+    """Button on a facility's forum thread, its state lives in the custom ID so it works across restarts
+
+    Args:
+        action (str): 'modify' or 'remove'
+        facility_id (int): ID of the facility
+    """
+
+    STYLES = {
+        "modify": ("Modify", ButtonStyle.blurple),
+        "remove": ("Remove", ButtonStyle.red),
+    }
+
+    def __init__(self, action: str, facility_id: int) -> None:
+        label, style = self.STYLES[action]
+        super().__init__(
+            ui.Button(
+                label=label, style=style, custom_id=f"facility:{action}:{facility_id}"
+            )
+        )
+        self.action: str = action
+        self.facility_id: int = facility_id
+
+    @classmethod
+    async def from_custom_id(
+        cls, _: ClientInteraction, __: Button, match
+    ) -> FacilityThreadButton:
+        return cls(match["action"], int(match["facility_id"]))
+
+    async def callback(self, interaction: GuildInteraction) -> None:
+        facilities = await interaction.client.db.get_facility_ids(
+            [self.facility_id], interaction.guild_id
+        )
+        if not facilities:
+            embed = FeedbackEmbed("Facility no longer exists", FeedbackType.ERROR)
+            return await interaction.response.send_message(embed=embed, ephemeral=True)
+        facility = facilities[0]
+
+        if (
+            interaction.client.owner_id != interaction.user.id
+            and not facility.can_modify(interaction)
+            and not interaction.user.guild_permissions.administrator
+        ):
+            embed = FeedbackEmbed(
+                "No permission to modify facility", FeedbackType.ERROR
+            )
+            return await interaction.response.send_message(embed=embed, ephemeral=True)
+
+        if self.action == "modify":
+            view = ModifyFacilityView(
+                facility=facility, original_author=interaction.user
+            )
+            await view.send(interaction, embeds=facility.embeds(), ephemeral=True)
+        else:
+            embed = FeedbackEmbed(
+                f"Confirm removing {facility.name}", FeedbackType.WARNING
+            )
+            view = RemoveFacilitiesView(
+                original_author=interaction.user, facilities=[facility]
+            )
+            await view.send(interaction, embed=embed, ephemeral=True)
+
+
+def facility_thread_view(facility: Facility) -> ui.View:
+    """Creates the buttons shown on a facility's forum thread
+
+    Args:
+        facility (Facility): Facility the thread is for
+
+    Returns:
+        ui.View: View made up of dynamic items only
+    """
+    view = ui.View(timeout=None)
+    view.add_item(FacilityThreadButton("modify", facility.id_))
+    view.add_item(FacilityThreadButton("remove", facility.id_))
+    # registered dynamic items handle every press, a stopped view isn't kept by the view store
+    view.stop()
+    return view
@@ -2,7 +2,10 @@
 from __future__ import annotations
 
 import sys
+import copy
+import socket
 import logging
+import argparse
 from typing import TYPE_CHECKING
 from logging import LogRecord, Handler
 from logging.config import dictConfig
@@ -153,8 +156,30 @@ logging_dict = {
 }
 
 
-if __name__ == "__main__":
-    dictConfig(logging_dict)
+def setup_logging(cluster_id: int | None = None) -> None:
+    """Applies the logging config, clusters log to their own files and tag console output
+
+    Args:
+        cluster_id (int, optional): ID of the cluster this process runs
+    """
+    config = logging_dict
+    if cluster_id is not None:
+        config = copy.deepcopy(logging_dict)
+        # loggers created before forking must keep working
+        config["disable_existing_loggers"] = False
+        for handler in config["handlers"].values():
+            if "filename" in handler:
+                path: Path = handler["filename"]
+                handler["filename"] = path.with_stem(
+                    f"{path.stem}.cluster-{cluster_id}"
+                )
+        for name, formatter in config["formatters"].items():
+            if name != "discord_message":
+                formatter["format"] = f"[cluster {cluster_id}] " + formatter["format"]
+
+    dictConfig(config)
+    if cluster_id is not None:
+        return
 
     from discord import utils
 
@@ -167,15 +192,213 @@ if __name__ == "__main__":
         ):
             handler.formatter = utils._ColourFormatter()
 
+
+def run_worker(
+    cluster_id: int,
+    cluster_count: int,
+    shard_ids: list[int],
+    shard_count: int,
+    socket_path: str,
+    hub_socket: socket.socket,
+) -> None:
+    """Entry point of a forked cluster process
+
+    Args:
+        cluster_id (int): ID of this cluster
+        cluster_count (int): Total clusters
+        shard_ids (list[int]): Shards this cluster runs
+        shard_count (int): Total shards
+        socket_path (str): Unix socket the hub listens on
+        hub_socket (socket.socket): Hub socket inherited from the launcher
+    """
+    hub_socket.close()
+    setup_logging(cluster_id)
+
+    import asyncio
+
+    from discord import VoiceClient
+
+    from bot import ShardedFacilityBot
+    from cogs.utils.cluster import ClusterClient
+
+    VoiceClient.warn_nacl = False
+
+    logging.getLogger(__name__).info(
+        "Cluster %r running shards %r", cluster_id, shard_ids
+    )
+
+    async def run_bot():
+        cluster = ClusterClient(cluster_id, cluster_count, socket_path)
+        async with ShardedFacilityBot(
+            shard_count=shard_count, shard_ids=shard_ids, cluster=cluster
+        ) as bot:
+            await bot.start()
+
+    try:
+        asyncio.run(run_bot())
+    except KeyboardInterrupt:
+        pass
+
+
+def run_cluster(cluster_count: int) -> None:
+    """Forks a process for each cluster and relays messages between them
+
+    Args:
+        cluster_count (int): Number of processes to run
+    """
+    import asyncio
+    import tempfile
+    import multiprocessing
+
+    from bot import DB_FILE, parse_shard_config
+    from cogs.utils.cluster import ClusterHub, shard_ranges
+    from cogs.utils.sqlite import Database
+
+    logger = logging.getLogger(__name__)
+
+    shard_config = parse_shard_config()
+    shard_count = shard_config and shard_config["shard_count"]
+    if not shard_count:
+        raise SystemExit("SHARD_COUNT must be set to a number to run clusters")
+    if shard_config["shard_ids"]:
+        raise SystemExit("SHARD_IDS can't be used when running clusters")
+    ranges = shard_ranges(shard_count, cluster_count)
+
+    # create the database once rather than racing in every cluster
+    if not DB_FILE.exists():
+        asyncio.run(Database(None, DB_FILE).create())
+    else:
+        asyncio.run(Database(None, DB_FILE).migrate())
+
+    socket_path = str(Path(tempfile.mkdtemp()) / "cluster.sock")
+    hub_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    hub_socket.bind(socket_path)
+    hub_socket.listen()
+
+    context = multiprocessing.get_context("fork")
+    processes = [
+        context.Process(
+            target=run_worker,
+            args=(
+                cluster_id,
+                cluster_count,
+                shard_ids,
+                shard_count,
+                socket_path,
+                hub_socket,
+            ),
+            name=f"cluster-{cluster_id}",
+        )
+        for cluster_id, shard_ids in enumerate(ranges)
+    ]
+    for process in processes:
+        process.start()
+        logger.info("Started %s (PID %r)", process.name, process.pid)
+
+    async def run_hub():
+        server = await ClusterHub().serve(hub_socket)
+        async with server:
+            await asyncio.gather(
+                *(asyncio.to_thread(process.join) for process in processes)
+            )
+
+    try:
+        asyncio.run(run_hub())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+            logger.info("%s exited with %r", process.name, process.exitcode)
+        Path(socket_path).unlink(missing_ok=True)
+
+
+def profile_imports(top: int = 15) -> None:
+    """Imports the bot in a fresh interpreter with -X importtime and prints where startup time goes
+
+    Args:
+        top (int): Number of slowest modules to print
+    """
+    import subprocess
+    from collections import defaultdict
+
+    from cogs import EXTENSIONS
+
+    modules = ", ".join(["bot", *EXTENSIONS])
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modules}"],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode:
+        raise SystemExit(result.stderr)
+
+    # lines look like "import time: self [us] | cumulative | imported package"
+    cumulative: dict[str, int] = {}
+    packages: dict[str, int] = defaultdict(int)
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_time, total, name = line.removeprefix("import time:").split("|")
+        name = name.strip()
+        cumulative[name] = int(total)
+        packages[name.split(".")[0]] += int(self_time)
+
+    def print_table(title: str, times: dict[str, int]) -> None:
+        print(f"\n{title}")
+        for name, microseconds in times.items():
+            print(f"{microseconds / 1000:>9.1f}ms  {name}")
+
+    print_table(
+        "Extensions (cumulative)",
+        {name: cumulative.get(name, 0) for name in sorted(EXTENSIONS)},
+    )
+    print_table(
+        "Top level packages (self)",
+        dict(sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]),
+    )
+    print_table(
+        f"Slowest {top} modules (cumulative)",
+        dict(sorted(cumulative.items(), key=lambda item: item[1], reverse=True)[:top]),
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--clusters",
+        type=int,
+        default=0,
+        help="fork this many processes, each running a range of SHARD_COUNT shards",
+    )
+    parser.add_argument(
+        "--importtime",
+        action="store_true",
+        help="print how long importing the bot and each extension takes, then exit",
+    )
+    args = parser.parse_args()
+
+    if args.importtime:
+        profile_imports()
+        sys.exit()
+
+    setup_logging()
+
+    if args.clusters:
+        run_cluster(args.clusters)
+        sys.exit()
+
     # remaining imports as logging is setup
     import asyncio
 
     from discord import VoiceClient
 
-    from bot import FacilityBot
+    from bot import create_bot
 
     async def run_bot():
-        async with FacilityBot() as bot:
+        async with create_bot() as bot:
             await bot.start()
 
     VoiceClient.warn_nacl = False